@@ -1,16 +1,88 @@
-from fastapi import UploadFile, APIRouter, status, HTTPException, Depends
-from fastapi.security import HTTPBearer
 import logging
+from datetime import UTC, datetime
+from email.utils import format_datetime, parsedate_to_datetime
+from uuid import UUID
+
+from fastapi import (
+    APIRouter,
+    Depends,
+    Header,
+    HTTPException,
+    Query,
+    Request,
+    UploadFile,
+    status,
+)
+from fastapi.responses import Response, StreamingResponse
+from fastapi.security import HTTPBearer
+from starlette.requests import ClientDisconnect
 
-from ....repository.mongo.image import ImageModel
+from ....core.admission import AdmissionController
+from ....core.cache import MetadataCache
+from ....core.config import (
+    IMAGE_CACHE_CONTROL,
+    LIST_MAX_PAGE_SIZE,
+    LIST_PAGE_SIZE,
+    get_admission_controller,
+    get_metadata_cache,
+)
+from ....repository.job_repository import JobRepository
+from ....repository.mongo.image import (
+    DownloadUrlResponse,
+    ImageBatch,
+    ImageBatchRequest,
+    ImageModel,
+    ImagePage,
+    ImageUploadResults,
+    UploadSessionResponse,
+    UploadUrlRequest,
+    UploadUrlResponse,
+)
+from ....services.exceptions import (
+    BatchTooLargeException,
+    FileTooLargeException,
+    ImageNotFoundException,
+    InvalidCursorException,
+    InvalidFileTypeException,
+    UploadChunkSizeException,
+    UploadConflictException,
+    UploadIncompleteException,
+    UploadVerificationException,
+)
 from ....services.image_service import ImageService
-from ....utilities.current_user_id import get_current_user_id
+from ....utilities.current_user_id import (
+    VerifiedTokenCache,
+    get_current_user_id,
+    get_token_cache,
+)
+from ....utilities.http_range import parse_range_header
+from ....utilities.serialization import image_view, json_response
 
 bearer_scheme = HTTPBearer()
 router = APIRouter(dependencies=[Depends(bearer_scheme)])
 log = logging.getLogger(__name__)
 
 
+def _is_not_modified(request: Request, etag: str, last_modified: datetime) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return "*" in tags or etag in tags
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            # -0000 dates parse as naive, HTTP dates are always in UTC
+            since = since.replace(tzinfo=UTC)
+        return last_modified.replace(microsecond=0) <= since
+
+    return False
+
+
 @router.post(
     "/image/upload/",
     response_description="Add new image",
@@ -25,10 +97,20 @@ async def create_image(
 ):
     try:
         created_image = await image_service.create_image(file=file, user_id=user_id)
-        return created_image
+        # Renditions are built by the job queue after the response is sent
+        await image_service.schedule_renditions(created_image)
+        return json_response(
+            image_view(created_image), status_code=status.HTTP_201_CREATED
+        )
 
+    except InvalidFileTypeException as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except FileTooLargeException as e:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=str(e)
+        )
     except Exception as e:
-        log.error(f"An error occurred during file upload: {str(e)}")
+        log.error("An error occurred during file upload: %s", e)
 
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -38,6 +120,257 @@ async def create_image(
         await file.close()
 
 
+@router.post(
+    "/image/upload/bulk/",
+    response_description="Add several new images",
+    response_model=ImageUploadResults,
+    status_code=status.HTTP_201_CREATED,
+    response_model_by_alias=False,
+    responses={207: {"description": "Some files could not be uploaded"}},
+)
+async def create_images(
+    files: list[UploadFile],
+    response: Response,
+    image_service: ImageService = Depends(ImageService),
+    user_id: str = Depends(get_current_user_id),
+):
+    try:
+        results = await image_service.create_images(files=files, user_id=user_id)
+
+    except BatchTooLargeException as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except Exception as e:
+        log.error("An error occurred during bulk upload: %s", e)
+
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"An error occurred during bulk upload: {e!s}",
+        ) from e
+    finally:
+        for file in files:
+            await file.close()
+
+    for result in results:
+        if "image" in result:
+            await image_service.schedule_renditions(result["image"])
+    if any("error" in result for result in results):
+        response.status_code = status.HTTP_207_MULTI_STATUS
+
+    return {"results": results}
+
+
+@router.post(
+    "/image/upload-url",
+    response_description="Presigned URL to upload an image directly to storage",
+    response_model=UploadUrlResponse,
+    status_code=status.HTTP_201_CREATED,
+    response_model_by_alias=False,
+)
+async def create_upload_url(
+    upload: UploadUrlRequest,
+    image_service: ImageService = Depends(ImageService),
+    user_id: str = Depends(get_current_user_id),
+):
+    try:
+        return await image_service.create_upload_url(
+            user_id, upload.filename, upload.content_type, upload.size
+        )
+    except InvalidFileTypeException as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except FileTooLargeException as e:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=str(e)
+        )
+    except Exception as e:
+        log.error("An error occurred creating the upload URL: %s", e)
+
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"An error occurred creating the upload URL: {e!s}",
+        ) from e
+
+
+@router.post(
+    "/image/{upload_id}/complete",
+    response_description="Create the image of a direct or resumable upload",
+    response_model=ImageModel,
+    status_code=status.HTTP_201_CREATED,
+    response_model_by_alias=False,
+)
+async def complete_upload(
+    upload_id: str,
+    image_service: ImageService = Depends(ImageService),
+    user_id: str = Depends(get_current_user_id),
+):
+    try:
+        created_image = await image_service.complete_upload(upload_id, user_id)
+        await image_service.schedule_renditions(created_image)
+        await image_service.schedule_enrichment(created_image)
+        return json_response(
+            image_view(created_image), status_code=status.HTTP_201_CREATED
+        )
+
+    except ImageNotFoundException as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+    except UploadIncompleteException as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    except UploadVerificationException as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except FileTooLargeException as e:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=str(e)
+        )
+    except Exception as e:
+        log.error("An error occurred completing the upload: %s", e)
+
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"An error occurred completing the upload: {e!s}",
+        ) from e
+
+
+def _upload_session_headers(session: UploadSessionResponse) -> dict[str, str]:
+    return {
+        "Upload-Offset": str(session.offset),
+        "Upload-Length": str(session.size),
+        "Upload-Expires": format_datetime(
+            session.expires_at.astimezone(UTC), usegmt=True
+        ),
+        "Cache-Control": "no-store",
+    }
+
+
+@router.post(
+    "/image/uploads",
+    response_description="Resumable upload to send in chunks",
+    response_model=UploadSessionResponse,
+    status_code=status.HTTP_201_CREATED,
+    response_model_by_alias=False,
+)
+async def create_upload_session(
+    upload: UploadUrlRequest,
+    response: Response,
+    image_service: ImageService = Depends(ImageService),
+    user_id: str = Depends(get_current_user_id),
+):
+    try:
+        session = await image_service.create_upload_session(
+            user_id, upload.filename, upload.content_type, upload.size
+        )
+        response.headers.update(_upload_session_headers(session))
+        response.headers["Location"] = f"/image/uploads/{session.id}"
+        return session
+    except InvalidFileTypeException as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except FileTooLargeException as e:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=str(e)
+        )
+    except Exception as e:
+        log.error("An error occurred starting the upload: %s", e)
+
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"An error occurred starting the upload: {e!s}",
+        ) from e
+
+
+@router.head(
+    "/image/uploads/{upload_id}",
+    response_description="Progress of a resumable upload, in the Upload-Offset header",
+    status_code=status.HTTP_200_OK,
+)
+async def get_upload_session(
+    upload_id: str,
+    image_service: ImageService = Depends(ImageService),
+    user_id: str = Depends(get_current_user_id),
+):
+    try:
+        session = await image_service.get_upload_session(upload_id, user_id)
+        return Response(headers=_upload_session_headers(session))
+    except ImageNotFoundException as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+    except Exception as e:
+        log.error("An error occurred reading the upload: %s", e)
+
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"An error occurred reading the upload: {e!s}",
+        ) from e
+
+
+@router.patch(
+    "/image/uploads/{upload_id}",
+    response_description="Chunk stored, the upload continues at Upload-Offset",
+    status_code=status.HTTP_204_NO_CONTENT,
+)
+async def append_upload_chunk(
+    upload_id: str,
+    request: Request,
+    upload_offset: int = Header(ge=0),
+    image_service: ImageService = Depends(ImageService),
+    user_id: str = Depends(get_current_user_id),
+):
+    try:
+        offset = await image_service.append_upload_chunk(
+            upload_id, user_id, upload_offset, request.stream()
+        )
+        return Response(
+            status_code=status.HTTP_204_NO_CONTENT,
+            headers={"Upload-Offset": str(offset)},
+        )
+    except ClientDisconnect:
+        # The whole parts received are kept, the client resumes after them
+        log.info("Client disconnected during a chunk of upload %s", upload_id)
+
+        return Response(status_code=status.HTTP_400_BAD_REQUEST)
+    except ImageNotFoundException as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+    except UploadConflictException as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    except UploadChunkSizeException as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e),
+            headers={"Upload-Offset": str(e.offset)},
+        )
+    except FileTooLargeException as e:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=str(e)
+        )
+    except Exception as e:
+        log.error("An error occurred storing the chunk: %s", e)
+
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"An error occurred storing the chunk: {e!s}",
+        ) from e
+
+
+@router.delete(
+    "/image/uploads/{upload_id}",
+    response_description="Resumable upload aborted",
+    status_code=status.HTTP_204_NO_CONTENT,
+)
+async def abort_upload_session(
+    upload_id: str,
+    image_service: ImageService = Depends(ImageService),
+    user_id: str = Depends(get_current_user_id),
+):
+    try:
+        await image_service.abort_upload_session(upload_id, user_id)
+        return Response(status_code=status.HTTP_204_NO_CONTENT)
+    except ImageNotFoundException as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+    except Exception as e:
+        log.error("An error occurred aborting the upload: %s", e)
+
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"An error occurred aborting the upload: {e!s}",
+        ) from e
+
+
 @router.put(
     "/image/update/",
     response_description="Update existing image",
@@ -46,16 +379,27 @@ async def create_image(
     response_model_by_alias=False,
 )
 async def update_image(
-    image_url: str,
-    user_id: str,
     file: UploadFile,
+    image_id: str | None = None,
+    image_url: str | None = None,
     image_service: ImageService = Depends(ImageService),
+    user_id: str = Depends(get_current_user_id),
 ):
     try:
-        updated_image = await image_service.update_image(file, image_url, user_id)
-        return updated_image
+        image_id = await image_service.resolve_image_id(user_id, image_id, image_url)
+        updated_image = await image_service.update_image(file, image_id, user_id)
+        await image_service.schedule_renditions(updated_image)
+        return json_response(image_view(updated_image))
+    except ImageNotFoundException as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+    except InvalidFileTypeException as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except FileTooLargeException as e:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=str(e)
+        )
     except Exception as e:
-        log.error(f"An error occurred during file update: {str(e)}")
+        log.error("An error occurred during file update: %s", e)
 
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -65,6 +409,38 @@ async def update_image(
         await file.close()
 
 
+@router.get(
+    "/image/",
+    response_description="List a user's images, newest first",
+    response_model=ImagePage,
+    status_code=status.HTTP_200_OK,
+    response_model_by_alias=False,
+)
+async def list_images(
+    user_id: UUID,
+    cursor: str | None = None,
+    limit: int = Query(default=LIST_PAGE_SIZE, ge=1, le=LIST_MAX_PAGE_SIZE),
+    image_service: ImageService = Depends(ImageService),
+):
+    try:
+        page = await image_service.list_images(user_id, cursor, limit)
+        return json_response(
+            {
+                "images": [image_view(image) for image in page["images"]],
+                "next_cursor": page["next_cursor"],
+            }
+        )
+    except InvalidCursorException as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except Exception as e:
+        log.error("An error occurred listing files: %s", e)
+
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"An error occurred listing files: {e!s}",
+        ) from e
+
+
 @router.get(
     "/image/{image_id}",
     response_description="Get image",
@@ -75,9 +451,11 @@ async def update_image(
 async def get_image(image_id: str, image_service: ImageService = Depends(ImageService)):
     try:
         image = await image_service.get_image(image_id)
-        return image
+        return json_response(image_view(image))
+    except ImageNotFoundException as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
     except Exception as e:
-        log.error(f"An error occurred retrieving file: {str(e)}")
+        log.error("An error occurred retrieving file: %s", e)
 
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -85,6 +463,135 @@ async def get_image(image_id: str, image_service: ImageService = Depends(ImageSe
         )
 
 
+@router.get(
+    "/image/{image_id}/download-url",
+    response_description="Presigned URL to download the image from storage",
+    response_model=DownloadUrlResponse,
+    status_code=status.HTTP_200_OK,
+)
+async def get_download_url(
+    image_id: str, image_service: ImageService = Depends(ImageService)
+):
+    try:
+        return await image_service.create_download_url(image_id)
+    except ImageNotFoundException as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+    except Exception as e:
+        log.error("An error occurred creating the download URL: %s", e)
+
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"An error occurred creating the download URL: {e!s}",
+        ) from e
+
+
+@router.post(
+    "/image/batch",
+    response_description="Get many images",
+    response_model=ImageBatch,
+    status_code=status.HTTP_200_OK,
+    response_model_by_alias=False,
+)
+async def get_images(
+    batch: ImageBatchRequest, image_service: ImageService = Depends(ImageService)
+):
+    try:
+        batch_result = await image_service.get_images(batch.ids)
+        return json_response(
+            {
+                "images": [image_view(image) for image in batch_result["images"]],
+                "missing": batch_result["missing"],
+            }
+        )
+    except BatchTooLargeException as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except Exception as e:
+        log.error("An error occurred retrieving files: %s", e)
+
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"An error occurred retrieving files: {e!s}",
+        ) from e
+
+
+@router.head("/image/{image_id}/content", include_in_schema=False)
+@router.get(
+    "/image/{image_id}/content",
+    response_description="Get image bytes",
+    response_class=StreamingResponse,
+    responses={
+        206: {"description": "Partial content for a Range request"},
+        304: {"description": "Not modified since the cached version"},
+        404: {"description": "Image not found"},
+        416: {"description": "Requested range not satisfiable"},
+    },
+)
+async def get_image_content(
+    image_id: str,
+    request: Request,
+    image_service: ImageService = Depends(ImageService),
+    user_id: str = Depends(get_current_user_id),
+):
+    try:
+        image, object_info = await image_service.get_image_content(image_id)
+    except ImageNotFoundException as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+    except Exception as e:
+        log.error("An error occurred retrieving file content: %s", e)
+
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"An error occurred retrieving file content: {e!s}",
+        ) from e
+
+    size: int = object_info.size  # type:ignore
+    etag = f'"{object_info.etag}"'
+    last_modified: datetime = object_info.last_modified  # type:ignore
+    headers = {
+        "ETag": etag,
+        "Last-Modified": format_datetime(last_modified, usegmt=True),
+        "Cache-Control": IMAGE_CACHE_CONTROL,
+        "Accept-Ranges": "bytes",
+    }
+
+    if _is_not_modified(request, etag, last_modified):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    byte_range = None
+    if_range = request.headers.get("if-range")
+    if if_range is None or if_range == etag:
+        byte_range = parse_range_header(request.headers.get("range"), size)
+
+    status_code = status.HTTP_200_OK
+    offset, length = 0, size
+    if byte_range:
+        start, end = byte_range
+        offset, length = start, end - start + 1
+        status_code = status.HTTP_206_PARTIAL_CONTENT
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(length)
+
+    media_type = image.get("content_type") or object_info.content_type
+    if request.method == "HEAD" or length == 0:
+        return Response(status_code=status_code, headers=headers, media_type=media_type)
+
+    try:
+        content = await image_service.stream_image_content(
+            image["object_name"], offset, length
+        )
+    except Exception as e:
+        log.error("An error occurred streaming file content: %s", e)
+
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"An error occurred streaming file content: {e!s}",
+        ) from e
+
+    return StreamingResponse(
+        content, status_code=status_code, headers=headers, media_type=media_type
+    )
+
+
 @router.delete(
     "/image/delete/",
     response_description="Delete image",
@@ -92,14 +599,74 @@ async def get_image(image_id: str, image_service: ImageService = Depends(ImageSe
     status_code=status.HTTP_200_OK,
     response_model_by_alias=False,
 )
-async def delete(image_url: str, image_service: ImageService = Depends(ImageService)):
+async def delete(
+    image_id: str | None = None,
+    image_url: str | None = None,
+    image_service: ImageService = Depends(ImageService),
+    user_id: str = Depends(get_current_user_id),
+):
     try:
-        deleted_image = await image_service.delete_image(image_url)
+        image_id = await image_service.resolve_image_id(user_id, image_id, image_url)
+        deleted_image = await image_service.delete_image(image_id, user_id)
         return {"message": deleted_image}
+    except ImageNotFoundException as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
     except Exception as e:
-        log.error(f"An error occurred in the deletion file: {str(e)}")
+        log.error("An error occurred in the deletion file: %s", e)
 
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"An error occurred in the deletion file: {str(e)}",
         )
+
+
+@router.get(
+    "/cache/stats",
+    response_description="Image metadata cache counters",
+    response_model=dict[str, int],
+    status_code=status.HTTP_200_OK,
+)
+async def get_cache_stats(cache: MetadataCache = Depends(get_metadata_cache)):
+    return cache.stats()
+
+
+@router.get(
+    "/auth/cache/stats",
+    response_description="Verified token cache counters",
+    response_model=dict[str, int],
+    status_code=status.HTTP_200_OK,
+)
+async def get_token_cache_stats(
+    token_cache: VerifiedTokenCache = Depends(get_token_cache),
+):
+    return token_cache.stats()
+
+
+@router.get(
+    "/admission/stats",
+    response_description="Upload admission limits of this worker and counters",
+    response_model=dict[str, float],
+    status_code=status.HTTP_200_OK,
+)
+async def get_admission_stats(
+    controller: AdmissionController = Depends(get_admission_controller),
+):
+    return controller.stats()
+
+
+@router.get(
+    "/jobs/stats",
+    response_description="Background jobs by status",
+    response_model=dict[str, int],
+    status_code=status.HTTP_200_OK,
+)
+async def get_job_stats(job_repository: JobRepository = Depends(JobRepository)):
+    try:
+        return await job_repository.count_by_status()
+    except Exception as e:
+        log.error("An error occurred counting jobs: %s", e)
+
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"An error occurred counting jobs: {e!s}",
+        ) from e
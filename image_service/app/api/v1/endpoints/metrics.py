@@ -0,0 +1,14 @@
+from fastapi import APIRouter, Response
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+
+from ....core.metrics import metrics_registry
+
+# Scraped by Prometheus, so it sits outside the bearer-protected router
+router = APIRouter()
+
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics():
+    return Response(
+        content=generate_latest(metrics_registry()), media_type=CONTENT_TYPE_LATEST
+    )
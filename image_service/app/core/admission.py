@@ -0,0 +1,305 @@
+"""
+Admission control for uploads.
+
+Every upload holds a slot, globally and for its user, from before its body is
+read until its response is sent, and is charged its size against a global and
+a per-user byte rate. Uploads over a limit wait, for at most `max_queue_time`
+seconds, and are then rejected with a delay after which a retry may succeed.
+A bulk import therefore queues behind its own per-user limits instead of
+taking the storage bandwidth and memory of every other user.
+
+The limits can be changed while the service runs by writing them to a JSON
+file, which every worker checks for changes every few seconds.
+"""
+
+import asyncio
+import json
+import logging
+import math
+import os
+import time
+from collections.abc import Callable
+from dataclasses import asdict, dataclass, fields, replace
+
+from .exceptions import AdmissionRejectedException
+from .metrics import UPLOADS_ADMITTED, UPLOADS_QUEUED, UPLOADS_REJECTED
+
+log = logging.getLogger(__name__)
+
+# Seconds of the byte rate an idle user or service may send at once
+RATE_BURST = 1.0
+# Seconds between sweeps of the per-user state of users no longer uploading
+_SWEEP_INTERVAL = 10.0
+
+
+@dataclass(frozen=True)
+class AdmissionLimits:
+    """Upload limits of the whole service. A limit of 0 disables it."""
+
+    max_uploads: int = 0
+    max_uploads_per_user: int = 0
+    max_bytes_per_second: float = 0
+    max_bytes_per_second_per_user: float = 0
+    # Seconds an upload may wait for admission before it is rejected
+    max_queue_time: float = 10.0
+    # Uploads waiting at once, beyond which they are rejected without waiting
+    max_queued: int = 100
+
+    @classmethod
+    def from_mapping(
+        cls, values: dict, defaults: "AdmissionLimits"
+    ) -> "AdmissionLimits":
+        """`defaults` with the fields set in `values`; unknown keys are errors."""
+
+        unknown = set(values) - {field.name for field in fields(cls)}
+        if unknown:
+            raise ValueError(f"Unknown admission limits: {', '.join(sorted(unknown))}")
+        return replace(
+            defaults,
+            **{
+                name: type(getattr(defaults, name))(value)
+                for name, value in values.items()
+            },
+        )
+
+    def per_worker(self, workers: int) -> "AdmissionLimits":
+        """
+        The share of each of `workers` processes, which enforce their limits
+        without coordinating. Upload counts are rounded up, so a limit of 1 is
+        still one upload per worker.
+        """
+
+        if workers <= 1:
+            return self
+        return replace(
+            self,
+            max_uploads=math.ceil(self.max_uploads / workers),
+            max_uploads_per_user=math.ceil(self.max_uploads_per_user / workers),
+            max_bytes_per_second=self.max_bytes_per_second / workers,
+            max_bytes_per_second_per_user=self.max_bytes_per_second_per_user / workers,
+            max_queued=math.ceil(self.max_queued / workers),
+        )
+
+
+class _ByteRate:
+    """
+    Bytes charged against a rate, kept as a debt that drains at `rate` bytes
+    per second. Uploads are let through while the debt is within RATE_BURST
+    seconds of the rate, so a single upload larger than that is not refused,
+    it only delays the next ones.
+    """
+
+    def __init__(self, clock: Callable[[], float]):
+        self._clock = clock
+        self.debt = 0.0
+        self._updated = clock()
+
+    def delay(self, rate: float) -> float:
+        """Seconds until the next upload may be charged."""
+
+        now = self._clock()
+        if rate <= 0:
+            self.debt = 0.0
+        else:
+            self.debt = max(0.0, self.debt - rate * (now - self._updated))
+        self._updated = now
+        return max(0.0, self.debt / rate - RATE_BURST) if rate > 0 else 0.0
+
+    def charge(self, size: int):
+        self.debt += size
+
+
+class _UserState:
+    def __init__(self, clock: Callable[[], float]):
+        self.uploads = 0
+        self.rate = _ByteRate(clock)
+
+
+class AdmissionTicket:
+    """An admitted upload. Released once its response is sent."""
+
+    def __init__(self, user_id: str | None, charged: int):
+        self.user_id = user_id
+        self.charged = charged
+
+
+class AdmissionController:
+    """
+    Decides when uploads start, in one worker process. Waiting uploads are
+    woken whenever one finishes and check the limits again, so uploads of a
+    user at their own limit do not hold back those of other users.
+    """
+
+    def __init__(
+        self,
+        limits: AdmissionLimits,
+        workers: int = 1,
+        limits_file: str | None = None,
+        reload_interval: float = 5.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.defaults = limits
+        self.workers = workers
+        self.limits_file = limits_file
+        self.reload_interval = reload_interval
+        self._clock = clock
+        self.limits = limits.per_worker(workers)
+
+        self.uploads = 0
+        self.queued = 0
+        self.admitted = 0
+        self.rejected = 0
+        self._rate = _ByteRate(clock)
+        self._users: dict[str | None, _UserState] = {}
+        self._released = asyncio.Event()
+        self._file_mtime: float | None = None
+        self._next_reload = 0.0
+        self._next_sweep = clock() + _SWEEP_INTERVAL
+
+    def set_limits(self, limits: AdmissionLimits):
+        """Applies new service-wide limits, waking the waiting uploads."""
+
+        self.limits = limits.per_worker(self.workers)
+        self._wake()
+
+    def reload(self):
+        """
+        Applies the limits of `limits_file` when it changed since the last
+        check, or the defaults when it was removed. A file that cannot be read
+        or parsed leaves the current limits in place.
+        """
+
+        if not self.limits_file:
+            return
+        try:
+            mtime = os.stat(self.limits_file).st_mtime
+        except FileNotFoundError:
+            mtime = None
+        if mtime == self._file_mtime:
+            return
+        self._file_mtime = mtime
+
+        if mtime is None:
+            self.set_limits(self.defaults)
+            log.info("Admission limits file removed, back to the defaults")
+            return
+        try:
+            with open(self.limits_file) as file:
+                limits = AdmissionLimits.from_mapping(json.load(file), self.defaults)
+        except (OSError, ValueError, TypeError) as e:
+            log.warning("Ignoring admission limits file %s: %s", self.limits_file, e)
+            return
+        self.set_limits(limits)
+        log.info("Admission limits changed: %s", asdict(limits))
+
+    def _check(self, user: _UserState) -> tuple[str | None, float]:
+        """The limit the upload is held by, if any, and its known delay."""
+
+        limits = self.limits
+        per_user = limits.max_uploads_per_user
+        if per_user and user.uploads >= per_user:
+            return "user_uploads", 0.0
+        delay = user.rate.delay(limits.max_bytes_per_second_per_user)
+        if delay:
+            return "user_rate", delay
+        if limits.max_uploads and self.uploads >= limits.max_uploads:
+            return "uploads", 0.0
+        delay = self._rate.delay(limits.max_bytes_per_second)
+        if delay:
+            return "rate", delay
+        return None, 0.0
+
+    def _reject(self, reason: str, retry_after: float):
+        self.rejected += 1
+        UPLOADS_REJECTED.labels(reason).inc()
+        raise AdmissionRejectedException(
+            reason,
+            per_user=reason.startswith("user_"),
+            retry_after=max(1, math.ceil(retry_after)),
+        )
+
+    async def acquire(self, user_id: str | None, size: int) -> AdmissionTicket:
+        """
+        Waits until an upload of `size` bytes by `user_id` may start. Raises
+        AdmissionRejectedException when it cannot start in time.
+        """
+
+        now = self._clock()
+        if now >= self._next_reload:
+            self._next_reload = now + self.reload_interval
+            self.reload()
+        if now >= self._next_sweep:
+            self._next_sweep = now + _SWEEP_INTERVAL
+            self._sweep()
+
+        user = self._users.get(user_id)
+        if user is None:
+            user = self._users[user_id] = _UserState(self._clock)
+
+        reason, delay = self._check(user)
+        if reason is not None:
+            if self.queued >= self.limits.max_queued:
+                self._reject("queue_full", self.limits.max_queue_time)
+            deadline = now + self.limits.max_queue_time
+
+            self.queued += 1
+            UPLOADS_QUEUED.inc()
+            try:
+                while reason is not None:
+                    remaining = deadline - self._clock()
+                    if delay > remaining or remaining <= 0:
+                        self._reject(reason, delay or self.limits.max_queue_time)
+                    released = self._released
+                    try:
+                        await asyncio.wait_for(released.wait(), delay or remaining)
+                    except TimeoutError:
+                        pass
+                    reason, delay = self._check(user)
+            finally:
+                self.queued -= 1
+                UPLOADS_QUEUED.dec()
+
+        user.uploads += 1
+        user.rate.charge(size)
+        self.uploads += 1
+        self._rate.charge(size)
+        self.admitted += 1
+        UPLOADS_ADMITTED.inc()
+        return AdmissionTicket(user_id, size)
+
+    def release(self, ticket: AdmissionTicket, received: int = 0):
+        """
+        Ends an upload. Bytes received beyond those charged on admission, for
+        bodies sent without a length, are charged now and delay the next ones.
+        """
+
+        extra = max(0, received - ticket.charged)
+        self.uploads -= 1
+        self._rate.charge(extra)
+        user = self._users.get(ticket.user_id)
+        if user is not None:
+            user.uploads -= 1
+            user.rate.charge(extra)
+        self._wake()
+
+    def _wake(self):
+        # Every waiting upload checks the limits again
+        self._released.set()
+        self._released = asyncio.Event()
+
+    def _sweep(self):
+        # Users without uploads whose bytes have drained start afresh anyway
+        for user_id, user in list(self._users.items()):
+            user.rate.delay(self.limits.max_bytes_per_second_per_user)
+            if not user.uploads and not user.rate.debt:
+                del self._users[user_id]
+
+    def stats(self) -> dict[str, float]:
+        return {
+            **{f"limit_{name}": value for name, value in asdict(self.limits).items()},
+            "uploads": self.uploads,
+            "queued": self.queued,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "users": len(self._users),
+        }
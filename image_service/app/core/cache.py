@@ -0,0 +1,208 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable
+from typing import Any, Protocol
+
+from bson import CodecOptions, decode, encode
+
+log = logging.getLogger(__name__)
+
+
+class _LoadAbandoned(Exception):
+    """Set on a shared load whose leading request was cancelled."""
+
+
+class CacheBackend(Protocol):
+    evictions: int
+
+    async def get(self, key: str) -> tuple[bool, Any]: ...
+
+    async def set(self, key: str, value: Any) -> None: ...
+
+    async def delete(self, key: str) -> None: ...
+
+    async def close(self) -> None: ...
+
+    def __len__(self) -> int: ...
+
+
+class LocalCacheBackend:
+    """
+    In-process LRU with a per-entry TTL. Expired entries are dropped lazily on
+    read and the least recently used entry is evicted once `max_size` is hit.
+    """
+
+    def __init__(
+        self,
+        max_size: int,
+        ttl: float,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._clock = clock
+        self._entries: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        self.evictions = 0
+
+    async def get(self, key: str) -> tuple[bool, Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return False, None
+
+        expires_at, value = entry
+        if expires_at <= self._clock():
+            del self._entries[key]
+            return False, None
+
+        self._entries.move_to_end(key)
+        return True, value
+
+    async def set(self, key: str, value: Any) -> None:
+        self._entries[key] = (self._clock() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    async def delete(self, key: str) -> None:
+        self._entries.pop(key, None)
+
+    async def close(self) -> None:
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class RedisCacheBackend:
+    """
+    Shared backend for multi-replica deployments, so an invalidation on one
+    replica is seen by all of them. Documents are stored BSON-encoded to keep
+    ObjectId, UUID and datetime values intact. Redis does its own eviction.
+    """
+
+    def __init__(
+        self, url: str, ttl: float, codec_options: CodecOptions, prefix: str = "image:"
+    ):
+        # Optional dependency, only needed when a Redis URL is configured
+        from redis.asyncio import Redis
+
+        self._redis = Redis.from_url(url)
+        self.ttl = ttl
+        self._codec_options = codec_options
+        self._prefix = prefix
+        self.evictions = 0
+
+    async def get(self, key: str) -> tuple[bool, Any]:
+        raw = await self._redis.get(self._prefix + key)
+        if raw is None:
+            return False, None
+        return True, decode(raw, codec_options=self._codec_options)
+
+    async def set(self, key: str, value: Any) -> None:
+        await self._redis.set(
+            self._prefix + key,
+            encode(value, codec_options=self._codec_options),
+            ex=max(1, int(self.ttl)),
+        )
+
+    async def delete(self, key: str) -> None:
+        await self._redis.delete(self._prefix + key)
+
+    async def close(self) -> None:
+        await self._redis.aclose()
+
+    def __len__(self) -> int:
+        return 0
+
+
+class MetadataCache:
+    """
+    Read-through cache in front of the metadata lookups.
+
+    Concurrent misses for the same key are collapsed into a single load
+    (single-flight). Any invalidation bumps an epoch, and a load that started
+    before it does not store its result, so a racing read cannot put back a
+    document that was just updated or deleted. Backend errors never fail the
+    request, the loader is used instead.
+    """
+
+    def __init__(self, backend: CacheBackend):
+        self.backend = backend
+        self._inflight: dict[str, asyncio.Future] = {}
+        self._epoch = 0
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    async def get_or_load(self, key: str, loader: Callable[[], Awaitable[Any]]) -> Any:
+        try:
+            found, value = await self.backend.get(key)
+        except Exception as e:  # noqa: BLE001
+            log.warning("Metadata cache read failed: %s", e)
+            found, value = False, None
+
+        if found:
+            self.hits += 1
+            return value
+
+        while (pending := self._inflight.get(key)) is not None:
+            self.coalesced += 1
+            try:
+                return await asyncio.shield(pending)
+            except _LoadAbandoned:
+                # The request that led the load went away, not this one
+                continue
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        epoch = self._epoch
+
+        try:
+            value = await loader()
+        except asyncio.CancelledError:
+            # Followers retry instead of sharing the cancellation
+            future.set_exception(_LoadAbandoned())
+            future.exception()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark it retrieved, there may be no other waiter
+            future.exception()
+            raise
+        finally:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+        future.set_result(value)
+        if value is not None and epoch == self._epoch:
+            try:
+                await self.backend.set(key, value)
+            except Exception as e:  # noqa: BLE001
+                log.warning("Metadata cache write failed: %s", e)
+
+        return value
+
+    async def invalidate(self, *keys: str):
+        self._epoch += 1
+        for key in keys:
+            self._inflight.pop(key, None)
+            try:
+                await self.backend.delete(key)
+            except Exception as e:  # noqa: BLE001
+                log.warning("Metadata cache invalidation failed: %s", e)
+
+    async def close(self):
+        await self.backend.close()
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.backend.evictions,
+            "size": len(self.backend),
+        }
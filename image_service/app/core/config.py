@@ -1,26 +1,122 @@
-from pymongo import AsyncMongoClient
+import asyncio
+import logging
+import math
+import os
+from os import cpu_count, register_at_fork
 from os import environ as env
-from minio import Minio
+
+import certifi
+import urllib3
 from bson import CodecOptions, UuidRepresentation
-import logging
+from minio import Minio
+from pymongo import AsyncMongoClient
+from pymongo.asynchronous.collection import AsyncCollection
 
+from .admission import AdmissionController, AdmissionLimits
+from .cache import LocalCacheBackend, MetadataCache, RedisCacheBackend
 from .exceptions import BucketCreationException
+from .local_store import LocalObjectStore
+from .metrics import MongoCommandMetrics
+from .object_store import AsyncObjectStore, ObjectStore
 
 log = logging.getLogger(__name__)
 
+# Clients are built on first use, not at import, and the startup checks run in
+# the app lifespan. Importing the app (tests, worker spawn) needs no network.
+
+
+def available_cpus(cgroup_root: str = "/sys/fs/cgroup") -> int:
+    """
+    CPUs this process may use: those it is pinned to, further limited by the
+    CPU quota of its cgroup, as set by `docker run --cpus` or compose `cpus`.
+    """
+
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = cpu_count() or 1
+
+    try:
+        with open(f"{cgroup_root}/cpu.max") as f:
+            quota, period = f.read().split()
+        if quota != "max":
+            cpus = min(cpus, math.ceil(int(quota) / int(period)))
+    except (OSError, ValueError):
+        pass
+
+    return max(1, cpus)
+
+
+## Server, run by `python -m app.serve`
+SERVER_HOST = env.get("SERVER_HOST", "0.0.0.0")
+SERVER_PORT = int(env.get("SERVER_PORT", "8000"))
+# Worker processes, each with its own event loop, clients and caches. Every
+# worker holds its own pools, so the default is capped to bound the memory
+WEB_CONCURRENCY_MAX = int(env.get("WEB_CONCURRENCY_MAX", "4"))
+WEB_CONCURRENCY = int(
+    env.get("WEB_CONCURRENCY") or min(available_cpus(), WEB_CONCURRENCY_MAX)
+)
+# Seconds an idle keep-alive connection stays open. Keep it above the idle
+# timeout of the load balancer in front, so it never reuses a closed connection
+SERVER_KEEPALIVE_TIMEOUT = float(env.get("SERVER_KEEPALIVE_TIMEOUT", "75"))
+# Seconds in-flight requests, uploads included, get to finish on shutdown
+SERVER_GRACEFUL_TIMEOUT = float(env.get("SERVER_GRACEFUL_TIMEOUT", "30"))
+SERVER_BACKLOG = int(env.get("SERVER_BACKLOG", "2048"))
+# Proxies trusted for X-Forwarded-For and X-Forwarded-Proto
+FORWARDED_ALLOW_IPS = env.get("FORWARDED_ALLOW_IPS", "127.0.0.1")
+
+
+# One INFO line per request, with its id, method, route, status and duration
+ACCESS_LOG = env.get("ACCESS_LOG", "True") == "True"
+
+
+## Startup
+STARTUP_RETRY_ATTEMPTS = int(env.get("STARTUP_RETRY_ATTEMPTS", "5"))
+STARTUP_RETRY_BACKOFF = float(env.get("STARTUP_RETRY_BACKOFF", "0.5"))
+# Spawns the rendition workers before the first request instead of on it
+STARTUP_WARMUP = env.get("STARTUP_WARMUP", "False") == "True"
+
+
+## Storage
+# "minio", or "local" to keep objects on disk under STORAGE_LOCAL_ROOT, for
+# single node deployments without MinIO. Presigned URLs need MinIO.
+STORAGE_BACKEND = env.get("STORAGE_BACKEND", "minio")
+STORAGE_LOCAL_ROOT = env.get("STORAGE_LOCAL_ROOT", "data/objects")
+
 
 # MinIO configuration
+# Also the size of the HTTP connection pool, one connection per executor thread
+MINIO_MAX_CONCURRENCY = int(env.get("MINIO_MAX_CONCURRENCY", "16"))
+MINIO_TIMEOUT = float(env.get("MINIO_TIMEOUT", "300"))
+# Host clients reach MinIO at, used to sign presigned URLs. Defaults to MINIO_ENDPOINT
+MINIO_PUBLIC_ENDPOINT = env.get("MINIO_PUBLIC_ENDPOINT")
+MINIO_REGION = env.get("MINIO_REGION", "us-east-1")
+
+
 def create_minio_client():
     MINIO_ENDPOINT = env.get("MINIO_ENDPOINT")
     MINIO_ACCESS_KEY = env.get("MINIO_ROOT_USER")
     MINIO_SECRET_KEY = env.get("MINIO_ROOT_PASSWORD")
     MINIO_SECURE = env.get("MINIO_SECURE")
 
+    # Same settings as the client's default pool, which holds only 10 connections
+    # and would drop the surplus after every call of a larger executor
+    http_client = urllib3.PoolManager(
+        timeout=urllib3.Timeout(connect=MINIO_TIMEOUT, read=MINIO_TIMEOUT),
+        maxsize=MINIO_MAX_CONCURRENCY,
+        cert_reqs="CERT_REQUIRED",
+        ca_certs=env.get("SSL_CERT_FILE") or certifi.where(),
+        retries=urllib3.Retry(
+            total=5, backoff_factor=0.2, status_forcelist=[500, 502, 503, 504]
+        ),
+    )
+
     minio_client = Minio(
         MINIO_ENDPOINT,
         access_key=MINIO_ACCESS_KEY,
         secret_key=MINIO_SECRET_KEY,
         secure=True if MINIO_SECURE == "True" else False,
+        http_client=http_client,
     )
 
     log.info("MinIO client created with success")
@@ -28,28 +124,177 @@ def create_minio_client():
     return minio_client
 
 
-def create_minio_bucket(minio_client: Minio):
+def create_presign_client(endpoint: str) -> Minio:
+    """
+    Client only used to sign URLs for `endpoint`. Signing happens locally; the
+    fixed region saves the bucket location lookup.
+    """
+
+    return Minio(
+        endpoint,
+        access_key=env.get("MINIO_ROOT_USER"),
+        secret_key=env.get("MINIO_ROOT_PASSWORD"),
+        secure=env.get("MINIO_SECURE") == "True",
+        region=MINIO_REGION,
+    )
+
+
+async def create_minio_bucket(
+    object_store: AsyncObjectStore,
+    attempts: int = STARTUP_RETRY_ATTEMPTS,
+    backoff: float = STARTUP_RETRY_BACKOFF,
+):
+    """
+    Makes sure the bucket exists, retrying with exponential backoff so a MinIO
+    that is still starting does not fail the service.
+    """
+
     MINIO_BUCKET = env.get("MINIO_BUCKET")
 
-    try:
-        bucket_exist = minio_client.bucket_exists(MINIO_BUCKET)  # type: ignore
-        if not bucket_exist:
-            minio_client.make_bucket(MINIO_BUCKET)  # type: ignore
+    for attempt in range(1, attempts + 1):
+        try:
+            bucket_exist = await object_store.bucket_exists(MINIO_BUCKET)  # type: ignore
+            if not bucket_exist:
+                await object_store.make_bucket(MINIO_BUCKET)  # type: ignore
+            return
 
-    except Exception:
-        log.critical("Could not create the MinIO bucket")
-        raise BucketCreationException("Could not create the MinIO bucket")
+        except Exception as e:
+            if attempt == attempts:
+                log.critical("Could not create the MinIO bucket: %s", e)
+                raise BucketCreationException(
+                    "Could not create the MinIO bucket"
+                ) from e
 
+            delay = backoff * 2 ** (attempt - 1)
+            log.warning(
+                "MinIO bucket check failed (%s/%s), retrying in %.1fs: %s",
+                attempt,
+                attempts,
+                delay,
+                e,
+            )
+            await asyncio.sleep(delay)
 
-# Create a minIO client Singleton for the use of Dependency Injection through the app
-minio_client = create_minio_client()
 
+_minio_client: Minio | None = None
+_object_store: ObjectStore | None = None
 
-def get_minio_client():
-    return minio_client
+
+# MinIO client singleton for the use of Dependency Injection through the app
+def get_minio_client() -> Minio:
+    global _minio_client
+    if _minio_client is None:
+        _minio_client = create_minio_client()
+    return _minio_client
+
+
+# Storage backend of the request path, its calls never block the event loop
+def get_object_store() -> ObjectStore:
+    global _object_store
+    if _object_store is None and STORAGE_BACKEND == "local":
+        _object_store = LocalObjectStore(
+            STORAGE_LOCAL_ROOT, max_concurrency=MINIO_MAX_CONCURRENCY
+        )
+        log.info("Storing objects on disk under %s", STORAGE_LOCAL_ROOT)
+    elif _object_store is None:
+        _object_store = AsyncObjectStore(
+            get_minio_client(),
+            max_concurrency=MINIO_MAX_CONCURRENCY,
+            presign_client=create_presign_client(
+                MINIO_PUBLIC_ENDPOINT or env.get("MINIO_ENDPOINT")  # type: ignore
+            ),
+        )
+    return _object_store
+
+
+# Uploads are streamed to MinIO in parts of UPLOAD_PART_SIZE bytes (S3 minimum is 5 MiB)
+UPLOAD_PART_SIZE = max(
+    int(env.get("UPLOAD_PART_SIZE", str(5 * 1024 * 1024))), 5 * 1024 * 1024
+)
+MAX_UPLOAD_SIZE = int(env.get("MAX_UPLOAD_SIZE", str(20 * 1024 * 1024)))
+# Largest width x height accepted, checked on the header before the upload so
+# decompression bombs never reach storage or the rendition workers
+IMAGE_MAX_PIXELS = int(env.get("IMAGE_MAX_PIXELS", str(50_000_000)))
+# Bytes of a direct upload read back to check its type and dimensions
+IMAGE_HEADER_READ_SIZE = int(env.get("IMAGE_HEADER_READ_SIZE", str(64 * 1024)))
+
+# Bulk uploads: files per request and storage writes running at once
+BULK_UPLOAD_MAX_FILES = int(env.get("BULK_UPLOAD_MAX_FILES", "20"))
+BULK_UPLOAD_CONCURRENCY = int(env.get("BULK_UPLOAD_CONCURRENCY", "4"))
+
+# Upload admission control, limits of the whole service shared out between
+# the workers; 0 disables a limit. Uploads over a limit wait up to
+# ADMISSION_MAX_QUEUE_TIME seconds, then get a 429 (their user's limits) or a
+# 503 (the service's). A JSON object in ADMISSION_LIMITS_FILE with the same
+# names in lower case (max_uploads, max_bytes_per_second_per_user, ...)
+# overrides these without a restart, checked every ADMISSION_RELOAD_INTERVAL s.
+ADMISSION_LIMITS = AdmissionLimits(
+    max_uploads=int(env.get("ADMISSION_MAX_UPLOADS", "64")),
+    max_uploads_per_user=int(env.get("ADMISSION_MAX_UPLOADS_PER_USER", "8")),
+    max_bytes_per_second=float(env.get("ADMISSION_MAX_BYTES_PER_SECOND", "0")),
+    max_bytes_per_second_per_user=float(
+        env.get("ADMISSION_MAX_BYTES_PER_SECOND_PER_USER", "0")
+    ),
+    max_queue_time=float(env.get("ADMISSION_MAX_QUEUE_TIME", "10")),
+    max_queued=int(env.get("ADMISSION_MAX_QUEUED", "100")),
+)
+ADMISSION_LIMITS_FILE = env.get("ADMISSION_LIMITS_FILE")
+ADMISSION_RELOAD_INTERVAL = float(env.get("ADMISSION_RELOAD_INTERVAL", "5"))
+
+_admission_controller: AdmissionController | None = None
+
+
+def get_admission_controller() -> AdmissionController:
+    global _admission_controller
+    if _admission_controller is None:
+        _admission_controller = AdmissionController(
+            ADMISSION_LIMITS,
+            workers=int(env.get("WEB_CONCURRENCY") or 1),
+            limits_file=ADMISSION_LIMITS_FILE,
+            reload_interval=ADMISSION_RELOAD_INTERVAL,
+        )
+    return _admission_controller
+
+
+# Sent with image bytes so browsers can cache and revalidate them. They are
+# served to authenticated callers only, so shared caches must not keep them
+IMAGE_CACHE_CONTROL = env.get("IMAGE_CACHE_CONTROL", "private, max-age=86400")
+
+# Validity of presigned upload and download URLs, in seconds
+PRESIGNED_URL_EXPIRY = int(env.get("PRESIGNED_URL_EXPIRY", "900"))
+
+# Resumable uploads are aborted RESUMABLE_UPLOAD_EXPIRY seconds after they start.
+# A chunk holds its upload for up to RESUMABLE_UPLOAD_LEASE seconds per part, so
+# a worker that dies mid-chunk does not block the client's retry for longer.
+RESUMABLE_UPLOAD_EXPIRY = int(env.get("RESUMABLE_UPLOAD_EXPIRY", "86400"))
+RESUMABLE_UPLOAD_LEASE = int(env.get("RESUMABLE_UPLOAD_LEASE", "300"))
+
+# Maximum number of ids resolved by one batch lookup
+BATCH_MAX_IDS = int(env.get("BATCH_MAX_IDS", "100"))
+
+# Images per page when listing a user's images
+LIST_PAGE_SIZE = int(env.get("LIST_PAGE_SIZE", "50"))
+LIST_MAX_PAGE_SIZE = int(env.get("LIST_MAX_PAGE_SIZE", "200"))
+
+# Derived renditions generated after each upload, as name:width[:format] entries
+IMAGE_RENDITIONS = env.get("IMAGE_RENDITIONS", "thumb:200,card:800,card_webp:800:webp")
+# Every web worker has its own pool, so the CPUs are split between them
+RENDITION_WORKERS = int(
+    env.get(
+        "RENDITION_WORKERS",
+        str(max(1, available_cpus() // int(env.get("WEB_CONCURRENCY") or 1))),
+    )
+)
 
 
 ## MongoDB configuration
+MONGO_MAX_POOL_SIZE = int(env.get("MONGO_MAX_POOL_SIZE", "100"))
+MONGO_MIN_POOL_SIZE = int(env.get("MONGO_MIN_POOL_SIZE", "0"))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(
+    env.get("MONGO_SERVER_SELECTION_TIMEOUT_MS", "30000")
+)
+
+
 def create_mongodb_client():
     MONGO_HOST = env.get("MONGO_HOST")
     MONGO_PORT = env.get("MONGO_PORT")
@@ -57,7 +302,11 @@ def create_mongodb_client():
     MONGO_PASSWORD = env.get("MONGO_INITDB_ROOT_PASSWORD")
 
     client: AsyncMongoClient = AsyncMongoClient(
-        f"mongodb://{MONGO_USER}:{MONGO_PASSWORD}@{MONGO_HOST}:{MONGO_PORT}/?authSource=admin"
+        f"mongodb://{MONGO_USER}:{MONGO_PASSWORD}@{MONGO_HOST}:{MONGO_PORT}/?authSource=admin",
+        maxPoolSize=MONGO_MAX_POOL_SIZE,
+        minPoolSize=MONGO_MIN_POOL_SIZE,
+        serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        event_listeners=[MongoCommandMetrics()],
     )
 
     log.info("MongoDB client created with success")
@@ -65,16 +314,121 @@ def create_mongodb_client():
     return client
 
 
-mongodb_client = create_mongodb_client()
+_mongodb_client: AsyncMongoClient | None = None
 
 
-def get_mongodb_client():
-    return mongodb_client
+def get_mongodb_client() -> AsyncMongoClient:
+    global _mongodb_client
+    if _mongodb_client is None:
+        _mongodb_client = create_mongodb_client()
+    return _mongodb_client
 
 
-db = mongodb_client.get_database("images")
-
 standard_opts: CodecOptions = CodecOptions(
     uuid_representation=UuidRepresentation.STANDARD
 )
-image_collection = db.get_collection("images", codec_options=standard_opts)
+
+
+def get_image_collection() -> AsyncCollection:
+    db = get_mongodb_client().get_database("images")
+    return db.get_collection("images", codec_options=standard_opts)
+
+
+# One document per distinct stored content, keyed by its SHA-256, with a refcount
+def get_blob_collection() -> AsyncCollection:
+    db = get_mongodb_client().get_database("images")
+    return db.get_collection("blobs", codec_options=standard_opts)
+
+
+# Direct-to-storage uploads waiting for their completion call
+def get_pending_upload_collection() -> AsyncCollection:
+    db = get_mongodb_client().get_database("images")
+    return db.get_collection("pending_uploads", codec_options=standard_opts)
+
+
+# Durable background jobs: renditions and deferred object removal
+def get_job_collection() -> AsyncCollection:
+    db = get_mongodb_client().get_database("images")
+    return db.get_collection("jobs", codec_options=standard_opts)
+
+
+JOB_WORKERS = int(env.get("JOB_WORKERS", "4"))
+JOB_MAX_ATTEMPTS = int(env.get("JOB_MAX_ATTEMPTS", "5"))
+# Seconds before the first retry, doubled after each failed attempt
+JOB_RETRY_BACKOFF = float(env.get("JOB_RETRY_BACKOFF", "2"))
+# Seconds a claimed job is reserved for its worker before others may retake it
+JOB_LEASE = float(env.get("JOB_LEASE", "300"))
+JOB_POLL_INTERVAL = float(env.get("JOB_POLL_INTERVAL", "1"))
+
+# Orphan reconciliation. Objects and images younger than the grace period may
+# belong to an upload or delete still in progress and are left alone.
+RECONCILE_GRACE_PERIOD = float(env.get("RECONCILE_GRACE_PERIOD", "3600"))
+RECONCILE_PAGE_SIZE = int(env.get("RECONCILE_PAGE_SIZE", "1000"))
+
+
+# Image metadata cache, shared through Redis when METADATA_CACHE_REDIS_URL is set
+def create_metadata_cache():
+    METADATA_CACHE_SIZE = int(env.get("METADATA_CACHE_SIZE", "10000"))
+    METADATA_CACHE_REDIS_URL = env.get("METADATA_CACHE_REDIS_URL")
+    # A local cache only sees the invalidations of its own worker, so with
+    # several workers its entries expire quickly to bound stale reads
+    shared = METADATA_CACHE_REDIS_URL or int(env.get("WEB_CONCURRENCY") or 1) == 1
+    METADATA_CACHE_TTL = float(env.get("METADATA_CACHE_TTL", "300" if shared else "5"))
+
+    if METADATA_CACHE_REDIS_URL:
+        backend = RedisCacheBackend(
+            METADATA_CACHE_REDIS_URL, METADATA_CACHE_TTL, standard_opts
+        )
+        log.info("Metadata cache using the shared Redis backend")
+    else:
+        if not shared:
+            log.warning(
+                "Metadata cache is per worker, entries expire after %ss; "
+                "set METADATA_CACHE_REDIS_URL to share it",
+                METADATA_CACHE_TTL,
+            )
+        backend = LocalCacheBackend(METADATA_CACHE_SIZE, METADATA_CACHE_TTL)
+
+    return MetadataCache(backend)
+
+
+_metadata_cache: MetadataCache | None = None
+
+
+def get_metadata_cache() -> MetadataCache:
+    global _metadata_cache
+    if _metadata_cache is None:
+        _metadata_cache = create_metadata_cache()
+    return _metadata_cache
+
+
+async def close_clients():
+    """
+    Closes the clients built so far. They are created again on next use.
+    """
+
+    global _minio_client, _object_store, _mongodb_client, _metadata_cache
+
+    if _metadata_cache is not None:
+        await _metadata_cache.close()
+    if _mongodb_client is not None:
+        await _mongodb_client.close()
+    if _object_store is not None:
+        _object_store.shutdown()
+
+    _minio_client = _object_store = _mongodb_client = _metadata_cache = None
+    log.info("Clients closed")
+
+
+def _forget_clients():
+    """
+    Drops the clients a forked worker inherits, without closing them: their
+    sockets, threads and event loop belong to the parent. The worker builds
+    its own on first use.
+    """
+
+    global _minio_client, _object_store, _mongodb_client, _metadata_cache
+    _minio_client = _object_store = _mongodb_client = _metadata_cache = None
+
+
+register_at_fork(after_in_child=_forget_clients)
@@ -6,3 +6,28 @@ class CoreException(Exception):
 
 class BucketCreationException(CoreException):
     pass
+
+
+class ObjectStoreException(CoreException):
+    """
+    A storage backend call failed. `code` is the S3 error code, such as
+    NoSuchKey, whichever backend raised it.
+    """
+
+    def __init__(self, message: str, code: str | None = None):
+        super().__init__(message)
+        self.code = code
+
+
+class AdmissionRejectedException(CoreException):
+    """
+    An upload was not admitted in time. `per_user` tells whether the limits of
+    its user or those of the service held it back, and `retry_after` is the
+    number of seconds after which a retry may succeed.
+    """
+
+    def __init__(self, reason: str, per_user: bool, retry_after: int):
+        super().__init__(f"Upload not admitted: {reason}")
+        self.reason = reason
+        self.per_user = per_user
+        self.retry_after = retry_after
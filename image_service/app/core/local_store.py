@@ -0,0 +1,326 @@
+import asyncio
+import functools
+import logging
+import mimetypes
+import mmap
+import os
+import shutil
+import tempfile
+import uuid
+from collections.abc import AsyncIterator, Callable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import UTC, datetime, timedelta
+from typing import Any, Self, TypeVar
+
+from minio.datatypes import Object
+
+from .exceptions import ObjectStoreException
+from .metrics import timed
+from .object_store import list_objects_page
+
+log = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Prefix of the files being written, hidden from listings until renamed
+_TEMP_PREFIX = ".upload-"
+_COPY_BUFFER_SIZE = 1024 * 1024
+# Parts of the multipart uploads in progress, one directory per upload
+_MULTIPART_DIRECTORY = ".multipart"
+
+
+@dataclass
+class MappedObject:
+    """An open object: a memory map of the file and the byte range to serve."""
+
+    data: mmap.mmap | None
+    offset: int
+    length: int
+
+
+class _PartsReader:
+    """Reads the part files of a multipart upload one after the other."""
+
+    def __init__(self, paths: list[str]):
+        self._paths = iter(paths)
+        self._file: Any = None
+
+    def read(self, size: int = -1) -> bytes:
+        while True:
+            if self._file is None:
+                path = next(self._paths, None)
+                if path is None:
+                    return b""
+                self._file = open(path, "rb")  # noqa: SIM115
+            chunk = self._file.read(size)
+            if chunk:
+                return chunk
+            self._file.close()
+            self._file = None
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, *exc_info: object):
+        if self._file is not None:
+            self._file.close()
+
+
+class LocalObjectStore:
+    """
+    ObjectStore keeping every bucket as a directory under `root`, for single
+    node deployments and tests without MinIO.
+
+    Writes go to a temporary file in the target directory that is renamed over
+    the object once complete, so readers see the old or the new content and
+    never a partial file. Reads map the file into memory and hand out slices
+    of the map: the bytes go from the page cache to the socket without being
+    copied into Python objects. File system calls run on a bounded thread pool
+    like the MinIO ones.
+    """
+
+    def __init__(self, root: str, max_concurrency: int = 16):
+        self.root = os.path.abspath(root)
+        self.max_concurrency = max_concurrency
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_concurrency, thread_name_prefix="local-store"
+        )
+
+    async def _run(self, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        loop = asyncio.get_running_loop()
+        with timed("disk", getattr(func, "__name__", "call")):
+            try:
+                return await loop.run_in_executor(
+                    self._executor, functools.partial(func, *args, **kwargs)
+                )
+            except FileNotFoundError as e:
+                raise ObjectStoreException(str(e), code="NoSuchKey") from e
+            except OSError as e:
+                raise ObjectStoreException(str(e)) from e
+
+    def _path(self, bucket_name: str, object_name: str = "") -> str:
+        bucket = os.path.join(self.root, bucket_name)
+        path = os.path.normpath(os.path.join(bucket, object_name))
+        if os.path.commonpath([bucket, path]) != bucket or (
+            object_name and path == bucket
+        ):
+            raise ObjectStoreException(
+                f"Invalid object name {object_name}", code="InvalidObjectName"
+            )
+        return path
+
+    def _info(self, bucket_name: str, object_name: str, stat: os.stat_result) -> Object:
+        return Object(
+            bucket_name,
+            object_name,
+            last_modified=datetime.fromtimestamp(stat.st_mtime, UTC),
+            # Changes whenever the file is replaced, like the content etag
+            etag=f"{stat.st_mtime_ns:x}-{stat.st_size:x}",
+            size=stat.st_size,
+            content_type=mimetypes.guess_type(object_name)[0]
+            or "application/octet-stream",
+        )
+
+    @staticmethod
+    def _write(path: str, data: Any):
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        descriptor, temp_path = tempfile.mkstemp(prefix=_TEMP_PREFIX, dir=directory)
+        try:
+            with os.fdopen(descriptor, "wb") as file:
+                shutil.copyfileobj(data, file, _COPY_BUFFER_SIZE)
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+    async def put_object(
+        self,
+        bucket_name: str,
+        object_name: str,
+        data: Any,
+        length: int,
+        content_type: str = "application/octet-stream",
+        **kwargs: Any,
+    ) -> None:
+        await self._run(self._write, self._path(bucket_name, object_name), data)
+
+    @staticmethod
+    def _remove(path: str):
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            # Like S3, removing a missing object succeeds
+            pass
+
+    async def remove_object(self, bucket_name: str, object_name: str) -> None:
+        await self._run(self._remove, self._path(bucket_name, object_name))
+
+    async def stat_object(self, bucket_name: str, object_name: str) -> Object:
+        stat = await self._run(os.stat, self._path(bucket_name, object_name))
+        return self._info(bucket_name, object_name, stat)
+
+    @staticmethod
+    def _map(path: str, offset: int, length: int) -> MappedObject:
+        with open(path, "rb") as file:
+            size = os.fstat(file.fileno()).st_size
+            length = max(0, min(length or size, size - offset))
+            if not length:
+                return MappedObject(None, 0, 0)
+            # The map keeps its own handle on the file, which can be closed
+            data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if hasattr(mmap, "MADV_WILLNEED"):
+            # Starts reading the range ahead, so serving it rarely waits on disk
+            start = offset - offset % mmap.PAGESIZE
+            data.madvise(mmap.MADV_WILLNEED, start, length + offset - start)
+        return MappedObject(data, offset, length)
+
+    async def get_object(
+        self, bucket_name: str, object_name: str, offset: int = 0, length: int = 0
+    ) -> MappedObject:
+        """
+        Maps the object, or `length` bytes of it from `offset`. A missing object
+        is reported here, before any byte is streamed.
+        """
+
+        return await self._run(
+            self._map, self._path(bucket_name, object_name), offset, length
+        )
+
+    async def iter_object(
+        self, response: MappedObject, chunk_size: int = 1024 * 1024
+    ) -> AsyncIterator[memoryview]:
+        """
+        Yields views of the mapped range. The map is released once the server
+        has sent the last view, when nothing refers to it any more.
+        """
+
+        if response.data is None:
+            return
+        view = memoryview(response.data)
+        end = response.offset + response.length
+        for start in range(response.offset, end, chunk_size):
+            yield view[start : min(start + chunk_size, end)]
+
+    def _walk(self, bucket_name: str, prefix: str | None) -> Iterator[Object]:
+        bucket = self._path(bucket_name)
+        for directory, directories, files in os.walk(bucket):
+            # Sorted in place so listings come in the same order every time
+            directories.sort()
+            for filename in sorted(files):
+                if filename.startswith(_TEMP_PREFIX):
+                    continue
+                path = os.path.join(directory, filename)
+                object_name = os.path.relpath(path, bucket).replace(os.sep, "/")
+                if prefix and not object_name.startswith(prefix):
+                    continue
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    # Removed since the directory was read
+                    continue
+                yield self._info(bucket_name, object_name, stat)
+
+    async def list_objects(
+        self, bucket_name: str, prefix: str | None = None, page_size: int = 1000
+    ) -> AsyncIterator[list[Object]]:
+        objects = self._walk(bucket_name, prefix)
+        while page := await self._run(list_objects_page, objects, page_size):
+            yield page
+
+    async def presigned_put_object(
+        self, bucket_name: str, object_name: str, expires: timedelta
+    ) -> str:
+        raise ObjectStoreException(
+            "Presigned URLs need the MinIO storage backend", code="NotImplemented"
+        )
+
+    async def presigned_get_object(
+        self, bucket_name: str, object_name: str, expires: timedelta
+    ) -> str:
+        raise ObjectStoreException(
+            "Presigned URLs need the MinIO storage backend", code="NotImplemented"
+        )
+
+    def _parts_path(self, upload_id: str, part_number: int | None = None) -> str:
+        if not upload_id.isalnum():
+            raise ObjectStoreException(
+                f"Invalid upload id {upload_id}", code="NoSuchUpload"
+            )
+        path = os.path.join(self.root, _MULTIPART_DIRECTORY, upload_id)
+        if part_number is not None:
+            path = os.path.join(path, str(part_number))
+        return path
+
+    async def create_multipart_upload(
+        self, bucket_name: str, object_name: str, content_type: str
+    ) -> str:
+        upload_id = uuid.uuid4().hex
+        await self._run(os.makedirs, self._parts_path(upload_id))
+        return upload_id
+
+    @staticmethod
+    def _write_part(path: str, data: bytes):
+        if not os.path.isdir(os.path.dirname(path)):
+            raise ObjectStoreException("The upload does not exist", code="NoSuchUpload")
+        with open(path, "wb") as file:
+            file.write(data)
+
+    async def upload_part(
+        self,
+        bucket_name: str,
+        object_name: str,
+        upload_id: str,
+        part_number: int,
+        data: bytes,
+    ) -> str:
+        path = self._parts_path(upload_id, part_number)
+        await self._run(self._write_part, path, data)
+        return f"{part_number:x}-{len(data):x}"
+
+    def _join_parts(self, path: str, directory: str, part_numbers: list[int]):
+        if not os.path.isdir(directory):
+            raise ObjectStoreException("The upload does not exist", code="NoSuchUpload")
+        with _PartsReader(
+            [os.path.join(directory, str(number)) for number in part_numbers]
+        ) as parts:
+            self._write(path, parts)
+        shutil.rmtree(directory)
+
+    async def complete_multipart_upload(
+        self,
+        bucket_name: str,
+        object_name: str,
+        upload_id: str,
+        parts: list[tuple[int, str]],
+    ) -> None:
+        await self._run(
+            self._join_parts,
+            self._path(bucket_name, object_name),
+            self._parts_path(upload_id),
+            [part_number for part_number, _ in parts],
+        )
+
+    @staticmethod
+    def _remove_parts(directory: str):
+        if not os.path.isdir(directory):
+            raise ObjectStoreException("The upload does not exist", code="NoSuchUpload")
+        shutil.rmtree(directory)
+
+    async def abort_multipart_upload(
+        self, bucket_name: str, object_name: str, upload_id: str
+    ) -> None:
+        await self._run(self._remove_parts, self._parts_path(upload_id))
+
+    async def bucket_exists(self, bucket_name: str) -> bool:
+        return await self._run(os.path.isdir, self._path(bucket_name))
+
+    async def make_bucket(self, bucket_name: str) -> None:
+        await self._run(os.makedirs, self._path(bucket_name), exist_ok=True)
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._executor.shutdown(wait=wait)
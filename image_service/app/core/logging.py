@@ -1,8 +1,43 @@
+"""
+Logging that never blocks the event loop.
+
+Handlers on the request path only put records on a bounded queue; a listener
+thread formats them and writes them out. Messages use lazy %-style arguments,
+so they are only interpolated for records that are emitted, on the listener
+thread. Every record carries the id of the request it was logged for.
+Repeated warnings and errors from the same line are sampled, so a failing
+dependency cannot flood the output.
+"""
+
+import atexit
+import json
 import logging
 import os
+import queue
+import threading
+import time
+from contextvars import ContextVar
+from datetime import UTC, datetime
 from enum import StrEnum
+from logging.handlers import QueueHandler, QueueListener
+from typing import TextIO
+
+from .metrics import LOG_RECORDS_DROPPED
 
-LOG_FORMAT_DEBUG = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+LOG_FORMAT_DEBUG = (
+    "%(asctime)s - %(name)s - %(levelname)s - %(request_id)s - %(message)s"
+)
+
+# Id of the request being handled, set by RequestIdMiddleware
+request_id: ContextVar[str | None] = ContextVar("request_id", default=None)
+
+# Attributes every record has; anything else was passed with `extra`
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {
+    "message",
+    "asctime",
+    "request_id",
+    "suppressed",
+}
 
 
 class LogLevels(StrEnum):
@@ -12,7 +47,140 @@ class LogLevels(StrEnum):
     debug = "DEBUG"
 
 
+class RequestIdFilter(logging.Filter):
+    """Stamps each record with the id of the request it was logged for."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Lets through at most `burst` records of `level` and above per call site
+    every `window` seconds. The first record of the next window carries the
+    number suppressed in the previous one. Call sites rather than messages are
+    compared, since messages differ by the ids and errors they contain.
+    """
+
+    def __init__(self, burst: int, window: float, level: int = logging.WARNING):
+        super().__init__()
+        self.burst = burst
+        self.window = window
+        self.level = level
+        # (path, line) -> [window start, records let through, records suppressed]
+        self._sites: dict[tuple[str, int], list] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno < self.level or self.burst <= 0:
+            return True
+
+        key = (record.pathname, record.lineno)
+        now = time.monotonic()
+        with self._lock:
+            site = self._sites.get(key)
+            if site is None or now - site[0] >= self.window:
+                if site and site[2]:
+                    record.suppressed = site[2]
+                self._sites[key] = [now, 1, 0]
+                return True
+            if site[1] < self.burst:
+                site[1] += 1
+                return True
+            site[2] += 1
+            return False
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, with the fields passed in `extra`."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, UTC).isoformat(
+                timespec="milliseconds"
+            ),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if getattr(record, "request_id", None):
+            entry["request_id"] = record.request_id  # type: ignore
+        if getattr(record, "suppressed", 0):
+            entry["suppressed"] = record.suppressed  # type: ignore
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        if not hasattr(record, "request_id"):
+            record.request_id = None
+        line = super().format(record)
+        if getattr(record, "suppressed", 0):
+            line += f" ({record.suppressed} similar suppressed)"  # type: ignore
+        return line
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """
+    Puts records on the queue as they are, leaving formatting to the listener
+    thread. Records are dropped, and counted, when the queue is full, rather
+    than making the caller wait for the output.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED.inc()
+
+
+class _BlockingStopQueueListener(QueueListener):
+    def enqueue_sentinel(self):
+        # Waits for room, so stopping with a full queue still flushes it
+        self.queue.put(self._sentinel)  # type: ignore
+
+
+def create_log_pipeline(
+    stream: TextIO | None = None,
+    json_output: bool = True,
+    queue_size: int = 10000,
+    sample_burst: int = 20,
+    sample_window: float = 10.0,
+) -> tuple[QueueHandler, QueueListener]:
+    """
+    Returns the handler to attach to loggers and the listener writing its
+    records to `stream` (stderr by default). The listener must be started.
+    """
+
+    output = logging.StreamHandler(stream)
+    output.setFormatter(
+        JsonFormatter() if json_output else TextFormatter(LOG_FORMAT_DEBUG)
+    )
+
+    log_queue: queue.Queue = queue.Queue(maxsize=queue_size)
+    handler = NonBlockingQueueHandler(log_queue)
+    handler.addFilter(RequestIdFilter())
+    handler.addFilter(SamplingFilter(sample_burst, sample_window))
+
+    return handler, _BlockingStopQueueListener(log_queue, output)
+
+
+_listener: QueueListener | None = None
+
+
 def setup_logging():
+    global _listener
+
     log_level = os.environ.get("LOG_LEVEL", "INFO").upper()
     log_levels = list(LogLevels)
 
@@ -20,6 +188,34 @@ def setup_logging():
         logging.basicConfig(level=LogLevels.error)
         return
 
-    logging.basicConfig(
-        level=log_level, format=LOG_FORMAT_DEBUG, handlers=[logging.StreamHandler()]
+    if _listener is not None:
+        return
+
+    handler, _listener = create_log_pipeline(
+        json_output=os.environ.get("LOG_FORMAT", "json") == "json",
+        queue_size=int(os.environ.get("LOG_QUEUE_SIZE", "10000")),
+        sample_burst=int(os.environ.get("LOG_SAMPLE_BURST", "20")),
+        sample_window=float(os.environ.get("LOG_SAMPLE_WINDOW", "10")),
     )
+    logging.basicConfig(level=log_level, handlers=[handler])
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging():
+    """Writes out the records still queued and stops the listener thread."""
+
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def _restart_listener_after_fork():
+    # Threads do not survive fork: a forked worker starts its own listener
+    if _listener is not None:
+        _listener._thread = None
+        _listener.start()
+
+
+os.register_at_fork(after_in_child=_restart_listener_after_fork)
@@ -0,0 +1,195 @@
+import functools
+import inspect
+import logging
+import os
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+
+from prometheus_client import (
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    multiprocess,
+)
+from pymongo import monitoring
+
+log = logging.getLogger(__name__)
+
+# With several workers each process writes its samples to files in this
+# directory, and /metrics sums them. Set by `python -m app.serve` before the
+# workers start; gauges then only count the workers still alive.
+MULTIPROCESS_DIR_ENV = "PROMETHEUS_MULTIPROC_DIR"
+
+# Storage calls range from sub-millisecond cache-warm reads to multi-second uploads
+LATENCY_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+)
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "Time spent answering HTTP requests, by route template",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    "http_requests_in_flight",
+    "HTTP requests being answered",
+    ["method"],
+    multiprocess_mode="livesum",
+)
+REQUEST_BYTES = Counter(
+    "http_request_body_bytes", "Bytes received in request bodies", ["route"]
+)
+RESPONSE_BYTES = Counter(
+    "http_response_body_bytes", "Bytes sent in response bodies", ["route"]
+)
+OPERATION_LATENCY = Histogram(
+    "image_service_operation_duration_seconds",
+    "Time spent in storage, database, file and repository operations",
+    ["component", "operation"],
+    buckets=LATENCY_BUCKETS,
+)
+OPERATION_ERRORS = Counter(
+    "image_service_operation_errors",
+    "Operations that raised",
+    ["component", "operation"],
+)
+UPLOADS_IN_FLIGHT = Gauge(
+    "image_service_uploads_in_flight",
+    "Files being hashed and stored",
+    multiprocess_mode="livesum",
+)
+MINIO_CALLS_IN_FLIGHT = Gauge(
+    "image_service_minio_calls_in_flight",
+    "MinIO calls running or waiting for an object store thread",
+    multiprocess_mode="livesum",
+)
+UPLOADS_QUEUED = Gauge(
+    "image_service_uploads_queued",
+    "Uploads waiting for admission",
+    multiprocess_mode="livesum",
+)
+UPLOADS_ADMITTED = Counter(
+    "image_service_uploads_admitted", "Uploads admitted by admission control"
+)
+UPLOADS_REJECTED = Counter(
+    "image_service_uploads_rejected",
+    "Uploads rejected by admission control, by the limit that held them back",
+    ["reason"],
+)
+JOBS_PROCESSED = Counter(
+    "image_service_jobs_processed",
+    "Background job attempts, by outcome (done, retry, dead)",
+    ["kind", "outcome"],
+)
+LOG_RECORDS_DROPPED = Counter(
+    "image_service_log_records_dropped",
+    "Log records dropped because the log queue was full",
+)
+JOBS_IN_FLIGHT = Gauge(
+    "image_service_jobs_in_flight",
+    "Background jobs running",
+    multiprocess_mode="livesum",
+)
+
+
+def metrics_registry() -> CollectorRegistry:
+    """
+    The registry /metrics exposes: this process's own, or in multiprocess mode
+    one collecting the samples of every worker.
+    """
+
+    if not os.environ.get(MULTIPROCESS_DIR_ENV):
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+def mark_worker_stopped():
+    """Drops the gauges of this worker from the multiprocess totals."""
+
+    if os.environ.get(MULTIPROCESS_DIR_ENV):
+        multiprocess.mark_process_dead(os.getpid())
+
+
+@contextmanager
+def timed(component: str, operation: str) -> Iterator[None]:
+    """
+    Records the duration of the block in OPERATION_LATENCY, and counts it in
+    OPERATION_ERRORS when it raises.
+    """
+
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        OPERATION_ERRORS.labels(component, operation).inc()
+        raise
+    finally:
+        OPERATION_LATENCY.labels(component, operation).observe(
+            time.perf_counter() - start
+        )
+
+
+def instrumented(component: str):
+    """
+    Class decorator timing every public coroutine method with `timed`, under
+    the method name. Methods added later are covered without extra code.
+    """
+
+    def decorate(cls):
+        for name, method in list(vars(cls).items()):
+            if name.startswith("_") or not inspect.iscoroutinefunction(method):
+                continue
+            setattr(cls, name, _timed_method(component, name, method))
+        return cls
+
+    return decorate
+
+
+def _timed_method(component: str, operation: str, method):
+    @functools.wraps(method)
+    async def wrapper(*args, **kwargs):
+        with timed(component, operation):
+            return await method(*args, **kwargs)
+
+    return wrapper
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """
+    Times every command the driver sends (find, insert, update, findAndModify,
+    ...) from the driver's own measurements, so new queries are covered
+    without touching the repository.
+    """
+
+    def started(self, event: monitoring.CommandStartedEvent):
+        pass
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent):
+        OPERATION_LATENCY.labels("mongo", event.command_name).observe(
+            event.duration_micros / 1e6
+        )
+
+    def failed(self, event: monitoring.CommandFailedEvent):
+        OPERATION_LATENCY.labels("mongo", event.command_name).observe(
+            event.duration_micros / 1e6
+        )
+        OPERATION_ERRORS.labels("mongo", event.command_name).inc()
@@ -0,0 +1,310 @@
+import logging
+import re
+import time
+import uuid
+from collections.abc import Callable
+
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .admission import AdmissionController
+from .exceptions import AdmissionRejectedException
+from .logging import request_id
+from .metrics import REQUEST_BYTES, REQUEST_LATENCY, REQUESTS_IN_FLIGHT, RESPONSE_BYTES
+
+log = logging.getLogger(__name__)
+access_log = logging.getLogger("app.access")
+
+# Ids set by a proxy are kept when short and printable, a new one is made otherwise
+_REQUEST_ID_PATTERN = re.compile(rb"[A-Za-z0-9._:-]{1,128}")
+
+
+class _BodyTooLarge(Exception):
+    pass
+
+
+class UploadSizeLimitMiddleware:
+    """
+    Rejects upload requests whose body exceeds the limit of their path with a
+    413. `limits` maps path prefixes to a maximum body size in bytes; the
+    longest matching prefix wins.
+
+    A declared Content-Length is checked before anything is read. Bodies sent
+    without one (chunked transfer) are counted as they arrive and cut off as
+    soon as the limit is crossed, so an oversized file is never fully spooled.
+    """
+
+    def __init__(self, app: ASGIApp, limits: dict[str, int]):
+        self.app = app
+        self.limits = sorted(
+            limits.items(), key=lambda item: len(item[0]), reverse=True
+        )
+
+    def _limit_for(self, path: str) -> int | None:
+        for prefix, limit in self.limits:
+            if path.startswith(prefix):
+                return limit
+        return None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        max_body_size = None
+        if scope["type"] == "http":
+            max_body_size = self._limit_for(scope["path"])
+        if max_body_size is None:
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        content_length = headers.get(b"content-length")
+        if content_length is not None and not content_length.isdigit():
+            response = JSONResponse(
+                status_code=400, content={"detail": "Invalid Content-Length header"}
+            )
+            await response(scope, receive, send)
+            return
+        if content_length is not None and int(content_length) > max_body_size:
+            await self._reject(max_body_size, scope, receive, send)
+            return
+
+        received = 0
+        exceeded = False
+
+        async def limited_receive() -> Message:
+            nonlocal received, exceeded
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > max_body_size:
+                    exceeded = True
+                    raise _BodyTooLarge()
+            return message
+
+        async def guarded_send(message: Message):
+            # The body parser turns our exception into its own error response,
+            # which is dropped in favour of the 413
+            if not exceeded:
+                await send(message)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except _BodyTooLarge:
+            pass
+
+        if exceeded:
+            await self._reject(max_body_size, scope, receive, send)
+
+    async def _reject(
+        self, max_body_size: int, scope: Scope, receive: Receive, send: Send
+    ):
+        log.warning("Rejected request body larger than %s bytes", max_body_size)
+
+        response = JSONResponse(
+            status_code=413,
+            content={"detail": "Request body exceeds the maximum upload size"},
+        )
+        await response(scope, receive, send)
+
+
+class UploadAdmissionMiddleware:
+    """
+    Holds upload requests to the paths starting with one of `prefixes` until
+    `controller` admits them, before their body is read. Only the `methods`
+    that send a body are held. Requests not admitted
+    in time get a 429 when their user is over their own limits, a 503 when
+    the service is, with a Retry-After header either way.
+
+    `user_id` maps the Authorization header to the user the request is counted
+    against; requests it returns None for only count against the global limits.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        controller: AdmissionController,
+        prefixes: tuple[str, ...],
+        user_id: Callable[[str | None], str | None],
+        methods: tuple[str, ...] = ("POST", "PUT", "PATCH"),
+    ):
+        self.app = app
+        self.controller = controller
+        self.prefixes = prefixes
+        self.user_id = user_id
+        self.methods = methods
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if (
+            scope["type"] != "http"
+            or scope["method"] not in self.methods
+            or not scope["path"].startswith(self.prefixes)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        authorization = headers.get(b"authorization")
+        content_length = headers.get(b"content-length", b"")
+        user_id = self.user_id(
+            authorization.decode("latin-1") if authorization else None
+        )
+        try:
+            ticket = await self.controller.acquire(
+                user_id, int(content_length) if content_length.isdigit() else 0
+            )
+        except AdmissionRejectedException as e:
+            await self._reject(e, scope, receive, send)
+            return
+
+        received = 0
+
+        async def counting_receive() -> Message:
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+            return message
+
+        try:
+            await self.app(scope, counting_receive, send)
+        finally:
+            self.controller.release(ticket, received)
+
+    async def _reject(
+        self,
+        error: AdmissionRejectedException,
+        scope: Scope,
+        receive: Receive,
+        send: Send,
+    ):
+        log.warning(
+            "Rejected upload (%s), retry after %ss", error.reason, error.retry_after
+        )
+
+        response = JSONResponse(
+            status_code=429 if error.per_user else 503,
+            content={
+                "detail": "Too many uploads, retry later"
+                if error.per_user
+                else "The service is busy with other uploads, retry later"
+            },
+            headers={"Retry-After": str(error.retry_after)},
+        )
+        await response(scope, receive, send)
+
+
+class MetricsMiddleware:
+    """
+    Records the latency and body sizes of every HTTP request, labelled with the
+    route template (`/image/{image_id}`) rather than the raw path so the number
+    of series stays bounded. Requests matching no route share one label.
+    """
+
+    def __init__(self, app: ASGIApp, excluded_paths: tuple[str, ...] = ("/metrics",)):
+        self.app = app
+        self.excluded_paths = excluded_paths
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["path"] in self.excluded_paths:
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status_code = 500
+        received = 0
+        sent = 0
+
+        async def counting_receive() -> Message:
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+            return message
+
+        async def counting_send(message: Message):
+            nonlocal status_code, sent
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            elif message["type"] == "http.response.body":
+                sent += len(message.get("body", b""))
+            await send(message)
+
+        start = time.perf_counter()
+        REQUESTS_IN_FLIGHT.labels(method).inc()
+        try:
+            await self.app(scope, counting_receive, counting_send)
+        finally:
+            REQUESTS_IN_FLIGHT.labels(method).dec()
+            # The router stores the matched route in the scope
+            route = getattr(scope.get("route"), "path", "unmatched")
+            REQUEST_LATENCY.labels(method, route, str(status_code)).observe(
+                time.perf_counter() - start
+            )
+            REQUEST_BYTES.labels(route).inc(received)
+            RESPONSE_BYTES.labels(route).inc(sent)
+
+
+class RequestIdMiddleware:
+    """
+    Gives every HTTP request an id, taken from the X-Request-ID header when a
+    proxy already set one. Lines logged while the request is handled carry it,
+    and it is returned in the X-Request-ID response header. With `access_log`,
+    also logs one line per request once the response is sent.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        access_log: bool = True,
+        excluded_paths: tuple[str, ...] = ("/metrics",),
+    ):
+        self.app = app
+        self.access_log = access_log
+        self.excluded_paths = excluded_paths
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        incoming = next(
+            (value for name, value in scope["headers"] if name == b"x-request-id"),
+            b"",
+        )
+        current_id = (
+            incoming.decode()
+            if _REQUEST_ID_PATTERN.fullmatch(incoming)
+            else uuid.uuid4().hex
+        )
+        status_code = 500
+
+        async def send_with_id(message: Message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message["headers"] = [
+                    *message.get("headers", []),
+                    (b"x-request-id", current_id.encode()),
+                ]
+            await send(message)
+
+        token = request_id.set(current_id)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            if self.access_log and scope["path"] not in self.excluded_paths:
+                route = getattr(scope.get("route"), "path", "unmatched")
+                duration_ms = (time.perf_counter() - start) * 1000
+                access_log.info(
+                    "%s %s %s %.1fms",
+                    scope["method"],
+                    scope["path"],
+                    status_code,
+                    duration_ms,
+                    extra={
+                        "method": scope["method"],
+                        "route": route,
+                        "status": status_code,
+                        "duration_ms": round(duration_ms, 1),
+                    },
+                )
+            request_id.reset(token)
@@ -0,0 +1,301 @@
+import asyncio
+import functools
+import itertools
+import logging
+from collections.abc import AsyncIterator, Callable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from typing import Any, Protocol, TypeVar
+
+from minio import Minio
+from minio.datatypes import Object, Part
+from minio.error import S3Error
+from minio.helpers import ObjectWriteResult
+from urllib3 import BaseHTTPResponse
+
+from .exceptions import ObjectStoreException
+from .metrics import MINIO_CALLS_IN_FLIGHT, timed
+
+log = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+def list_objects_page(objects: Iterator[Object], page_size: int) -> list[Object]:
+    # The generator fetches the next listing page from S3 when it runs dry
+    return list(itertools.islice(objects, page_size))
+
+
+class ObjectStore(Protocol):
+    """
+    Storage backend of the repository: buckets of named objects, with the
+    calls of the MinIO client. Every call raises ObjectStoreException, with
+    the NoSuchKey code for a missing object. Selected by STORAGE_BACKEND.
+    """
+
+    async def put_object(
+        self,
+        bucket_name: str,
+        object_name: str,
+        data: Any,
+        length: int,
+        content_type: str = "application/octet-stream",
+        **kwargs: Any,
+    ) -> Any: ...
+
+    async def remove_object(self, bucket_name: str, object_name: str) -> None: ...
+
+    async def stat_object(self, bucket_name: str, object_name: str) -> Object: ...
+
+    async def get_object(
+        self, bucket_name: str, object_name: str, offset: int = 0, length: int = 0
+    ) -> Any: ...
+
+    def iter_object(
+        self, response: Any, chunk_size: int = 64 * 1024
+    ) -> AsyncIterator[bytes | memoryview]: ...
+
+    def list_objects(
+        self, bucket_name: str, prefix: str | None = None, page_size: int = 1000
+    ) -> AsyncIterator[list[Object]]: ...
+
+    async def presigned_put_object(
+        self, bucket_name: str, object_name: str, expires: timedelta
+    ) -> str: ...
+
+    async def presigned_get_object(
+        self, bucket_name: str, object_name: str, expires: timedelta
+    ) -> str: ...
+
+    async def create_multipart_upload(
+        self, bucket_name: str, object_name: str, content_type: str
+    ) -> str: ...
+
+    async def upload_part(
+        self,
+        bucket_name: str,
+        object_name: str,
+        upload_id: str,
+        part_number: int,
+        data: bytes,
+    ) -> str: ...
+
+    async def complete_multipart_upload(
+        self,
+        bucket_name: str,
+        object_name: str,
+        upload_id: str,
+        parts: list[tuple[int, str]],
+    ) -> None: ...
+
+    async def abort_multipart_upload(
+        self, bucket_name: str, object_name: str, upload_id: str
+    ) -> None: ...
+
+    async def bucket_exists(self, bucket_name: str) -> bool: ...
+
+    async def make_bucket(self, bucket_name: str) -> None: ...
+
+    def shutdown(self, wait: bool = True) -> None: ...
+
+
+class AsyncObjectStore:
+    """
+    Async facade over the blocking MinIO client, the default ObjectStore.
+
+    Every call is dispatched to a bounded thread pool so S3 round trips never
+    block the event loop. The pool size is the maximum number of storage
+    operations in flight; extra calls wait in the executor queue.
+    """
+
+    def __init__(
+        self,
+        client: Minio,
+        max_concurrency: int = 16,
+        presign_client: Minio | None = None,
+    ):
+        self.client = client
+        # Presigned URLs are signed for the host the caller will use, which
+        # may differ from the internal endpoint
+        self.presign_client = presign_client or client
+        self.max_concurrency = max_concurrency
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_concurrency, thread_name_prefix="object-store"
+        )
+
+    async def _run(self, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        loop = asyncio.get_running_loop()
+        # Timed from the caller's side, so waiting for a free thread is included
+        with (
+            MINIO_CALLS_IN_FLIGHT.track_inprogress(),
+            timed("minio", getattr(func, "__name__", "call")),
+        ):
+            try:
+                return await loop.run_in_executor(
+                    self._executor, functools.partial(func, *args, **kwargs)
+                )
+            except S3Error as e:
+                raise ObjectStoreException(str(e), code=e.code) from e
+
+    async def put_object(
+        self,
+        bucket_name: str,
+        object_name: str,
+        data: Any,
+        length: int,
+        content_type: str = "application/octet-stream",
+        **kwargs: Any,
+    ) -> ObjectWriteResult:
+        return await self._run(
+            self.client.put_object,
+            bucket_name=bucket_name,
+            object_name=object_name,
+            data=data,
+            length=length,
+            content_type=content_type,
+            **kwargs,
+        )
+
+    async def remove_object(self, bucket_name: str, object_name: str) -> None:
+        await self._run(
+            self.client.remove_object,
+            bucket_name=bucket_name,
+            object_name=object_name,
+        )
+
+    async def stat_object(self, bucket_name: str, object_name: str) -> Object:
+        return await self._run(
+            self.client.stat_object,
+            bucket_name=bucket_name,
+            object_name=object_name,
+        )
+
+    async def get_object(
+        self, bucket_name: str, object_name: str, offset: int = 0, length: int = 0
+    ) -> BaseHTTPResponse:
+        """
+        Opens a GET on the object. Errors such as a missing key are raised here,
+        before any byte is streamed. The caller must consume the response with
+        `iter_object`, which releases the connection.
+        """
+
+        return await self._run(
+            self.client.get_object,
+            bucket_name=bucket_name,
+            object_name=object_name,
+            offset=offset,
+            length=length,
+        )
+
+    async def iter_object(
+        self, response: BaseHTTPResponse, chunk_size: int = 64 * 1024
+    ) -> AsyncIterator[bytes]:
+        """
+        Yields the body of an open GET in `chunk_size` pieces, reading each one
+        on the executor so only a single chunk is buffered at a time.
+        """
+
+        try:
+            while True:
+                chunk = await self._run(response.read, chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            response.close()
+            response.release_conn()
+
+    async def list_objects(
+        self, bucket_name: str, prefix: str | None = None, page_size: int = 1000
+    ) -> AsyncIterator[list[Object]]:
+        """
+        Yields every object of the bucket in pages of `page_size`, in key order.
+        Each page is pulled on the executor, so only one page is held at a time.
+        """
+
+        objects = self.client.list_objects(bucket_name, prefix=prefix, recursive=True)
+        while page := await self._run(list_objects_page, objects, page_size):
+            yield page
+
+    async def presigned_put_object(
+        self, bucket_name: str, object_name: str, expires: timedelta
+    ) -> str:
+        return await self._run(
+            self.presign_client.presigned_put_object,
+            bucket_name=bucket_name,
+            object_name=object_name,
+            expires=expires,
+        )
+
+    async def presigned_get_object(
+        self, bucket_name: str, object_name: str, expires: timedelta
+    ) -> str:
+        return await self._run(
+            self.presign_client.presigned_get_object,
+            bucket_name=bucket_name,
+            object_name=object_name,
+            expires=expires,
+        )
+
+    # The MinIO client only exposes multipart uploads through put_object, which
+    # needs every part in one call; these are the S3 calls it makes for them
+    async def create_multipart_upload(
+        self, bucket_name: str, object_name: str, content_type: str
+    ) -> str:
+        return await self._run(
+            self.client._create_multipart_upload,
+            bucket_name,
+            object_name,
+            {"Content-Type": content_type},
+        )
+
+    async def upload_part(
+        self,
+        bucket_name: str,
+        object_name: str,
+        upload_id: str,
+        part_number: int,
+        data: bytes,
+    ) -> str:
+        """Stores one part of at least 5 MiB, except the last. Returns its etag."""
+
+        return await self._run(
+            self.client._upload_part,
+            bucket_name=bucket_name,
+            object_name=object_name,
+            data=data,
+            headers=None,
+            upload_id=upload_id,
+            part_number=part_number,
+        )
+
+    async def complete_multipart_upload(
+        self,
+        bucket_name: str,
+        object_name: str,
+        upload_id: str,
+        parts: list[tuple[int, str]],
+    ) -> None:
+        await self._run(
+            self.client._complete_multipart_upload,
+            bucket_name,
+            object_name,
+            upload_id,
+            [Part(part_number, etag) for part_number, etag in parts],
+        )
+
+    async def abort_multipart_upload(
+        self, bucket_name: str, object_name: str, upload_id: str
+    ) -> None:
+        await self._run(
+            self.client._abort_multipart_upload, bucket_name, object_name, upload_id
+        )
+
+    async def bucket_exists(self, bucket_name: str) -> bool:
+        return await self._run(self.client.bucket_exists, bucket_name)
+
+    async def make_bucket(self, bucket_name: str) -> None:
+        await self._run(self.client.make_bucket, bucket_name)
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._executor.shutdown(wait=wait)
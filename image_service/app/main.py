@@ -1,4 +1,6 @@
 import os
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, status
 from fastapi.responses import JSONResponse
 from dotenv import load_dotenv
@@ -13,19 +15,98 @@ dotenv_path = os.path.join(
 load_dotenv(dotenv_path)
 
 from app.api.v1.endpoints.image import router
-from app.core.config import minio_client, create_minio_bucket
+from app.api.v1.endpoints.metrics import router as metrics_router
+from app.core.config import (
+    create_minio_bucket,
+    close_clients,
+    get_admission_controller,
+    get_blob_collection,
+    get_image_collection,
+    get_job_collection,
+    get_object_store,
+    get_pending_upload_collection,
+    ACCESS_LOG,
+    MAX_UPLOAD_SIZE,
+    BULK_UPLOAD_MAX_FILES,
+    RENDITION_WORKERS,
+    STARTUP_WARMUP,
+)
+from app.core.metrics import mark_worker_stopped
+from app.core.middleware import (
+    MetricsMiddleware,
+    UploadAdmissionMiddleware,
+    RequestIdMiddleware,
+    UploadSizeLimitMiddleware,
+)
+from app.repository.indexes import ensure_indexes
+from app.services.image_service import register_job_handlers
+from app.services.job_queue import get_job_queue, shutdown_job_queue
+from app.services.renditions import shutdown_rendition_pool, warm_up_rendition_pool
+from app.utilities.current_user_id import user_id_from_authorization
 from .services.exceptions import (
     InvalidFileTypeException,
     ImageStorageException,
     ImageNotFoundException,
 )
 
-create_minio_bucket(minio_client)
-
 log = logging.getLogger(__name__)
 setup_logging()
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await create_minio_bucket(get_object_store())
+    await ensure_indexes(
+        get_image_collection(),
+        get_blob_collection(),
+        get_pending_upload_collection(),
+        get_job_collection(),
+    )
+    if STARTUP_WARMUP and RENDITION_WORKERS:
+        await asyncio.to_thread(warm_up_rendition_pool, RENDITION_WORKERS)
+    job_queue = get_job_queue()
+    register_job_handlers(job_queue)
+    await job_queue.start()
+    log.info("Image service ready")
+
+    yield
+
+    # The server stops accepting connections and waits for in-flight requests,
+    # uploads included, for up to SERVER_GRACEFUL_TIMEOUT before this runs.
+    # Running jobs finish before the clients they use are closed.
+    await shutdown_job_queue()
+    shutdown_rendition_pool()
+    await close_clients()
+    mark_worker_stopped()
+
+
+app = FastAPI(lifespan=lifespan)
+
+# Innermost of the upload middleware, so oversized bodies are refused before
+# they queue, and every admitted upload keeps its slot until it is stored
+app.add_middleware(
+    UploadAdmissionMiddleware,
+    controller=get_admission_controller(),
+    prefixes=("/image/upload/", "/image/update/", "/image/uploads/"),
+    user_id=user_id_from_authorization,
+)
+# Leave room for the multipart form boundaries and part headers around each file
+FORM_OVERHEAD = 64 * 1024
+app.add_middleware(
+    UploadSizeLimitMiddleware,
+    limits={
+        "/image/upload/": MAX_UPLOAD_SIZE + FORM_OVERHEAD,
+        "/image/update/": MAX_UPLOAD_SIZE + FORM_OVERHEAD,
+        # Raw chunks of a resumable upload, with no form around them
+        "/image/uploads/": MAX_UPLOAD_SIZE,
+        "/image/upload/bulk/": (MAX_UPLOAD_SIZE + FORM_OVERHEAD)
+        * BULK_UPLOAD_MAX_FILES,
+    },
+)
+# Added after the size limit so it also times the requests rejected there
+app.add_middleware(MetricsMiddleware)
+# Outermost, so every line logged for a request carries its id
+app.add_middleware(RequestIdMiddleware, access_log=ACCESS_LOG)
 
 
 @app.exception_handler(InvalidFileTypeException)
@@ -51,3 +132,4 @@ async def image_storage_handler(exception: ImageStorageException):
 
 
 app.include_router(router, tags=["image"])
+app.include_router(metrics_router, tags=["metrics"])
@@ -0,0 +1,87 @@
+"""
+Finds objects in the bucket without metadata, and images whose object is gone.
+
+Reports only by default; `--remove` also deletes the orphan objects. Safe to
+run from cron or a scheduled job while the service is serving.
+
+Usage (from the image_service directory):
+
+    python -m app.reconcile
+    python -m app.reconcile --remove --grace-period 86400
+"""
+
+import argparse
+import asyncio
+import json
+import os
+from dataclasses import asdict
+
+from dotenv import load_dotenv
+
+dotenv_path = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".env"
+)
+load_dotenv(dotenv_path)
+
+from app.core.config import (
+    RECONCILE_GRACE_PERIOD,
+    RECONCILE_PAGE_SIZE,
+    close_clients,
+    get_blob_collection,
+    get_image_collection,
+    get_metadata_cache,
+    get_object_store,
+    get_pending_upload_collection,
+)
+from app.core.logging import setup_logging
+from app.repository.image_repository import ImageRepository
+from app.services.reconciler import Reconciler, ReconcileReport
+
+
+async def reconcile(args: argparse.Namespace) -> ReconcileReport:
+    repository = ImageRepository(
+        get_object_store(),
+        get_image_collection(),
+        get_blob_collection(),
+        get_metadata_cache(),
+        get_pending_upload_collection(),
+    )
+    reconciler = Reconciler(
+        repository,
+        grace_period=args.grace_period,
+        page_size=args.page_size,
+        remove=args.remove,
+    )
+
+    try:
+        return await reconciler.run(check_images=not args.skip_images)
+    finally:
+        await close_clients()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--remove", action="store_true", help="delete the orphan objects"
+    )
+    parser.add_argument(
+        "--grace-period",
+        type=float,
+        default=RECONCILE_GRACE_PERIOD,
+        help="seconds an object or image must be old before it is checked",
+    )
+    parser.add_argument("--page-size", type=int, default=RECONCILE_PAGE_SIZE)
+    parser.add_argument(
+        "--skip-images",
+        action="store_true",
+        help="do not check that every image still has its object",
+    )
+    args = parser.parse_args()
+
+    setup_logging()
+    report = asyncio.run(reconcile(args))
+    print(json.dumps(asdict(report)))
+
+
+if __name__ == "__main__":
+    main()
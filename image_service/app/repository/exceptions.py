@@ -10,3 +10,7 @@ class StorageOperationError(RepositoryException):
 
 class DatabaseOperationError(RepositoryException):
     pass
+
+
+class ObjectTooLargeError(RepositoryException):
+    pass
@@ -1,185 +1,1221 @@
-import os
+import asyncio
+import hashlib
 import io
-from fastapi import UploadFile, Depends
-from uuid import uuid4
-from minio import Minio
-from minio.error import S3Error
-from pymongo.asynchronous.collection import AsyncCollection
-from pymongo.errors import PyMongoError
+import logging
+import os
+from collections.abc import AsyncIterator
+from datetime import datetime, timedelta
+from typing import BinaryIO
+from uuid import UUID
+
 from bson import ObjectId
 from bson.errors import InvalidId
-from datetime import datetime
-import logging
+from fastapi import Depends, UploadFile
+from minio.datatypes import Object
+from pymongo import DESCENDING, ReturnDocument
+from pymongo.asynchronous.collection import AsyncCollection
+from pymongo.errors import BulkWriteError, DuplicateKeyError, PyMongoError
 
-from ..core.config import get_minio_client, image_collection
-from ..repository.mongo.image import ImageModel
-from ..repository.exceptions import StorageOperationError, DatabaseOperationError
+from ..core.cache import MetadataCache
+from ..core.config import (
+    MAX_UPLOAD_SIZE,
+    PRESIGNED_URL_EXPIRY,
+    RESUMABLE_UPLOAD_EXPIRY,
+    UPLOAD_PART_SIZE,
+    get_blob_collection,
+    get_image_collection,
+    get_metadata_cache,
+    get_object_store,
+    get_pending_upload_collection,
+)
+from ..core.exceptions import ObjectStoreException
+from ..core.metrics import UPLOADS_IN_FLIGHT, instrumented, timed
+from ..core.object_store import ObjectStore
+from ..repository.exceptions import (
+    DatabaseOperationError,
+    ObjectTooLargeError,
+    StorageOperationError,
+)
+from ..repository.mongo.image import (
+    ImageModel,
+    PendingUploadModel,
+    UploadSessionModel,
+)
+from ..utilities.image_header import ImageHeader
 
 log = logging.getLogger(__name__)
 
+# Reads only fetch the fields of the response model
+IMAGE_PROJECTION = {name: 1 for name in ImageModel.model_fields if name != "id"}
+
+
+def image_document(user_id: str | UUID, **fields) -> dict:
+    """
+    The document of a new image, as ImageModel would dump it: the user id as a
+    UUID and unknown (None) fields left out. The values are the service's own,
+    so it is built directly instead of being validated through the model.
+    """
+
+    document = {"user_id": UUID(str(user_id)), **fields}
+    return {name: value for name, value in document.items() if value is not None}
+
 
+class SizeLimitedReader:
+    """
+    Read-only wrapper around the upload spool that counts the bytes handed to
+    storage and aborts the upload as soon as they exceed `max_size`.
+    """
+
+    def __init__(self, stream: BinaryIO, max_size: int):
+        self._stream = stream
+        self._max_size = max_size
+        self.bytes_read = 0
+
+    def read(self, size: int = -1) -> bytes:
+        chunk = self._stream.read(size)
+        self.bytes_read += len(chunk)
+        if self.bytes_read > self._max_size:
+            raise ObjectTooLargeError(
+                f"File exceeds the maximum upload size of {self._max_size} bytes"
+            )
+        return chunk
+
+
+@instrumented("repository")
 class ImageRepository:
     _MINIO_BUCKET = os.environ.get("MINIO_BUCKET")
     _MINIO_HOST = os.environ.get("MINIO_HOST")
 
     def __init__(
         self,
-        store_object_bucket: Minio = Depends(get_minio_client),
-        db: AsyncCollection = Depends(lambda: image_collection),
+        store_object_bucket: ObjectStore = Depends(get_object_store),
+        db: AsyncCollection = Depends(get_image_collection),
+        blobs: AsyncCollection = Depends(get_blob_collection),
+        cache: MetadataCache = Depends(get_metadata_cache),
+        pending_uploads: AsyncCollection = Depends(get_pending_upload_collection),
     ):
         self.bucket = store_object_bucket
         self.db = db
+        self.blobs = blobs
+        self.cache = cache
+        self.pending_uploads = pending_uploads
+
+    def _object_url(self, object_name: str) -> str:
+        return f"http://{self._MINIO_HOST}/{self._MINIO_BUCKET}/{object_name}"
+
+    @staticmethod
+    def _hash_spool(stream: BinaryIO, chunk_size: int = 1024 * 1024) -> tuple[str, int]:
+        """
+        Computes the SHA-256 and size of the spooled upload in fixed-size
+        chunks, stopping as soon as the size limit is crossed.
+        """
+
+        digest = hashlib.sha256()
+        size = 0
+        stream.seek(0)
+        with timed("file", "read"):
+            while chunk := stream.read(chunk_size):
+                size += len(chunk)
+                if size > MAX_UPLOAD_SIZE:
+                    raise ObjectTooLargeError(
+                        f"File exceeds the maximum upload size of {MAX_UPLOAD_SIZE} bytes"
+                    )
+                digest.update(chunk)
+
+        return digest.hexdigest(), size
 
     async def _prepare_file_for_upload(
-        self, file: UploadFile
-    ) -> tuple[str, bytes, int, str]:
+        self, file: UploadFile, image_header: ImageHeader | None = None
+    ) -> tuple[str, SizeLimitedReader, int, str, str]:
         """
-        Prepares file for upload by generating a unique name and reading its content.
+        Prepares file for upload by hashing its spooled content and deriving a
+        content-addressed object name. Nothing is read fully into memory.
         """
 
-        file_id = str(uuid4())
+        if file.size is not None and file.size > MAX_UPLOAD_SIZE:
+            raise ObjectTooLargeError(
+                f"File exceeds the maximum upload size of {MAX_UPLOAD_SIZE} bytes"
+            )
+
+        # The hash decides whether the bytes are uploaded at all, so it is taken
+        # in a streaming pass over the spool before the upload
+        content_hash, length = await asyncio.to_thread(self._hash_spool, file.file)
+
         file_extension = file.filename.split(".")[-1]  # type:ignore
-        object_name = f"{file_id}.{file_extension}"
+        object_name = f"{content_hash}.{file_extension}"
 
-        content: bytes = await file.read()
-        content_size: int = len(content)
-        content_type = file.content_type
+        file.file.seek(0)
+        stream = SizeLimitedReader(file.file, MAX_UPLOAD_SIZE)
+        # The type read from the bytes wins over the one the client sent
+        content_type = image_header.content_type if image_header else file.content_type
 
-        return object_name, content, content_size, content_type  # type:ignore
+        return object_name, stream, length, content_type, content_hash  # type:ignore
 
-    async def create(self, file: UploadFile, user_id: str):
+    async def _upload(
+        self,
+        object_name: str,
+        stream: SizeLimitedReader,
+        length: int,
+        content_type: str,
+    ) -> int:
         """
-        Uploads an image to MinIO and saves its metadata to MongoDB
+        Streams the upload to storage one part at a time, so at most
+        UPLOAD_PART_SIZE bytes of the file are held in memory per request.
+        Returns the number of bytes written.
         """
 
-        (
-            object_name,
-            content,
-            content_size,
-            content_type,
-        ) = await self._prepare_file_for_upload(file)
+        await self.bucket.put_object(
+            bucket_name=self._MINIO_BUCKET,  # type:ignore
+            object_name=object_name,
+            data=stream,
+            length=length,
+            content_type=content_type,
+            part_size=UPLOAD_PART_SIZE,
+            num_parallel_uploads=1,
+        )
+
+        return stream.bytes_read
+
+    async def _acquire_blob(
+        self,
+        object_name: str,
+        stream: SizeLimitedReader,
+        length: int,
+        content_type: str,
+        content_hash: str,
+    ) -> dict:
+        """
+        Takes a reference on the stored content with this hash, uploading it
+        only when no image already uses the same bytes.
+        """
+
+        blob = await self.blobs.find_one_and_update(
+            {"_id": content_hash},
+            {"$inc": {"refcount": 1}},
+            return_document=ReturnDocument.AFTER,
+        )
+        if blob:
+            log.info(
+                "Reusing stored object %s for duplicate upload", blob["object_name"]
+            )
+            return blob
+
+        size = await self._upload(object_name, stream, length, content_type)
+        blob = {
+            "_id": content_hash,
+            "object_name": object_name,
+            "size": size,
+            "content_type": content_type,
+            "refcount": 1,
+            "created_at": datetime.now(),
+        }
 
         try:
-            self.bucket.put_object(
-                bucket_name=self._MINIO_BUCKET,  # type:ignore
-                object_name=object_name,
-                data=io.BytesIO(content),
-                length=content_size,
-                content_type=content_type,
+            await self.blobs.insert_one(blob)
+            return blob
+
+        except DuplicateKeyError:
+            # A concurrent upload of the same bytes registered the blob first
+            blob = await self.blobs.find_one_and_update(
+                {"_id": content_hash},
+                {"$inc": {"refcount": 1}},
+                return_document=ReturnDocument.AFTER,
             )
+            if not blob:
+                # ...and its last image released it before the reference was
+                # taken, so the object this upload wrote may be removed too
+                await self.bucket.remove_object(
+                    bucket_name=self._MINIO_BUCKET,  # type:ignore
+                    object_name=object_name,
+                )
+                raise StorageOperationError(
+                    f"Stored content {content_hash} was released during upload"
+                )
+            if blob["object_name"] != object_name:
+                await self.bucket.remove_object(
+                    bucket_name=self._MINIO_BUCKET,  # type:ignore
+                    object_name=object_name,
+                )
+            return blob
 
-            file_url = f"http://{self._MINIO_HOST}/{self._MINIO_BUCKET}/{object_name}"
+    async def _release_blob(self, image_doc: dict) -> list[str]:
+        """
+        Drops the image's reference on its stored content and returns the
+        object names that are no longer referenced and can be removed.
+        """
 
-            image = ImageModel(
-                user_id=user_id,  # type:ignore
-                filename=file.filename,  # type:ignore
+        content_hash = image_doc.get("content_hash")
+        if not content_hash:
+            # Images stored before deduplication own their object
+            return [image_doc["object_name"]] + [
+                rendition["object_name"]
+                for rendition in image_doc.get("renditions", [])
+            ]
+
+        blob = await self.blobs.find_one_and_update(
+            {"_id": content_hash},
+            {"$inc": {"refcount": -1}},
+            return_document=ReturnDocument.AFTER,
+        )
+        if not blob or blob["refcount"] > 0:
+            return []
+
+        # Only remove the blob if no upload took a new reference meanwhile
+        result = await self.blobs.delete_one({"_id": content_hash, "refcount": 0})
+        if not result.deleted_count:
+            return []
+
+        return [blob["object_name"]] + [
+            rendition["object_name"] for rendition in blob.get("renditions", [])
+        ]
+
+    async def _remove_objects(self, object_names: list[str]):
+        for object_name in object_names:
+            await self.bucket.remove_object(
+                bucket_name=self._MINIO_BUCKET,  # type:ignore
                 object_name=object_name,
-                url=file_url,
-                content_type=file.content_type,
-                size=content_size,
-                uploaded_at=datetime.now(),
             )
 
-            new_image = image.model_dump(
-                by_alias=True, exclude={"id"}, exclude_none=True, exclude_unset=True
+    async def _store_new_image(
+        self, file: UploadFile, user_id: str, image_header: ImageHeader | None = None
+    ) -> dict:
+        """
+        Stores the file content and returns the metadata document to insert
+        """
+
+        with UPLOADS_IN_FLIGHT.track_inprogress():
+            (
+                object_name,
+                stream,
+                length,
+                content_type,
+                content_hash,
+            ) = await self._prepare_file_for_upload(file, image_header)
+
+            blob = await self._acquire_blob(
+                object_name, stream, length, content_type, content_hash
             )
-            result = await self.db.insert_one(new_image)
-            new_image["_id"] = result.inserted_id
 
-            return new_image
+        return image_document(
+            user_id,
+            filename=file.filename,
+            object_name=blob["object_name"],
+            url=self._object_url(blob["object_name"]),
+            content_type=content_type,
+            size=blob["size"],
+            width=image_header.width if image_header else None,
+            height=image_header.height if image_header else None,
+            content_hash=content_hash,
+            uploaded_at=datetime.now(),
+            renditions=blob.get("renditions", []),
+        )
+
+    async def create(
+        self, file: UploadFile, user_id: str, image_header: ImageHeader | None = None
+    ):
+        """
+        Uploads an image to storage and saves its metadata to MongoDB
+        """
+
+        try:
+            new_image = await self._store_new_image(file, user_id, image_header)
 
-        except S3Error as e:
-            log.error(f"Error uploading file to MinIO: {e}")
+        except ObjectStoreException as e:
+            log.error("Error uploading file to storage: %s", e)
 
-            raise StorageOperationError(f"Error uploading file to MinIO: {e}") from e
+            raise StorageOperationError(f"Error uploading file to storage: {e}") from e
 
         except (PyMongoError, InvalidId) as e:
-            log.error(f"Database error during creation: {e}")
+            log.error("Database error during creation: %s", e)
 
             raise DatabaseOperationError(f"Database error during creation: {e}") from e
 
-    async def update(self, file: UploadFile, image_url: str, user_id: str):
+        try:
+            result = await self.db.insert_one(new_image)
+
+        except PyMongoError as e:
+            log.error("Database error during creation: %s", e)
+            await self._release_unsaved_image(new_image)
+
+            raise DatabaseOperationError(f"Database error during creation: {e}") from e
+
+        new_image["_id"] = result.inserted_id
+
+        return new_image
+
+    async def _release_unsaved_image(self, document: dict):
+        """Gives back the content reference taken for a document never saved."""
+
+        try:
+            await self._remove_objects(await self._release_blob(document))
+        except (ObjectStoreException, PyMongoError) as e:
+            log.error("Could not release content of an unsaved image: %s", e)
+
+    async def _store_new_image_or_error(
+        self,
+        file: UploadFile,
+        user_id: str,
+        image_header: ImageHeader | None,
+        semaphore: asyncio.Semaphore,
+    ) -> dict | Exception:
+        async with semaphore:
+            try:
+                return await self._store_new_image(file, user_id, image_header)
+
+            except ObjectStoreException as e:
+                log.error("Error uploading %s to storage: %s", file.filename, e)
+
+                return StorageOperationError(f"Error uploading file to storage: {e}")
+
+            except PyMongoError as e:
+                log.error("Database error while storing %s: %s", file.filename, e)
+
+                return DatabaseOperationError(f"Database error during creation: {e}")
+
+            except ObjectTooLargeError as e:
+                return e
+
+    async def create_many(
+        self,
+        files: list[UploadFile],
+        user_id: str,
+        max_concurrency: int,
+        image_headers: list[ImageHeader] | None = None,
+    ) -> list[dict | Exception]:
         """
-        Update an image to MinIO and saves its metadata to MongoDB
+        Uploads several files with at most `max_concurrency` storage writes in
+        flight, then saves all their metadata with a single insert_many.
+        Returns, in order, the created document or the error for each file.
         """
 
+        semaphore = asyncio.Semaphore(max_concurrency)
+        outcomes = await asyncio.gather(
+            *(
+                self._store_new_image_or_error(file, user_id, image_header, semaphore)
+                for file, image_header in zip(
+                    files, image_headers or [None] * len(files)
+                )
+            )
+        )
+
+        positions = [
+            i for i, outcome in enumerate(outcomes) if isinstance(outcome, dict)
+        ]
+        documents = [outcomes[i] for i in positions]
+        if not documents:
+            return outcomes
+
+        failed: dict[int, Exception] = {}
         try:
-            image_doc = await self.db.find_one({"url": ObjectId(image_url)})
-            if not image_doc:
-                return None
+            # insert_many sets each document's _id in place
+            await self.db.insert_many(documents, ordered=False)
 
-            object_name = image_doc["object_name"]
-            (
-                _,
-                content,
-                content_size,
-                content_type,
-            ) = await self._prepare_file_for_upload(file)
+        except BulkWriteError as e:
+            for write_error in e.details.get("writeErrors", []):
+                failed[write_error["index"]] = DatabaseOperationError(
+                    f"Database error during creation: {write_error.get('errmsg')}"
+                )
+
+        except PyMongoError as e:
+            log.error("Database error during bulk creation: %s", e)
+
+            failed = {
+                index: DatabaseOperationError(f"Database error during creation: {e}")
+                for index in range(len(documents))
+            }
+
+        for index, error in failed.items():
+            outcomes[positions[index]] = error
+            await self._release_unsaved_image(documents[index])
+
+        return outcomes
+
+    async def find_owned_id(self, image_url: str, user_id: str) -> str | None:
+        """
+        Id of the newest image of `user_id` stored under `image_url`. Clients
+        that only kept the url address their images this way; the owner filter
+        keeps other users' images with the same content out of reach.
+        """
+
+        try:
+            image = await self.db.find_one(
+                {"url": image_url, "user_id": UUID(str(user_id))},
+                {"_id": 1},
+                sort=[("uploaded_at", DESCENDING), ("_id", DESCENDING)],
+            )
+        except ValueError:
+            return None
+        except PyMongoError as e:
+            log.error("Database error while resolving an image url: %s", e)
+
+            raise DatabaseOperationError(
+                f"Database error while resolving an image url: {e}"
+            ) from e
+
+        return str(image["_id"]) if image else None
+
+    @staticmethod
+    def _owned_image_query(image_id: str, user_id: str) -> dict | None:
+        """
+        Filter for one image of one user. Deduplicated images share their url,
+        so a single image is only told apart by its id.
+        """
+
+        try:
+            return {"_id": ObjectId(image_id), "user_id": UUID(str(user_id))}
+        except (InvalidId, TypeError, ValueError):
+            return None
 
-            self.bucket.put_object(
+    async def update(
+        self,
+        file: UploadFile,
+        image_id: str,
+        user_id: str,
+        image_header: ImageHeader | None = None,
+    ) -> tuple[dict | None, list[str]]:
+        """
+        Replaces the content of the image `image_id` owned by `user_id`.
+
+        The new bytes are stored under their own content-addressed key first,
+        then the metadata is switched over in a single atomic write. The old
+        object is only released after that commit, so readers always see
+        either the old or the new version, never a missing object.
+
+        Returns the updated image, None when there is no such image, with the
+        object names no longer referenced. As with `delete`, removing those
+        objects is left to the caller.
+        """
+
+        query = self._owned_image_query(image_id, user_id)
+        if query is None:
+            return None, []
+
+        try:
+            with UPLOADS_IN_FLIGHT.track_inprogress():
+                (
+                    object_name,
+                    stream,
+                    length,
+                    content_type,
+                    content_hash,
+                ) = await self._prepare_file_for_upload(file, image_header)
+
+                blob = await self._acquire_blob(
+                    object_name, stream, length, content_type, content_hash
+                )
+
+            changes = {
+                "filename": file.filename,
+                "user_id": UUID(str(user_id)),
+                "object_name": blob["object_name"],
+                "url": self._object_url(blob["object_name"]),
+                "size": blob["size"],
+                "width": image_header.width if image_header else None,
+                "height": image_header.height if image_header else None,
+                "content_type": content_type,
+                "content_hash": content_hash,
+                "renditions": blob.get("renditions", []),
+                "uploaded_at": datetime.now(),
+            }
+            # The document as it was replaced tells exactly which blob this
+            # write released, even when updates of the same image race
+            previous_doc = await self.db.find_one_and_update(
+                query,
+                {"$set": changes},
+                return_document=ReturnDocument.BEFORE,
+            )
+            if not previous_doc:
+                # Nothing to update, drop the reference taken above
+                return None, await self._release_blob(changes)
+
+            await self.cache.invalidate(str(previous_doc["_id"]))
+
+            return {**previous_doc, **changes}, await self._release_blob(previous_doc)
+
+        except ObjectStoreException as e:
+            log.error("Error updating file to storage: %s", e)
+
+            raise StorageOperationError(f"Error updating file to storage: {e}") from e
+
+        except PyMongoError as e:
+            log.error("Database error during update: %s", e)
+
+            raise DatabaseOperationError(f"Database error during update: {e}") from e
+
+    async def create_pending_upload(
+        self, user_id: str, filename: str, content_type: str, size: int
+    ) -> tuple[dict, str]:
+        """
+        Records an announced direct upload and returns it with a presigned PUT
+        URL for its object. The bytes go straight from the client to MinIO.
+        """
+
+        upload_id = ObjectId()
+        file_extension = filename.split(".")[-1]
+        created_at = datetime.now()
+        expires = timedelta(seconds=PRESIGNED_URL_EXPIRY)
+        pending_upload = PendingUploadModel(
+            user_id=user_id,  # type:ignore
+            filename=filename,
+            object_name=f"uploads/{upload_id}.{file_extension}",
+            content_type=content_type,
+            size=size,
+            created_at=created_at,
+            expires_at=created_at + expires,
+        ).model_dump(by_alias=True, exclude={"id"})
+        pending_upload["_id"] = upload_id
+
+        try:
+            upload_url = await self.bucket.presigned_put_object(
                 bucket_name=self._MINIO_BUCKET,  # type:ignore
+                object_name=pending_upload["object_name"],
+                expires=expires,
+            )
+            await self.pending_uploads.insert_one(pending_upload)
+
+            return pending_upload, upload_url
+
+        except ObjectStoreException as e:
+            log.error("Error presigning upload URL: %s", e)
+
+            raise StorageOperationError(f"Error presigning upload URL: {e}") from e
+
+        except PyMongoError as e:
+            log.error("Database error while recording upload: %s", e)
+
+            raise DatabaseOperationError(
+                f"Database error while recording upload: {e}"
+            ) from e
+
+    async def get_pending_upload(self, upload_id: str, user_id: str) -> dict | None:
+        try:
+            query = {"_id": ObjectId(upload_id), "user_id": UUID(user_id)}
+        except (InvalidId, ValueError):
+            return None
+
+        try:
+            return await self.pending_uploads.find_one(query)
+
+        except PyMongoError as e:
+            log.error("Database error while retrieving upload: %s", e)
+
+            raise DatabaseOperationError(
+                f"Database error while retrieving upload: {e}"
+            ) from e
+
+    async def complete_pending_upload(
+        self,
+        pending_upload: dict,
+        size: int,
+        image_header: ImageHeader | None = None,
+    ) -> dict:
+        """
+        Turns a verified pending upload into an image with the same id. The
+        object was not hashed by the service, so the image owns it instead of
+        sharing a deduplicated blob.
+        """
+
+        image = image_document(
+            pending_upload["user_id"],
+            filename=pending_upload["filename"],
+            object_name=pending_upload["object_name"],
+            url=self._object_url(pending_upload["object_name"]),
+            content_type=pending_upload["content_type"],
+            size=size,
+            width=image_header.width if image_header else None,
+            height=image_header.height if image_header else None,
+            uploaded_at=datetime.now(),
+            renditions=[],
+        )
+        image["_id"] = pending_upload["_id"]
+
+        try:
+            try:
+                await self.db.insert_one(image)
+            except DuplicateKeyError:
+                # Completed twice, the first call created the image
+                image = await self.db.find_one({"_id": pending_upload["_id"]})
+
+            await self.pending_uploads.delete_one({"_id": pending_upload["_id"]})
+            return image
+
+        except PyMongoError as e:
+            log.error("Database error while completing upload: %s", e)
+
+            raise DatabaseOperationError(
+                f"Database error while completing upload: {e}"
+            ) from e
+
+    async def create_upload_session(
+        self, user_id: str, filename: str, content_type: str, size: int
+    ) -> dict:
+        """
+        Starts a resumable upload: a multipart upload for its object and its
+        record among the pending uploads, so it is completed like a direct one.
+        """
+
+        upload_id = ObjectId()
+        file_extension = filename.split(".")[-1]
+        object_name = f"uploads/{upload_id}.{file_extension}"
+        created_at = datetime.now()
+
+        try:
+            multipart_upload_id = await self.bucket.create_multipart_upload(
+                self._MINIO_BUCKET,  # type:ignore
+                object_name,
+                content_type,
+            )
+            session = UploadSessionModel(
+                user_id=user_id,  # type:ignore
+                filename=filename,
                 object_name=object_name,
-                data=io.BytesIO(content),
-                length=content_size,
                 content_type=content_type,
+                size=size,
+                created_at=created_at,
+                expires_at=created_at + timedelta(seconds=RESUMABLE_UPLOAD_EXPIRY),
+                multipart_upload_id=multipart_upload_id,
+            ).model_dump(by_alias=True, exclude={"id"})
+            session["_id"] = upload_id
+            await self.pending_uploads.insert_one(session)
+
+            return session
+
+        except ObjectStoreException as e:
+            log.error("Error starting a multipart upload: %s", e)
+
+            raise StorageOperationError(
+                f"Error starting a multipart upload: {e}"
+            ) from e
+
+        except PyMongoError as e:
+            log.error("Database error while recording upload: %s", e)
+
+            raise DatabaseOperationError(
+                f"Database error while recording upload: {e}"
+            ) from e
+
+    async def lease_upload_session(
+        self, upload_id: str, user_id: str, offset: int, lease: float
+    ) -> dict | None:
+        """
+        Reserves a resumable upload for one chunk starting at `offset`. Returns
+        None when the upload is not found, has expired, is at another offset or
+        is reserved by another chunk whose lease has not run out.
+        """
+
+        try:
+            query = {"_id": ObjectId(upload_id), "user_id": UUID(user_id)}
+        except (InvalidId, ValueError):
+            return None
+
+        now = datetime.now()
+        try:
+            return await self.pending_uploads.find_one_and_update(
+                query
+                | {
+                    "multipart_upload_id": {"$exists": True},
+                    "offset": offset,
+                    "expires_at": {"$gt": now},
+                    "$or": [
+                        {"lease_until": {"$exists": False}},
+                        {"lease_until": {"$lt": now}},
+                    ],
+                },
+                {
+                    "$set": {
+                        "lease": ObjectId(),
+                        "lease_until": now + timedelta(seconds=lease),
+                    }
+                },
+                return_document=ReturnDocument.AFTER,
+            )
+
+        except PyMongoError as e:
+            log.error("Database error while reserving upload %s: %s", upload_id, e)
+
+            raise DatabaseOperationError(
+                f"Database error while reserving upload {upload_id}: {e}"
+            ) from e
+
+    async def store_upload_part(
+        self, session: dict, data: bytes, lease: float
+    ) -> dict | None:
+        """
+        Stores the next part of a reserved resumable upload and moves its offset
+        past it, renewing the lease. Returns the updated upload, or None when the
+        lease was lost to another chunk and the part was not recorded.
+        """
+
+        part_number = len(session["parts"]) + 1
+
+        try:
+            etag = await self.bucket.upload_part(
+                self._MINIO_BUCKET,  # type:ignore
+                session["object_name"],
+                session["multipart_upload_id"],
+                part_number,
+                data,
+            )
+            # Storing the same part number again replaces it, so a part whose
+            # record was lost is simply sent again
+            return await self.pending_uploads.find_one_and_update(
+                {"_id": session["_id"], "lease": session["lease"]},
+                {
+                    "$push": {
+                        "parts": {
+                            "part_number": part_number,
+                            "etag": etag,
+                            "size": len(data),
+                        }
+                    },
+                    "$inc": {"offset": len(data)},
+                    "$set": {"lease_until": datetime.now() + timedelta(seconds=lease)},
+                },
+                return_document=ReturnDocument.AFTER,
+            )
+
+        except ObjectStoreException as e:
+            log.error("Error storing part of upload %s: %s", session["_id"], e)
+
+            raise StorageOperationError(
+                f"Error storing part of upload {session['_id']}: {e}"
+            ) from e
+
+        except PyMongoError as e:
+            log.error("Database error while recording part: %s", e)
+
+            raise DatabaseOperationError(
+                f"Database error while recording part: {e}"
+            ) from e
+
+    async def release_upload_session(self, session: dict):
+        try:
+            await self.pending_uploads.update_one(
+                {"_id": session["_id"], "lease": session["lease"]},
+                {"$unset": {"lease": "", "lease_until": ""}},
             )
 
-            update_data = {
-                "$set": {
-                    "filename": file.filename,
-                    "user_id": user_id,
-                    "size": content_size,
-                    "content_type": content_type,
-                    "uploaded_at": datetime.now(),
+        except PyMongoError as e:
+            # The lease runs out by itself
+            log.error("Database error while releasing upload %s: %s", session["_id"], e)
+
+    async def assemble_upload_session(self, session: dict):
+        """Joins the stored parts of a resumable upload into its object."""
+
+        try:
+            await self.bucket.complete_multipart_upload(
+                self._MINIO_BUCKET,  # type:ignore
+                session["object_name"],
+                session["multipart_upload_id"],
+                [(part["part_number"], part["etag"]) for part in session["parts"]],
+            )
+
+        except ObjectStoreException as e:
+            log.error("Error assembling upload %s: %s", session["_id"], e)
+
+            raise StorageOperationError(
+                f"Error assembling upload {session['_id']}: {e}"
+            ) from e
+
+    async def abort_upload_session(
+        self, upload_id: str, object_name: str, multipart_upload_id: str
+    ):
+        """
+        Removes the parts and the record of a resumable upload. An upload that
+        was completed or aborted already is left alone, so this can be retried.
+        """
+
+        try:
+            await self.bucket.abort_multipart_upload(
+                self._MINIO_BUCKET,  # type:ignore
+                object_name,
+                multipart_upload_id,
+            )
+        except ObjectStoreException as e:
+            if e.code != "NoSuchUpload":
+                log.error("Error aborting upload %s: %s", upload_id, e)
+
+                raise StorageOperationError(
+                    f"Error aborting upload {upload_id}: {e}"
+                ) from e
+
+        try:
+            await self.pending_uploads.delete_one(
+                {
+                    "_id": ObjectId(upload_id),
+                    "multipart_upload_id": multipart_upload_id,
                 }
-            }
-            await self.db.update_one({"url": ObjectId(image_url)}, update_data)
-            updated_doc = await self.db.find_one({"url": ObjectId(image_url)})
+            )
 
-            return updated_doc
+        except PyMongoError as e:
+            log.error("Database error while removing upload %s: %s", upload_id, e)
 
-        except S3Error as e:
-            log.error(f"Error updating file to MinIO: {e}")
+            raise DatabaseOperationError(
+                f"Database error while removing upload {upload_id}: {e}"
+            ) from e
 
-            raise StorageOperationError(f"Error updating file to MinIO: {e}") from e
+    async def presigned_download_url(self, object_name: str) -> tuple[str, datetime]:
+        expires = timedelta(seconds=PRESIGNED_URL_EXPIRY)
 
-        except (PyMongoError, InvalidId) as e:
-            log.error(f"Database error during update: {e}")
+        try:
+            url = await self.bucket.presigned_get_object(
+                bucket_name=self._MINIO_BUCKET,  # type:ignore
+                object_name=object_name,
+                expires=expires,
+            )
+            return url, datetime.now() + expires
 
-            raise DatabaseOperationError(f"Database error during update: {e}") from e
+        except ObjectStoreException as e:
+            log.error("Error presigning download URL: %s", e)
+
+            raise StorageOperationError(f"Error presigning download URL: {e}") from e
+
+    async def remove_object(self, object_name: str):
+        await self.remove_objects([object_name])
+
+    async def remove_objects(self, object_names: list[str]):
+        """Removing an object that does not exist succeeds, so this can be retried."""
+
+        try:
+            await self._remove_objects(object_names)
+
+        except ObjectStoreException as e:
+            log.error("Error deleting file in storage: %s", e)
+
+            raise StorageOperationError(f"Error deleting file in storage: {e}") from e
+
+    async def iter_object_pages(self, page_size: int) -> AsyncIterator[list[Object]]:
+        """Yields every stored object, a page at a time, in key order."""
+
+        try:
+            async for page in self.bucket.list_objects(
+                bucket_name=self._MINIO_BUCKET,  # type:ignore
+                page_size=page_size,
+            ):
+                yield page
+
+        except ObjectStoreException as e:
+            log.error("Error listing objects in storage: %s", e)
+
+            raise StorageOperationError(f"Error listing objects in storage: {e}") from e
+
+    async def find_referenced_objects(self, object_names: list[str]) -> set[str]:
+        """
+        Returns the names in `object_names` that an image, a rendition, a blob
+        or a pending direct upload still points to. Each lookup is one indexed
+        $in query, so the cost follows the number of names, not the collections.
+        """
+
+        wanted = {"$in": object_names}
+        try:
+            referenced: set[str] = set()
+            for collection, field in (
+                (self.db, "object_name"),
+                (self.db, "renditions.object_name"),
+                (self.blobs, "object_name"),
+                (self.pending_uploads, "object_name"),
+            ):
+                # distinct also returns the other renditions of matching images
+                referenced.update(await collection.distinct(field, {field: wanted}))
+
+            return referenced & set(object_names)
+
+        except PyMongoError as e:
+            log.error("Database error while looking up object references: %s", e)
+
+            raise DatabaseOperationError(
+                f"Database error while looking up object references: {e}"
+            ) from e
+
+    async def find_live_objects(self, object_names: list[str]) -> set[str]:
+        """
+        The names in `object_names` that are referenced, as for
+        `find_referenced_objects`, or whose content was stored again since they
+        were released. Objects are named after the hash of their content, so a
+        blob for the hash means a new upload owns the object and its renditions,
+        even before the renditions are recorded.
+        """
+
+        live = await self.find_referenced_objects(object_names)
+        hashes = list({name.split(".", 1)[0] for name in object_names})
+        try:
+            stored = set(await self.blobs.distinct("_id", {"_id": {"$in": hashes}}))
+
+        except PyMongoError as e:
+            log.error("Database error while looking up stored content: %s", e)
+
+            raise DatabaseOperationError(
+                f"Database error while looking up stored content: {e}"
+            ) from e
+
+        return live | {name for name in object_names if name.split(".", 1)[0] in stored}
+
+    async def iter_image_pages(
+        self, page_size: int, uploaded_before: datetime
+    ) -> AsyncIterator[list[dict]]:
+        """
+        Yields the object names of images uploaded before `uploaded_before`, a
+        page at a time, in _id order.
+        """
+
+        try:
+            cursor = self.db.find(
+                {"uploaded_at": {"$lt": uploaded_before}},
+                {"object_name": 1, "renditions.object_name": 1},
+                batch_size=page_size,
+            ).sort("_id")
+
+            page = []
+            async for image in cursor:
+                page.append(image)
+                if len(page) == page_size:
+                    yield page
+                    page = []
+            if page:
+                yield page
+
+        except PyMongoError as e:
+            log.error("Database error while scanning images: %s", e)
+
+            raise DatabaseOperationError(
+                f"Database error while scanning images: {e}"
+            ) from e
 
     async def get(self, image_id: str):
+        return await self.cache.get_or_load(image_id, lambda: self._find(image_id))
+
+    async def _find(self, image_id: str):
         try:
-            image = await self.db.find_one({"_id": ObjectId(image_id)})
+            image = await self.db.find_one(
+                {"_id": ObjectId(image_id)}, IMAGE_PROJECTION
+            )
             return image
 
         except (PyMongoError, InvalidId) as e:
-            log.error(f"Database error while retrieving: {e}")
+            log.error("Database error while retrieving: %s", e)
 
             raise DatabaseOperationError(f"Database error while retrieving: {e}") from e
 
-    async def delete(self, image_url: str):
+    async def get_many(self, image_ids: list[str]) -> list[dict]:
+        """
+        Fetches every image in `image_ids` with a single $in query. Ids that are
+        not valid ObjectIds cannot match and are skipped.
+        """
+
+        object_ids = [
+            ObjectId(image_id) for image_id in image_ids if ObjectId.is_valid(image_id)
+        ]
+        if not object_ids:
+            return []
+
         try:
-            image_doc = await self.db.find_one({"url": image_url})
-            if not image_doc:
+            return await self.db.find(
+                {"_id": {"$in": object_ids}}, IMAGE_PROJECTION
+            ).to_list(length=len(object_ids))
+
+        except PyMongoError as e:
+            log.error("Database error while retrieving batch: %s", e)
+
+            raise DatabaseOperationError(
+                f"Database error while retrieving batch: {e}"
+            ) from e
+
+    async def list_by_user(
+        self,
+        user_id: UUID,
+        after: tuple[datetime, ObjectId] | None,
+        limit: int,
+    ) -> list[dict]:
+        """
+        Returns up to `limit` images of the user, newest first, that sort after
+        the (uploaded_at, _id) key `after`. Seeking on the key instead of
+        skipping keeps every page an index range scan of `limit` entries.
+        """
+
+        query: dict = {"user_id": user_id}
+        if after:
+            uploaded_at, image_id = after
+            query["$or"] = [
+                {"uploaded_at": {"$lt": uploaded_at}},
+                {"uploaded_at": uploaded_at, "_id": {"$lt": image_id}},
+            ]
+
+        try:
+            cursor = (
+                self.db.find(query, IMAGE_PROJECTION)
+                .sort([("uploaded_at", DESCENDING), ("_id", DESCENDING)])
+                .limit(limit)
+            )
+            return await cursor.to_list(length=limit)
+
+        except PyMongoError as e:
+            log.error("Database error while listing images: %s", e)
+
+            raise DatabaseOperationError(
+                f"Database error while listing images: {e}"
+            ) from e
+
+    async def stat_object(self, object_name: str) -> Object | None:
+        """
+        Returns the stored object info (etag, size, last modified) or None when
+        the object does not exist.
+        """
+
+        try:
+            return await self.bucket.stat_object(
+                bucket_name=self._MINIO_BUCKET,  # type:ignore
+                object_name=object_name,
+            )
+
+        except ObjectStoreException as e:
+            if e.code == "NoSuchKey":
                 return None
 
-            object_name = image_doc["object_name"]
+            log.error("Error reading object info from storage: %s", e)
 
-            self.bucket.remove_object(
+            raise StorageOperationError(
+                f"Error reading object info from storage: {e}"
+            ) from e
+
+    async def open_object_stream(
+        self, object_name: str, offset: int = 0, length: int = 0
+    ) -> AsyncIterator[bytes]:
+        """
+        Opens the object (or the byte range starting at `offset`) and returns an
+        iterator over its chunks. The body is never fully buffered.
+        """
+
+        try:
+            response = await self.bucket.get_object(
                 bucket_name=self._MINIO_BUCKET,  # type:ignore
                 object_name=object_name,
+                offset=offset,
+                length=length,
             )
 
-            await self.db.delete_one({"url": image_url})
-            return "Deleted with success"
+        except ObjectStoreException as e:
+            log.error("Error reading file from storage: %s", e)
 
-        except S3Error as e:
-            log.error(f"Error deleting file in MinIO: {e}")
+            raise StorageOperationError(f"Error reading file from storage: {e}") from e
 
-            raise StorageOperationError(f"Error deleting file in MinIO: {e}") from e
+        return self.bucket.iter_object(response)
 
-        except (PyMongoError, InvalidId) as e:
-            log.error(f"Database error during deletion: {e}")
+    async def read_object(self, object_name: str, length: int = 0) -> bytes:
+        """
+        Reads an object into memory, or its first `length` bytes. Whole objects
+        are only meant for the rendition workers, which need the full original
+        to decode it.
+        """
+
+        chunks = [
+            chunk
+            async for chunk in await self.open_object_stream(object_name, 0, length)
+        ]
+        return b"".join(chunks)
+
+    async def store_rendition(
+        self, object_name: str, content: bytes, content_type: str
+    ) -> str:
+        """
+        Uploads a derived rendition and returns its public URL
+        """
+
+        try:
+            await self.bucket.put_object(
+                bucket_name=self._MINIO_BUCKET,  # type:ignore
+                object_name=object_name,
+                data=io.BytesIO(content),
+                length=len(content),
+                content_type=content_type,
+            )
+
+            return self._object_url(object_name)
+
+        except ObjectStoreException as e:
+            log.error("Error uploading rendition to storage: %s", e)
+
+            raise StorageOperationError(
+                f"Error uploading rendition to storage: {e}"
+            ) from e
+
+    async def set_renditions(self, image_metadata: dict, renditions: list[dict]):
+        """
+        Records renditions on the image and, for deduplicated content, on its
+        blob and every image sharing it so later duplicates reuse them.
+        """
+
+        try:
+            content_hash = image_metadata.get("content_hash")
+            if not content_hash:
+                await self.db.update_one(
+                    {"_id": image_metadata["_id"]},
+                    {"$set": {"renditions": renditions}},
+                )
+                await self.cache.invalidate(str(image_metadata["_id"]))
+                return
+
+            await self.blobs.update_one(
+                {"_id": content_hash}, {"$set": {"renditions": renditions}}
+            )
+            await self.db.update_many(
+                {"content_hash": content_hash}, {"$set": {"renditions": renditions}}
+            )
+            image_ids = await self.db.distinct("_id", {"content_hash": content_hash})
+            await self.cache.invalidate(*(str(image_id) for image_id in image_ids))
+
+        except PyMongoError as e:
+            log.error("Database error while saving renditions: %s", e)
+
+            raise DatabaseOperationError(
+                f"Database error while saving renditions: {e}"
+            ) from e
+
+    async def set_dimensions(self, image_metadata: dict, width: int, height: int):
+        """
+        Records the dimensions found for an image stored without them, unless
+        its content was replaced meanwhile.
+        """
+
+        try:
+            await self.db.update_one(
+                {
+                    "_id": image_metadata["_id"],
+                    "object_name": image_metadata["object_name"],
+                },
+                {"$set": {"width": width, "height": height}},
+            )
+            await self.cache.invalidate(str(image_metadata["_id"]))
+
+        except PyMongoError as e:
+            log.error("Database error while saving dimensions: %s", e)
+
+            raise DatabaseOperationError(
+                f"Database error while saving dimensions: {e}"
+            ) from e
+
+    async def delete(self, image_id: str, user_id: str) -> tuple[str, list[str]] | None:
+        """
+        Deletes the metadata of the image `image_id` owned by `user_id` and
+        returns its id with the object names no longer referenced by any image.
+        Removing those objects is left to the caller so it can be deferred and
+        retried.
+        """
+
+        query = self._owned_image_query(image_id, user_id)
+        if query is None:
+            return None
+
+        try:
+            # Atomic, so only one of two concurrent deletes releases the blob
+            image_doc = await self.db.find_one_and_delete(query)
+            if not image_doc:
+                return None
+
+            await self.cache.invalidate(str(image_doc["_id"]))
+
+            return str(image_doc["_id"]), await self._release_blob(image_doc)
+
+        except PyMongoError as e:
+            log.error("Database error during deletion: %s", e)
 
             raise DatabaseOperationError(f"Database error during deletion: {e}") from e
@@ -0,0 +1,140 @@
+import logging
+from datetime import datetime
+from typing import Any
+from uuid import UUID
+
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.asynchronous.collection import AsyncCollection
+from pymongo.errors import PyMongoError
+
+from .exceptions import DatabaseOperationError
+
+log = logging.getLogger(__name__)
+
+# Deduplicated images share their object, so object_name and url are only
+# unique on blobs. On images they are plain indexes for the url lookups of
+# update/delete and the object lookups of the reconciler.
+IMAGE_INDEXES = [
+    IndexModel([("url", ASCENDING)], name="url"),
+    IndexModel([("object_name", ASCENDING)], name="object_name"),
+    IndexModel([("renditions.object_name", ASCENDING)], name="rendition_object_name"),
+    IndexModel([("content_hash", ASCENDING)], name="content_hash"),
+    IndexModel([("uploaded_at", ASCENDING)], name="uploaded_at"),
+    IndexModel(
+        [("user_id", ASCENDING), ("uploaded_at", DESCENDING), ("_id", DESCENDING)],
+        name="user_id_uploaded_at",
+    ),
+]
+
+BLOB_INDEXES = [
+    IndexModel([("object_name", ASCENDING)], name="object_name_unique", unique=True),
+]
+
+# Pending records outlive their URL by a day so late completions still resolve.
+# Resumable uploads are removed by their expiry job, which also drops the parts.
+PENDING_UPLOAD_INDEXES = [
+    IndexModel(
+        [("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=86400
+    ),
+    IndexModel([("object_name", ASCENDING)], name="object_name"),
+]
+
+# Workers claim due jobs by status and run_at. Finished jobs are kept a week for
+# inspection; dead jobs have no finished_at and stay until removed by hand.
+JOB_INDEXES = [
+    IndexModel([("status", ASCENDING), ("run_at", ASCENDING)], name="status_run_at"),
+    IndexModel(
+        [("finished_at", ASCENDING)],
+        name="finished_at_ttl",
+        expireAfterSeconds=7 * 86400,
+    ),
+]
+
+# The queries on the request path, as (name, collection, filter, sort). Each must
+# be answered by an index scan, see `winning_plan_stages`.
+HOT_QUERIES: list[tuple[str, str, dict[str, Any], list | None]] = [
+    ("get by id", "images", {"_id": ObjectId()}, None),
+    ("batch by ids", "images", {"_id": {"$in": [ObjectId(), ObjectId()]}}, None),
+    ("update/delete by url", "images", {"url": "http://minio/images/a.png"}, None),
+    ("renditions by hash", "images", {"content_hash": "0" * 64}, None),
+    (
+        "list by user",
+        "images",
+        {"user_id": UUID("a1b2c3d4-e5f6-5895-1234-567890abcdef")},
+        [("uploaded_at", DESCENDING), ("_id", DESCENDING)],
+    ),
+    (
+        "list by user after cursor",
+        "images",
+        {
+            "user_id": UUID("a1b2c3d4-e5f6-5895-1234-567890abcdef"),
+            "$or": [
+                {"uploaded_at": {"$lt": datetime(2025, 1, 1)}},
+                {"uploaded_at": datetime(2025, 1, 1), "_id": {"$lt": ObjectId()}},
+            ],
+        },
+        [("uploaded_at", DESCENDING), ("_id", DESCENDING)],
+    ),
+    ("blob by hash", "blobs", {"_id": "0" * 64}, None),
+    (
+        "lease resumable upload",
+        "pending_uploads",
+        {"_id": ObjectId(), "offset": 0, "expires_at": {"$gt": datetime(2025, 1, 1)}},
+        None,
+    ),
+    (
+        "claim due job",
+        "jobs",
+        {"status": "pending", "run_at": {"$lte": datetime(2025, 1, 1)}},
+        [("run_at", ASCENDING)],
+    ),
+]
+
+
+async def ensure_indexes(
+    images: AsyncCollection,
+    blobs: AsyncCollection,
+    pending_uploads: AsyncCollection,
+    jobs: AsyncCollection,
+):
+    """
+    Creates the indexes the queries rely on. createIndexes is a no-op for
+    indexes that already exist with the same spec, so this runs on every start.
+    """
+
+    try:
+        await images.create_indexes(IMAGE_INDEXES)
+        await blobs.create_indexes(BLOB_INDEXES)
+        await pending_uploads.create_indexes(PENDING_UPLOAD_INDEXES)
+        await jobs.create_indexes(JOB_INDEXES)
+        log.info("MongoDB indexes verified")
+
+    except PyMongoError as e:
+        log.critical("Could not create the MongoDB indexes: %s", e)
+
+        raise DatabaseOperationError(
+            f"Could not create the MongoDB indexes: {e}"
+        ) from e
+
+
+def winning_plan_stages(explain: dict) -> set[str]:
+    """
+    Collects every stage name of the winning plan of an explain() result,
+    whatever the query engine nests them under.
+    """
+
+    stages: set[str] = set()
+
+    def walk(node: Any):
+        if isinstance(node, dict):
+            if isinstance(node.get("stage"), str):
+                stages.add(node["stage"])
+            for value in node.values():
+                walk(value)
+        elif isinstance(node, list):
+            for value in node:
+                walk(value)
+
+    walk(explain["queryPlanner"]["winningPlan"])
+    return stages
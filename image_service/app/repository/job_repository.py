@@ -0,0 +1,139 @@
+import logging
+from datetime import datetime, timedelta
+
+from fastapi import Depends
+from pymongo import ASCENDING, ReturnDocument
+from pymongo.asynchronous.collection import AsyncCollection
+from pymongo.errors import PyMongoError
+
+from ..core.config import get_job_collection
+from ..repository.exceptions import DatabaseOperationError
+from ..repository.mongo.job import JobModel, JobStatus
+
+log = logging.getLogger(__name__)
+
+
+class JobRepository:
+    """
+    Durable job records. A job is claimed with a lease; if its worker dies the
+    lease runs out and another worker picks the job up again.
+    """
+
+    def __init__(self, db: AsyncCollection = Depends(get_job_collection)):
+        self.db = db
+
+    async def enqueue(
+        self, key: str, kind: str, payload: dict, run_at: datetime | None = None
+    ) -> bool:
+        """
+        Adds a job, due now or at `run_at`, unless one with the same key exists.
+        Returns whether it was added.
+        """
+
+        now = datetime.now()
+        job = JobModel(
+            _id=key, kind=kind, payload=payload, run_at=run_at or now, created_at=now
+        ).model_dump(by_alias=True, exclude_none=True)
+
+        try:
+            result = await self.db.update_one(
+                {"_id": key}, {"$setOnInsert": job}, upsert=True
+            )
+            return result.upserted_id is not None
+
+        except PyMongoError as e:
+            log.error("Database error while enqueuing job %s: %s", key, e)
+
+            raise DatabaseOperationError(
+                f"Database error while enqueuing job {key}: {e}"
+            ) from e
+
+    async def claim(self, lease: float) -> dict | None:
+        """
+        Takes the oldest due job, or one whose lease expired, and leases it.
+        """
+
+        now = datetime.now()
+
+        try:
+            return await self.db.find_one_and_update(
+                {
+                    "$or": [
+                        {"status": JobStatus.pending, "run_at": {"$lte": now}},
+                        {"status": JobStatus.running, "lease_until": {"$lt": now}},
+                    ]
+                },
+                {
+                    "$set": {
+                        "status": JobStatus.running,
+                        "lease_until": now + timedelta(seconds=lease),
+                    },
+                    "$inc": {"attempts": 1},
+                },
+                sort=[("run_at", ASCENDING)],
+                return_document=ReturnDocument.AFTER,
+            )
+
+        except PyMongoError as e:
+            log.error("Database error while claiming a job: %s", e)
+
+            raise DatabaseOperationError(
+                f"Database error while claiming a job: {e}"
+            ) from e
+
+    async def complete(self, job: dict):
+        await self._finish(job, {"status": JobStatus.done})
+
+    async def retry(self, job: dict, error: str, delay: float):
+        await self._finish(
+            job,
+            {
+                "status": JobStatus.pending,
+                "run_at": datetime.now() + timedelta(seconds=delay),
+                "last_error": error,
+            },
+        )
+
+    async def bury(self, job: dict, error: str):
+        """Moves the job to the dead-letter state, kept for inspection."""
+
+        await self._finish(job, {"status": JobStatus.dead, "last_error": error})
+
+    async def _finish(self, job: dict, changes: dict):
+        if changes["status"] == JobStatus.done:
+            changes["finished_at"] = datetime.now()
+
+        try:
+            # Only the worker holding the lease may record the outcome
+            await self.db.update_one(
+                {
+                    "_id": job["_id"],
+                    "status": JobStatus.running,
+                    "attempts": job["attempts"],
+                },
+                {"$set": changes, "$unset": {"lease_until": ""}},
+            )
+
+        except PyMongoError as e:
+            log.error("Database error while updating job %s: %s", job["_id"], e)
+
+            raise DatabaseOperationError(
+                f"Database error while updating job {job['_id']}: {e}"
+            ) from e
+
+    async def count_by_status(self) -> dict[str, int]:
+        try:
+            cursor = await self.db.aggregate(
+                [{"$group": {"_id": "$status", "count": {"$sum": 1}}}]
+            )
+            counts = await cursor.to_list()
+            return {status: 0 for status in JobStatus} | {
+                count["_id"]: count["count"] for count in counts
+            }
+
+        except PyMongoError as e:
+            log.error("Database error while counting jobs: %s", e)
+
+            raise DatabaseOperationError(
+                f"Database error while counting jobs: {e}"
+            ) from e
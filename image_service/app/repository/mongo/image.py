@@ -6,6 +6,16 @@ from datetime import datetime
 PyObjectId = Annotated[str, BeforeValidator(str)]
 
 
+class RenditionModel(BaseModel):
+    name: str
+    object_name: str
+    url: str
+    content_type: str
+    width: int
+    height: int
+    size: int
+
+
 # for more details https://www.mongodb.com/docs/languages/python/pymongo-driver/current/integrations/fastapi-integration/
 class ImageModel(BaseModel):
     id: Optional[PyObjectId] = Field(alias="_id", default=None)
@@ -15,7 +25,11 @@ class ImageModel(BaseModel):
     url: str
     content_type: Optional[str] = Field(default=None)
     size: Optional[int] = Field(default=None)
+    width: int | None = Field(default=None)
+    height: int | None = Field(default=None)
+    content_hash: str | None = Field(default=None)
     uploaded_at: datetime = Field(default_factory=datetime.now)
+    renditions: list[RenditionModel] = Field(default_factory=list)
     model_config = ConfigDict(
         populate_by_name=True,
         json_schema_extra={
@@ -27,7 +41,21 @@ class ImageModel(BaseModel):
                 "url": "http://localhost:9000/images/a1b2c3d4-e5f6-5895-1234-567890abcdef.jpg",
                 "content_type": "image/jpeg",
                 "size": "102400",
+                "width": 1920,
+                "height": 1080,
+                "content_hash": "9f86d081884c7d659a2feaa0c55ad015a3bf4f1b2b0b822cd15d6c15b0f00a08",
                 "uploaded_at": "2025-04-29T10:00:00Z",
+                "renditions": [
+                    {
+                        "name": "thumb",
+                        "object_name": "a1b2c3d4-e5f6-5895-1234-567890abcdef.thumb.jpg",
+                        "url": "http://localhost:9000/images/a1b2c3d4-e5f6-5895-1234-567890abcdef.thumb.jpg",
+                        "content_type": "image/jpeg",
+                        "width": 200,
+                        "height": 112,
+                        "size": 8042,
+                    }
+                ],
             }
         },
     )
@@ -35,3 +63,83 @@ class ImageModel(BaseModel):
 
 class ImageCollection(BaseModel):
     images: List[ImageModel]
+
+
+class ImagePage(ImageCollection):
+    next_cursor: str | None = Field(default=None)
+
+
+class ImageBatchRequest(BaseModel):
+    ids: list[str] = Field(min_length=1)
+
+
+class ImageBatch(ImageCollection):
+    missing: list[str] = Field(default_factory=list)
+
+
+class ImageUploadResult(BaseModel):
+    filename: str | None = Field(default=None)
+    image: ImageModel | None = Field(default=None)
+    error: str | None = Field(default=None)
+
+
+class ImageUploadResults(BaseModel):
+    results: list[ImageUploadResult]
+
+
+class UploadUrlRequest(BaseModel):
+    filename: str
+    content_type: str
+    size: int = Field(gt=0)
+
+
+class PendingUploadModel(BaseModel):
+    id: PyObjectId | None = Field(alias="_id", default=None)
+    user_id: UUID
+    filename: str
+    object_name: str
+    content_type: str
+    size: int
+    created_at: datetime
+    expires_at: datetime
+    model_config = ConfigDict(populate_by_name=True)
+
+
+class UploadPartModel(BaseModel):
+    part_number: int
+    etag: str
+    size: int
+
+
+class UploadSessionModel(PendingUploadModel):
+    """
+    A resumable upload: a pending upload whose bytes arrive in chunks through
+    the service and are stored as the parts of a multipart upload. `offset` is
+    the number of bytes stored so far.
+    """
+
+    multipart_upload_id: str
+    offset: int = 0
+    parts: list[UploadPartModel] = Field(default_factory=list)
+
+
+class UploadSessionResponse(BaseModel):
+    id: PyObjectId = Field(alias="_id")
+    filename: str
+    content_type: str
+    size: int
+    offset: int
+    part_size: int
+    created_at: datetime
+    expires_at: datetime
+    model_config = ConfigDict(populate_by_name=True)
+
+
+class UploadUrlResponse(BaseModel):
+    upload_url: str
+    upload: PendingUploadModel
+
+
+class DownloadUrlResponse(BaseModel):
+    url: str
+    expires_at: datetime
@@ -0,0 +1,27 @@
+from datetime import datetime
+from enum import StrEnum
+from typing import Any
+
+from pydantic import BaseModel, ConfigDict, Field
+
+
+class JobStatus(StrEnum):
+    pending = "pending"
+    running = "running"
+    done = "done"
+    dead = "dead"
+
+
+class JobModel(BaseModel):
+    # The idempotency key: enqueuing the same key again is a no-op
+    id: str = Field(alias="_id")
+    kind: str
+    payload: dict[str, Any] = Field(default_factory=dict)
+    status: JobStatus = JobStatus.pending
+    attempts: int = 0
+    run_at: datetime
+    created_at: datetime
+    lease_until: datetime | None = Field(default=None)
+    finished_at: datetime | None = Field(default=None)
+    last_error: str | None = Field(default=None)
+    model_config = ConfigDict(populate_by_name=True, use_enum_values=True)
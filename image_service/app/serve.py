@@ -0,0 +1,121 @@
+"""
+Runs the service in several worker processes, for production.
+
+The workers share nothing: each one runs the app lifespan and builds its own
+MongoDB and MinIO clients, metadata cache, job queue and rendition pool. A
+supervisor restarts workers that die. uvloop and httptools are used when they
+are installed. On SIGTERM the workers stop accepting connections and finish
+their in-flight requests, uploads included, within SERVER_GRACEFUL_TIMEOUT.
+
+Usage (from the image_service directory):
+
+    python -m app.serve
+    WEB_CONCURRENCY=4 python -m app.serve --port 8080
+"""
+
+import argparse
+import glob
+import logging
+import os
+import shutil
+import tempfile
+from importlib.util import find_spec
+
+from dotenv import load_dotenv
+
+dotenv_path = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".env"
+)
+load_dotenv(dotenv_path)
+
+import uvicorn
+
+from app.core.config import (
+    FORWARDED_ALLOW_IPS,
+    SERVER_BACKLOG,
+    SERVER_GRACEFUL_TIMEOUT,
+    SERVER_HOST,
+    SERVER_KEEPALIVE_TIMEOUT,
+    SERVER_PORT,
+    WEB_CONCURRENCY,
+)
+from app.core.logging import setup_logging
+from app.core.metrics import MULTIPROCESS_DIR_ENV
+
+log = logging.getLogger(__name__)
+
+
+def prepare_metrics_dir(workers: int) -> str | None:
+    """
+    Points the workers at an empty Prometheus multiprocess directory. Needs to
+    run before they start, since prometheus_client reads it on import. Samples
+    left by an earlier run are removed.
+    """
+
+    directory = os.environ.get(MULTIPROCESS_DIR_ENV)
+    if workers == 1 and not directory:
+        return None
+
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+        for path in glob.glob(os.path.join(directory, "*.db")):
+            os.remove(path)
+    else:
+        directory = tempfile.mkdtemp(prefix="image-service-metrics-")
+        os.environ[MULTIPROCESS_DIR_ENV] = directory
+
+    return directory
+
+
+def server_options(args: argparse.Namespace) -> dict:
+    return {
+        "host": args.host,
+        "port": args.port,
+        "workers": args.workers,
+        # uvloop and httptools when installed, asyncio and h11 otherwise
+        "loop": "auto",
+        "http": "auto",
+        "backlog": SERVER_BACKLOG,
+        "timeout_keep_alive": SERVER_KEEPALIVE_TIMEOUT,
+        "timeout_graceful_shutdown": SERVER_GRACEFUL_TIMEOUT,
+        # Uvicorn's loggers go through the app's queue instead of their own
+        # handlers, and the app writes the access log with request ids
+        "log_config": None,
+        "access_log": False,
+        "proxy_headers": True,
+        "forwarded_allow_ips": FORWARDED_ALLOW_IPS,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--host", default=SERVER_HOST)
+    parser.add_argument("--port", type=int, default=SERVER_PORT)
+    parser.add_argument("--workers", type=int, default=WEB_CONCURRENCY)
+    parser.add_argument("--app", default="app.main:app", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    setup_logging()
+    # Read by the workers to split the rendition processes between them
+    os.environ["WEB_CONCURRENCY"] = str(args.workers)
+    created_metrics_dir = not os.environ.get(MULTIPROCESS_DIR_ENV)
+    metrics_dir = prepare_metrics_dir(args.workers)
+
+    log.info(
+        "Starting %s workers on %s:%s (loop %s, http %s, metrics %s)",
+        args.workers,
+        args.host,
+        args.port,
+        "uvloop" if find_spec("uvloop") else "asyncio",
+        "httptools" if find_spec("httptools") else "h11",
+        metrics_dir or "in process",
+    )
+    try:
+        uvicorn.run(args.app, **server_options(args))
+    finally:
+        if metrics_dir and created_metrics_dir:
+            shutil.rmtree(metrics_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -16,3 +16,45 @@ class ImageStorageException(ServiceException):
     """Raised when there is an error saving or deleting an image"""
 
     pass
+
+
+class FileTooLargeException(ServiceException):
+    """Raised when an uploaded file exceeds the configured maximum size"""
+
+
+class ImageDimensionsException(FileTooLargeException):
+    """Raised when an image header declares more pixels than allowed"""
+
+
+class BatchTooLargeException(ServiceException):
+    pass
+
+
+class InvalidCursorException(ServiceException):
+    pass
+
+
+class UploadIncompleteException(ServiceException):
+    """Raised when an upload is completed before its object was stored"""
+
+
+class UploadVerificationException(ServiceException):
+    """Raised when a stored upload does not match what was announced"""
+
+
+class UploadConflictException(ServiceException):
+    """
+    Raised when a chunk does not start at the offset of its resumable upload,
+    or another chunk of the upload is being stored
+    """
+
+
+class UploadChunkSizeException(ServiceException):
+    """
+    Raised when a chunk of a resumable upload ends inside a part. Its whole
+    parts are kept and the upload continues at `offset`.
+    """
+
+    def __init__(self, message: str, offset: int):
+        super().__init__(message)
+        self.offset = offset
@@ -1,43 +1,216 @@
-from fastapi import UploadFile, Depends
+import asyncio
+import io
 import logging
+from collections.abc import AsyncIterator
+from datetime import datetime
+from uuid import UUID, uuid4
 
+from fastapi import Depends, UploadFile
+from minio.datatypes import Object
+
+from ..core.config import (
+    BATCH_MAX_IDS,
+    BULK_UPLOAD_CONCURRENCY,
+    BULK_UPLOAD_MAX_FILES,
+    IMAGE_HEADER_READ_SIZE,
+    IMAGE_MAX_PIXELS,
+    IMAGE_RENDITIONS,
+    LIST_PAGE_SIZE,
+    MAX_UPLOAD_SIZE,
+    RENDITION_WORKERS,
+    RESUMABLE_UPLOAD_LEASE,
+    UPLOAD_PART_SIZE,
+    get_blob_collection,
+    get_image_collection,
+    get_metadata_cache,
+    get_object_store,
+    get_pending_upload_collection,
+)
+from ..repository.exceptions import ObjectTooLargeError
 from ..repository.image_repository import ImageRepository
+from ..repository.mongo.image import (
+    DownloadUrlResponse,
+    RenditionModel,
+    UploadSessionResponse,
+    UploadUrlResponse,
+)
+from ..utilities.image_header import (
+    SUPPORTED_CONTENT_TYPES,
+    ImageHeader,
+    read_image_header,
+    sniff_image_type,
+)
+from ..utilities.page_cursor import decode_cursor, encode_cursor
 from .exceptions import (
+    BatchTooLargeException,
+    FileTooLargeException,
+    ImageDimensionsException,
+    ImageNotFoundException,
     ImageStorageException,
+    InvalidCursorException,
     InvalidFileTypeException,
-    ImageNotFoundException,
+    UploadChunkSizeException,
+    UploadConflictException,
+    UploadIncompleteException,
+    UploadVerificationException,
+)
+from .job_queue import JobQueue, get_job_queue
+from .renditions import (
+    RenderedImage,
+    RenditionSpec,
+    get_rendition_pool,
+    parse_rendition_specs,
+    render,
 )
 
 log = logging.getLogger(__name__)
 
+RENDITION_SPECS = parse_rendition_specs(IMAGE_RENDITIONS)
+
+RENDITIONS_JOB = "renditions"
+REMOVE_OBJECTS_JOB = "remove_objects"
+ENRICH_METADATA_JOB = "enrich_metadata"
+EXPIRE_UPLOAD_JOB = "expire_upload"
+
 
 class ImageService:
-    def __init__(self, image_repository: ImageRepository = Depends(ImageRepository)):
+    def __init__(
+        self,
+        image_repository: ImageRepository = Depends(ImageRepository),
+        job_queue: JobQueue = Depends(get_job_queue),
+    ):
         self.image_repository = image_repository
+        self.job_queue = job_queue
+
+    async def _inspect_image(self, file: UploadFile) -> ImageHeader:
+        """
+        Checks the file by its bytes rather than the content type sent by the
+        client. Only the header is read, so the cost is the same for any size.
+        """
+
+        try:
+            image_header = await asyncio.to_thread(read_image_header, file.file)
+        except ValueError as e:
+            log.error("Rejected %s, not a supported image: %s", file.filename, e)
+
+            raise InvalidFileTypeException(
+                "Invalid file type. Only images are allowed"
+            ) from e
+
+        self._check_dimensions(image_header)
+        return image_header
+
+    def _check_dimensions(self, image_header: ImageHeader):
+        if image_header.pixels > IMAGE_MAX_PIXELS:
+            log.error(
+                "Rejected image of %sx%s pixels",
+                image_header.width,
+                image_header.height,
+            )
+
+            raise ImageDimensionsException(
+                f"Image of {image_header.width}x{image_header.height} pixels exceeds "
+                f"the maximum of {IMAGE_MAX_PIXELS} pixels"
+            )
 
     async def create_image(self, file: UploadFile, user_id: str):
-        if not file.content_type.startswith("image/"):  # type: ignore
-            log.error("Invalid file type. Only images are allowed")
+        image_header = await self._inspect_image(file)
 
-            raise InvalidFileTypeException("Invalid file type. Only images are allowed")
+        try:
+            image_metadata = await self.image_repository.create(
+                file, user_id, image_header
+            )
+        except ObjectTooLargeError as e:
+            log.error("Upload rejected for user_id=%s: %s", user_id, e)
+
+            raise FileTooLargeException(str(e)) from e
 
-        image_metadata = await self.image_repository.create(file, user_id)
         if not image_metadata:
             log.error(
-                f"Could not create the image for user_id={user_id}, filename={file.filename}"
+                "Could not create the image for user_id=%s, filename=%s",
+                user_id,
+                file.filename,
             )
 
             raise ImageStorageException("Could not create the image")
 
         return image_metadata
 
-    async def update_image(self, file: UploadFile, image_url: str, user_id: str):
-        if not file.content_type.startswith("image/"):  # type: ignore
-            log.error("Invalid file type. Only images are allowed")
+    async def create_images(self, files: list[UploadFile], user_id: str) -> list[dict]:
+        """
+        Validates every part, uploads the valid ones concurrently and returns
+        one result per file, in order, with either the image or the error.
+        """
 
-            raise InvalidFileTypeException("Invalid file type. Only images are allowed")
+        if len(files) > BULK_UPLOAD_MAX_FILES:
+            log.error(
+                "Bulk upload of %s files exceeds %s", len(files), BULK_UPLOAD_MAX_FILES
+            )
+
+            raise BatchTooLargeException(
+                f"A bulk upload accepts at most {BULK_UPLOAD_MAX_FILES} files"
+            )
+
+        results = [{"filename": file.filename} for file in files]
+        valid = []
+        image_headers = []
+        for index, file in enumerate(files):
+            try:
+                image_headers.append(await self._inspect_image(file))
+                valid.append(index)
+            except (InvalidFileTypeException, ImageDimensionsException) as e:
+                results[index]["error"] = str(e)
+
+        outcomes = await self.image_repository.create_many(
+            [files[index] for index in valid],
+            user_id,
+            BULK_UPLOAD_CONCURRENCY,
+            image_headers=image_headers,
+        )
+        for index, outcome in zip(valid, outcomes):
+            if isinstance(outcome, Exception):
+                log.error("Could not create %s: %s", files[index].filename, outcome)
+
+                results[index]["error"] = str(outcome)
+            else:
+                results[index]["image"] = outcome
+
+        return results
+
+    async def resolve_image_id(
+        self, user_id: str, image_id: str | None, image_url: str | None
+    ) -> str:
+        """
+        The id of the caller's image, given either directly or by its url.
+        """
 
-        image_metadata = await self.image_repository.update(file, image_url, user_id)
+        if image_id:
+            return image_id
+
+        resolved = None
+        if image_url:
+            resolved = await self.image_repository.find_owned_id(image_url, user_id)
+        if not resolved:
+            log.error("No image of user_id=%s at url=%s", user_id, image_url)
+
+            raise ImageNotFoundException("Image not found")
+
+        return resolved
+
+    async def update_image(self, file: UploadFile, image_id: str, user_id: str):
+        image_header = await self._inspect_image(file)
+
+        try:
+            image_metadata, object_names = await self.image_repository.update(
+                file, image_id, user_id, image_header
+            )
+        except ObjectTooLargeError as e:
+            log.error("Update rejected for image_id=%s: %s", image_id, e)
+
+            raise FileTooLargeException(str(e)) from e
+
+        # Each update releases its own objects, so each gets its own job
+        await self._schedule_object_removal(f"{image_id}:{uuid4().hex}", object_names)
         if not image_metadata:
             log.error("Could not update image")
 
@@ -45,20 +218,596 @@ class ImageService:
 
         return image_metadata
 
+    async def schedule_renditions(self, image_metadata: dict):
+        """
+        Queues the renditions of a new or replaced image. The image is already
+        stored, so a queue failure is logged and does not fail the request.
+        """
+
+        if not RENDITION_SPECS or image_metadata.get("renditions"):
+            return
+
+        image_id = image_metadata.get("_id")
+        try:
+            object_name = image_metadata["object_name"]
+            # Content released and uploaded again keeps its object name, and a
+            # finished job keeps its key, so the upload time is part of it
+            uploaded_at = image_metadata.get("uploaded_at")
+            await self.job_queue.enqueue(
+                RENDITIONS_JOB,
+                {"image_id": str(image_id), "object_name": object_name},
+                key=f"{RENDITIONS_JOB}:{image_id}:{object_name}:{uploaded_at}",
+            )
+        except Exception:
+            log.exception("Could not schedule renditions for %s", image_id)
+
+    async def schedule_enrichment(self, image_metadata: dict):
+        """
+        Queues the reading of the dimensions of an image stored without them,
+        as a direct upload is when its first bytes do not hold them. Like the
+        renditions, a queue failure does not fail the request.
+        """
+
+        if image_metadata.get("width") is not None:
+            return
+
+        image_id = image_metadata.get("_id")
+        try:
+            object_name = image_metadata["object_name"]
+            await self.job_queue.enqueue(
+                ENRICH_METADATA_JOB,
+                {"image_id": str(image_id), "object_name": object_name},
+                key=f"{ENRICH_METADATA_JOB}:{image_id}:{object_name}",
+            )
+        except Exception:
+            log.exception("Could not schedule enrichment for %s", image_id)
+
+    async def run_enrich_metadata_job(self, payload: dict):
+        image_metadata = await self.image_repository.get(payload["image_id"])
+        # Deleted, replaced or enriched since the job was queued
+        if (
+            not image_metadata
+            or image_metadata["object_name"] != payload["object_name"]
+            or image_metadata.get("width") is not None
+        ):
+            return
+
+        content = await self.image_repository.read_object(payload["object_name"])
+        try:
+            image_header = await asyncio.to_thread(
+                read_image_header, io.BytesIO(content)
+            )
+        except ValueError as e:
+            # Retrying cannot help, the image is served without dimensions
+            log.warning("No dimensions for image %s: %s", payload["image_id"], e)
+            return
+
+        await self.image_repository.set_dimensions(
+            image_metadata, image_header.width, image_header.height
+        )
+
+    async def run_renditions_job(self, payload: dict):
+        image_metadata = await self.image_repository.get(payload["image_id"])
+        # Deleted or replaced since the job was queued
+        if (
+            not image_metadata
+            or image_metadata["object_name"] != payload["object_name"]
+        ):
+            return
+
+        await self.generate_renditions(image_metadata)
+
+    async def generate_renditions(self, image_metadata: dict):
+        """
+        Builds the configured renditions for an uploaded image. Resizing runs
+        in the process pool. Errors are raised so the job queue retries them;
+        the original image stays usable meanwhile.
+        """
+
+        # Duplicate content arrives with the renditions of its first upload
+        if not RENDITION_SPECS or image_metadata.get("renditions"):
+            return
+
+        object_name = image_metadata["object_name"]
+        original = await self.image_repository.read_object(object_name)
+
+        loop = asyncio.get_running_loop()
+        pool = get_rendition_pool(RENDITION_WORKERS)
+        rendered: list[RenderedImage] = await asyncio.gather(
+            *(
+                loop.run_in_executor(pool, render, original, spec.width, spec.format)
+                for spec in RENDITION_SPECS
+            )
+        )
+
+        renditions = await asyncio.gather(
+            *(
+                self._store_rendition(object_name, spec, image)
+                for spec, image in zip(RENDITION_SPECS, rendered)
+            )
+        )
+        await self.image_repository.set_renditions(image_metadata, renditions)
+
+    async def _store_rendition(
+        self, object_name: str, spec: RenditionSpec, image: RenderedImage
+    ) -> dict:
+        rendition_name = spec.object_name_for(object_name)
+        url = await self.image_repository.store_rendition(
+            rendition_name, image.content, spec.content_type
+        )
+
+        return RenditionModel(
+            name=spec.name,
+            object_name=rendition_name,
+            url=url,
+            content_type=spec.content_type,
+            width=image.width,
+            height=image.height,
+            size=len(image.content),
+        ).model_dump()
+
+    def _check_announced_upload(self, user_id: str, content_type: str, size: int):
+        if content_type not in SUPPORTED_CONTENT_TYPES:
+            log.error(
+                "Direct upload of %s rejected for user_id=%s", content_type, user_id
+            )
+
+            raise InvalidFileTypeException("Invalid file type. Only images are allowed")
+
+        if size > MAX_UPLOAD_SIZE:
+            log.error("Upload of %s bytes rejected for user_id=%s", size, user_id)
+
+            raise FileTooLargeException(
+                f"File exceeds the maximum upload size of {MAX_UPLOAD_SIZE} bytes"
+            )
+
+    async def create_upload_url(
+        self, user_id: str, filename: str, content_type: str, size: int
+    ) -> UploadUrlResponse:
+        """
+        Starts a direct upload: the client PUTs the bytes to the returned URL,
+        then calls `complete_upload`.
+        """
+
+        self._check_announced_upload(user_id, content_type, size)
+        pending_upload, upload_url = await self.image_repository.create_pending_upload(
+            user_id, filename, content_type, size
+        )
+
+        return UploadUrlResponse.model_validate(
+            {"upload_url": upload_url, "upload": pending_upload}
+        )
+
+    async def create_upload_session(
+        self, user_id: str, filename: str, content_type: str, size: int
+    ) -> UploadSessionResponse:
+        """
+        Starts a resumable upload: the client sends the bytes in chunks with
+        `append_upload_chunk`, resuming from the offset the upload reached after
+        a failure, then calls `complete_upload`. Uploads still open when they
+        expire are aborted by a job queued now.
+        """
+
+        self._check_announced_upload(user_id, content_type, size)
+        session = await self.image_repository.create_upload_session(
+            user_id, filename, content_type, size
+        )
+
+        payload = {
+            "upload_id": str(session["_id"]),
+            "object_name": session["object_name"],
+            "multipart_upload_id": session["multipart_upload_id"],
+        }
+        try:
+            await self.job_queue.enqueue(
+                EXPIRE_UPLOAD_JOB,
+                payload,
+                key=f"{EXPIRE_UPLOAD_JOB}:{session['_id']}",
+                run_at=session["expires_at"],
+            )
+        except Exception as e:
+            log.error("Could not schedule the expiry of %s: %s", session["_id"], e)
+            # Nothing would remove the parts if the client gave up
+            await self.run_expire_upload_job(payload)
+
+            raise ImageStorageException("Could not start the upload") from e
+
+        return self._session_response(session)
+
+    def _session_response(self, session: dict) -> UploadSessionResponse:
+        return UploadSessionResponse.model_validate(
+            session | {"part_size": UPLOAD_PART_SIZE}
+        )
+
+    async def _get_open_session(self, upload_id: str, user_id: str) -> dict:
+        session = await self.image_repository.get_pending_upload(upload_id, user_id)
+        if (
+            not session
+            or "multipart_upload_id" not in session
+            or session["expires_at"] <= datetime.now()
+        ):
+            log.error("Resumable upload not found: %s", upload_id)
+
+            raise ImageNotFoundException("Upload not found")
+
+        return session
+
+    async def get_upload_session(
+        self, upload_id: str, user_id: str
+    ) -> UploadSessionResponse:
+        return self._session_response(await self._get_open_session(upload_id, user_id))
+
+    async def append_upload_chunk(
+        self,
+        upload_id: str,
+        user_id: str,
+        offset: int,
+        chunks: AsyncIterator[bytes],
+    ) -> int:
+        """
+        Stores a chunk of a resumable upload starting at `offset` and returns
+        the new offset. The bytes are stored in parts of UPLOAD_PART_SIZE, each
+        recorded as soon as it is stored, so a chunk cut short keeps its whole
+        parts. A chunk must end on a part boundary or at the end of the upload:
+        the bytes past its last whole part are not stored, and the chunk is
+        rejected so the client sends them again from the offset it is given.
+        """
+
+        session = await self.image_repository.lease_upload_session(
+            upload_id, user_id, offset, RESUMABLE_UPLOAD_LEASE
+        )
+        if not session:
+            current = await self._get_open_session(upload_id, user_id)
+            if current["offset"] != offset:
+                log.error(
+                    "Chunk of upload %s at offset %s, expected %s",
+                    upload_id,
+                    offset,
+                    current["offset"],
+                )
+
+                raise UploadConflictException(
+                    f"The upload continues at offset {current['offset']}"
+                )
+
+            raise UploadConflictException("Another chunk of the upload is in progress")
+
+        buffer = bytearray()
+        try:
+            async for chunk in chunks:
+                buffer += chunk
+                if session["offset"] + len(buffer) > session["size"]:
+                    log.error("Upload %s exceeds its announced size", upload_id)
+
+                    raise FileTooLargeException(
+                        f"The upload exceeds its announced size of {session['size']} "
+                        "bytes"
+                    )
+
+                while len(buffer) >= UPLOAD_PART_SIZE:
+                    session = await self._store_part(
+                        session, bytes(buffer[:UPLOAD_PART_SIZE])
+                    )
+                    del buffer[:UPLOAD_PART_SIZE]
+
+            if buffer and session["offset"] + len(buffer) == session["size"]:
+                session = await self._store_part(session, bytes(buffer))
+            elif buffer:
+                log.error(
+                    "Chunk of upload %s ends %s bytes into a part at offset %s",
+                    upload_id,
+                    len(buffer),
+                    session["offset"],
+                )
+
+                raise UploadChunkSizeException(
+                    f"A chunk must be a multiple of {UPLOAD_PART_SIZE} bytes unless "
+                    f"it ends the upload; continue at offset {session['offset']}",
+                    session["offset"],
+                )
+        finally:
+            await self.image_repository.release_upload_session(session)
+
+        return session["offset"]
+
+    async def _store_part(self, session: dict, data: bytes) -> dict:
+        stored = await self.image_repository.store_upload_part(
+            session, data, RESUMABLE_UPLOAD_LEASE
+        )
+        if not stored:
+            log.error("Upload %s was taken over by another chunk", session["_id"])
+
+            raise UploadConflictException("Another chunk of the upload is in progress")
+
+        return stored
+
+    async def abort_upload_session(self, upload_id: str, user_id: str):
+        session = await self._get_open_session(upload_id, user_id)
+        await self.image_repository.abort_upload_session(
+            upload_id, session["object_name"], session["multipart_upload_id"]
+        )
+
+    async def run_expire_upload_job(self, payload: dict):
+        # Completed uploads have no parts or record left, so this does nothing
+        await self.image_repository.abort_upload_session(
+            payload["upload_id"], payload["object_name"], payload["multipart_upload_id"]
+        )
+
+    async def complete_upload(self, upload_id: str, user_id: str):
+        """
+        Checks the stored object with a HEAD request against what was announced,
+        then its first bytes for the image type and dimensions, and creates the
+        image. A mismatching object is removed so the client can upload again
+        while the URL is valid. The object of a resumable upload is first
+        assembled from its parts, once they are all stored.
+        """
+
+        pending_upload = await self.image_repository.get_pending_upload(
+            upload_id, user_id
+        )
+        if not pending_upload:
+            log.error("Upload not found: %s", upload_id)
+
+            raise ImageNotFoundException("Upload not found")
+
+        object_info = await self.image_repository.stat_object(
+            pending_upload["object_name"]
+        )
+        if not object_info and "multipart_upload_id" in pending_upload:
+            object_info = await self._assemble_upload(pending_upload)
+        if not object_info:
+            log.error("Upload %s completed before its file was stored", upload_id)
+
+            raise UploadIncompleteException("The file has not been uploaded yet")
+
+        if (
+            object_info.size != pending_upload["size"]
+            or object_info.content_type != pending_upload["content_type"]
+        ):
+            log.error(
+                "Upload %s does not match: %s bytes of %s, expected %s bytes of %s",
+                upload_id,
+                object_info.size,
+                object_info.content_type,
+                pending_upload["size"],
+                pending_upload["content_type"],
+            )
+            await self.image_repository.remove_object(pending_upload["object_name"])
+
+            raise UploadVerificationException(
+                "The uploaded file does not match the announced size or content type"
+            )
+
+        image_header = await self._inspect_upload(pending_upload)
+
+        return await self.image_repository.complete_pending_upload(
+            pending_upload,
+            object_info.size,  # type:ignore
+            image_header,
+        )
+
+    async def _assemble_upload(self, session: dict) -> Object | None:
+        if session["offset"] < session["size"]:
+            log.error(
+                "Upload %s completed at %s of %s bytes",
+                session["_id"],
+                session["offset"],
+                session["size"],
+            )
+
+            raise UploadIncompleteException(
+                f"Only {session['offset']} of {session['size']} bytes were uploaded"
+            )
+
+        await self.image_repository.assemble_upload_session(session)
+        return await self.image_repository.stat_object(session["object_name"])
+
+    async def _inspect_upload(self, pending_upload: dict) -> ImageHeader | None:
+        object_name = pending_upload["object_name"]
+        prefix = await self.image_repository.read_object(
+            object_name, length=IMAGE_HEADER_READ_SIZE
+        )
+
+        if sniff_image_type(prefix) != pending_upload["content_type"]:
+            log.error(
+                "Upload %s is not a %s",
+                pending_upload["_id"],
+                pending_upload["content_type"],
+            )
+            await self.image_repository.remove_object(object_name)
+
+            raise UploadVerificationException(
+                "The uploaded file does not match the announced content type"
+            )
+
+        try:
+            image_header = read_image_header(io.BytesIO(prefix))
+        except ValueError as e:
+            # A JPEG may carry more metadata than was read before its frame header
+            log.warning("No dimensions for upload %s: %s", pending_upload["_id"], e)
+            return None
+
+        try:
+            self._check_dimensions(image_header)
+        except ImageDimensionsException:
+            await self.image_repository.remove_object(object_name)
+            raise
+
+        return image_header
+
+    async def create_download_url(self, image_id: str) -> DownloadUrlResponse:
+        image_metadata = await self.get_image(image_id)
+        url, expires_at = await self.image_repository.presigned_download_url(
+            image_metadata["object_name"]
+        )
+
+        return DownloadUrlResponse(url=url, expires_at=expires_at)
+
     async def get_image(self, image_id: str):
         image_metadata = await self.image_repository.get(image_id)
         if not image_metadata:
-            log.error(f"Image not found: {image_id}")
+            log.error("Image not found: %s", image_id)
 
             raise ImageNotFoundException("Image not found")
 
         return image_metadata
 
-    async def delete_image(self, image_url: str):
-        image_deleted = await self.image_repository.delete(image_url)
-        if not image_deleted:
-            log.error("Could not delete image with image_url={image_url}")
+    async def get_images(self, image_ids: list[str]) -> dict:
+        """
+        Resolves many ids in one round trip. Unknown ids are reported in
+        `missing` instead of failing the whole call. Returns the documents
+        as stored, in the shape of ImageBatch.
+        """
+
+        unique_ids = list(dict.fromkeys(image_ids))
+        if len(unique_ids) > BATCH_MAX_IDS:
+            log.error("Batch of %s ids exceeds %s", len(unique_ids), BATCH_MAX_IDS)
+
+            raise BatchTooLargeException(
+                f"A batch can resolve at most {BATCH_MAX_IDS} ids"
+            )
+
+        documents = await self.image_repository.get_many(unique_ids)
+        by_id = {str(document["_id"]): document for document in documents}
+
+        return {
+            "images": [by_id[i] for i in unique_ids if i in by_id],
+            "missing": [i for i in unique_ids if i not in by_id],
+        }
+
+    async def list_images(
+        self, user_id: UUID, cursor: str | None = None, limit: int = LIST_PAGE_SIZE
+    ) -> dict:
+        """
+        Returns one page of the user's images, newest first, in the shape of
+        ImagePage. `next_cursor` is set when more images follow and is passed
+        back to get the next page.
+        """
+
+        try:
+            after = decode_cursor(cursor) if cursor else None
+        except ValueError as e:
+            log.error("Invalid listing cursor: %s", cursor)
+
+            raise InvalidCursorException("Invalid cursor") from e
+
+        # One extra document tells whether there is a next page
+        documents = await self.image_repository.list_by_user(user_id, after, limit + 1)
+        page = documents[:limit]
+
+        next_cursor = None
+        if len(documents) > limit:
+            last = page[-1]
+            next_cursor = encode_cursor(last["uploaded_at"], last["_id"])
+
+        return {"images": page, "next_cursor": next_cursor}
+
+    async def get_image_content(self, image_id: str):
+        """
+        Returns the image metadata and the stored object info (etag, size,
+        last modified) used to answer conditional and range requests.
+        """
+
+        image_metadata = await self.get_image(image_id)
+
+        object_info = await self.image_repository.stat_object(
+            image_metadata["object_name"]
+        )
+        if not object_info:
+            log.error("Image content not found: %s", image_id)
+
+            raise ImageNotFoundException("Image content not found")
+
+        return image_metadata, object_info
+
+    async def stream_image_content(
+        self, object_name: str, offset: int = 0, length: int = 0
+    ):
+        return await self.image_repository.open_object_stream(
+            object_name, offset, length
+        )
+
+    async def delete_image(self, image_id: str, user_id: str):
+        deleted = await self.image_repository.delete(image_id, user_id)
+        if not deleted:
+            log.error("Could not delete image with image_id=%s", image_id)
 
             raise ImageStorageException("Could not delete image")
 
-        return image_deleted
+        image_id, object_names = deleted
+        await self._schedule_object_removal(image_id, object_names)
+
+        return "Deleted with success"
+
+    async def _schedule_object_removal(self, key: str, object_names: list[str]):
+        """
+        Queues the removal of objects released by a committed write. The
+        write stands whatever happens here: when the queue is down the objects
+        are removed now, and if that fails too the reconciler collects them.
+        """
+
+        if not object_names:
+            return
+
+        try:
+            await self.job_queue.enqueue(
+                REMOVE_OBJECTS_JOB,
+                {"object_names": object_names},
+                key=f"{REMOVE_OBJECTS_JOB}:{key}",
+            )
+        except Exception:
+            log.exception("Could not queue object removal for %s", key)
+            # The metadata no longer references them, so remove them now
+            try:
+                await self.run_remove_objects_job({"object_names": object_names})
+            except Exception:
+                log.exception("Could not remove released objects %s", object_names)
+
+    async def run_remove_objects_job(self, payload: dict):
+        """
+        Removes released objects, except those referenced again: an upload of
+        the same bytes since the release recreates the same object names.
+        """
+
+        object_names = payload["object_names"]
+        live = await self.image_repository.find_live_objects(object_names)
+        if live:
+            log.info("Kept %s objects stored again since their release", len(live))
+
+        await self.image_repository.remove_objects(
+            [name for name in object_names if name not in live]
+        )
+
+
+def register_job_handlers(job_queue: JobQueue):
+    """
+    Registers the image jobs. Workers run outside a request, so each job gets
+    an ImageService built from the shared clients instead of from Depends.
+    """
+
+    def image_service() -> ImageService:
+        repository = ImageRepository(
+            get_object_store(),
+            get_image_collection(),
+            get_blob_collection(),
+            get_metadata_cache(),
+            get_pending_upload_collection(),
+        )
+        return ImageService(repository, job_queue)
+
+    async def renditions(payload: dict):
+        await image_service().run_renditions_job(payload)
+
+    async def remove_objects(payload: dict):
+        await image_service().run_remove_objects_job(payload)
+
+    async def enrich_metadata(payload: dict):
+        await image_service().run_enrich_metadata_job(payload)
+
+    async def expire_upload(payload: dict):
+        await image_service().run_expire_upload_job(payload)
+
+    job_queue.register(RENDITIONS_JOB, renditions)
+    job_queue.register(REMOVE_OBJECTS_JOB, remove_objects)
+    job_queue.register(ENRICH_METADATA_JOB, enrich_metadata)
+    job_queue.register(EXPIRE_UPLOAD_JOB, expire_upload)
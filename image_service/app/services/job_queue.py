@@ -0,0 +1,181 @@
+import asyncio
+import logging
+import os
+from collections.abc import Awaitable, Callable
+from datetime import datetime
+from typing import Any
+
+from ..core.config import (
+    JOB_LEASE,
+    JOB_MAX_ATTEMPTS,
+    JOB_POLL_INTERVAL,
+    JOB_RETRY_BACKOFF,
+    JOB_WORKERS,
+    get_job_collection,
+)
+from ..core.metrics import JOBS_IN_FLIGHT, JOBS_PROCESSED, timed
+from ..repository.job_repository import JobRepository
+
+log = logging.getLogger(__name__)
+
+JobHandler = Callable[[dict[str, Any]], Awaitable[None]]
+
+
+class JobQueue:
+    """
+    In-process worker pool over the durable jobs collection.
+
+    Jobs survive restarts and are shared by every replica: whichever worker
+    claims a job first runs it. A failed job is retried with exponential
+    backoff and moved to the dead-letter state after `max_attempts`. Handlers
+    must be idempotent, since a job whose worker died is run again once its
+    lease expires.
+    """
+
+    def __init__(
+        self,
+        repository: JobRepository,
+        workers: int = JOB_WORKERS,
+        max_attempts: int = JOB_MAX_ATTEMPTS,
+        backoff: float = JOB_RETRY_BACKOFF,
+        lease: float = JOB_LEASE,
+        poll_interval: float = JOB_POLL_INTERVAL,
+    ):
+        self.repository = repository
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.lease = lease
+        self.poll_interval = poll_interval
+        self.handlers: dict[str, JobHandler] = {}
+        self._wakeup = asyncio.Event()
+        self._tasks: list[asyncio.Task] = []
+        self._stopping = False
+
+    def register(self, kind: str, handler: JobHandler):
+        self.handlers[kind] = handler
+
+    async def enqueue(
+        self,
+        kind: str,
+        payload: dict[str, Any],
+        key: str,
+        run_at: datetime | None = None,
+    ) -> bool:
+        """
+        Queues a job, to run now or once `run_at` is reached. `key` identifies
+        the work: a job with the same key is only run once. Returns whether the
+        job was added.
+        """
+
+        added = await self.repository.enqueue(key, kind, payload, run_at)
+        if run_at is None:
+            # Local workers start right away instead of at their next poll
+            self._wakeup.set()
+        return added
+
+    async def start(self):
+        self._stopping = False
+        self._tasks = [
+            asyncio.create_task(self._work(), name=f"job-worker-{worker}")
+            for worker in range(self.workers)
+        ]
+        log.info("Job queue started with %s workers", self.workers)
+
+    async def stop(self, timeout: float = 10):
+        """
+        Lets running jobs finish for up to `timeout` seconds, then cancels them.
+        Cancelled jobs are retried elsewhere when their lease expires.
+        """
+
+        self._stopping = True
+        self._wakeup.set()
+        if self._tasks:
+            _, pending = await asyncio.wait(self._tasks, timeout=timeout)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+        self._tasks = []
+
+    async def _work(self):
+        while not self._stopping:
+            try:
+                job = await self.repository.claim(self.lease)
+                if job is None:
+                    await self._idle()
+                    continue
+                await self.run(job)
+
+            except Exception:
+                log.exception("Job worker error")
+                await self._idle()
+
+    async def _idle(self):
+        self._wakeup.clear()
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+        except TimeoutError:
+            pass
+
+    async def run(self, job: dict):
+        kind = job["kind"]
+        handler = self.handlers.get(kind)
+        if handler is None:
+            log.error("No handler for job %s of kind %s", job["_id"], kind)
+            await self.repository.bury(job, f"No handler for job kind {kind}")
+            JOBS_PROCESSED.labels(kind, "dead").inc()
+            return
+
+        try:
+            with JOBS_IN_FLIGHT.track_inprogress(), timed("job", kind):
+                await handler(job["payload"])
+
+        except Exception as e:
+            if job["attempts"] >= self.max_attempts:
+                log.exception(
+                    "Job %s failed after %s attempts", job["_id"], job["attempts"]
+                )
+                await self.repository.bury(job, str(e))
+                JOBS_PROCESSED.labels(kind, "dead").inc()
+                return
+
+            delay = self.backoff * 2 ** (job["attempts"] - 1)
+            log.warning(
+                "Job %s failed (attempt %s), retrying in %.0fs: %s",
+                job["_id"],
+                job["attempts"],
+                delay,
+                e,
+            )
+            await self.repository.retry(job, str(e), delay)
+            JOBS_PROCESSED.labels(kind, "retry").inc()
+            return
+
+        await self.repository.complete(job)
+        JOBS_PROCESSED.labels(kind, "done").inc()
+
+
+_job_queue: JobQueue | None = None
+
+
+def get_job_queue() -> JobQueue:
+    global _job_queue
+    if _job_queue is None:
+        _job_queue = JobQueue(JobRepository(get_job_collection()))
+    return _job_queue
+
+
+async def shutdown_job_queue():
+    global _job_queue
+    if _job_queue is not None:
+        await _job_queue.stop()
+        _job_queue = None
+
+
+def _forget_job_queue():
+    # A forked worker runs its own queue; the parent's tasks are not its own
+    global _job_queue
+    _job_queue = None
+
+
+os.register_at_fork(after_in_child=_forget_job_queue)
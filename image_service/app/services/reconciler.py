@@ -0,0 +1,130 @@
+import asyncio
+import logging
+from dataclasses import dataclass
+from datetime import UTC, datetime, timedelta
+
+from ..core.config import RECONCILE_GRACE_PERIOD, RECONCILE_PAGE_SIZE
+from ..repository.image_repository import ImageRepository
+
+log = logging.getLogger(__name__)
+
+
+def _object_names(image: dict) -> list[str]:
+    return [image["object_name"]] + [
+        rendition["object_name"] for rendition in image.get("renditions", [])
+    ]
+
+
+@dataclass
+class ReconcileReport:
+    objects_scanned: int = 0
+    orphan_objects: int = 0
+    removed_objects: int = 0
+    images_scanned: int = 0
+    missing_objects: int = 0
+
+
+class Reconciler:
+    """
+    Compares the bucket with the metadata in both directions, one page at a
+    time, so memory stays bounded by `page_size` whatever the bucket size.
+
+    Orphan objects (stored but referenced by no image, rendition, blob or
+    pending upload) are reported and, with `remove`, deleted. Images whose
+    object is missing are only reported: the metadata may be all that is left
+    of the upload and is not removed automatically.
+    """
+
+    def __init__(
+        self,
+        image_repository: ImageRepository,
+        grace_period: float = RECONCILE_GRACE_PERIOD,
+        page_size: int = RECONCILE_PAGE_SIZE,
+        remove: bool = False,
+    ):
+        self.image_repository = image_repository
+        self.grace_period = timedelta(seconds=grace_period)
+        self.page_size = page_size
+        self.remove = remove
+
+    async def run(self, check_images: bool = True) -> ReconcileReport:
+        report = ReconcileReport()
+        await self.reconcile_objects(report)
+        if check_images:
+            await self.reconcile_images(report)
+
+        log.info("Reconciliation finished: %s", report)
+        return report
+
+    async def reconcile_objects(self, report: ReconcileReport):
+        # MinIO reports last_modified in UTC
+        cutoff = datetime.now(UTC) - self.grace_period
+
+        async for page in self.image_repository.iter_object_pages(self.page_size):
+            report.objects_scanned += len(page)
+            candidates = [
+                item.object_name
+                for item in page
+                if item.last_modified and item.last_modified < cutoff
+            ]
+            if not candidates:
+                continue
+
+            referenced = await self.image_repository.find_referenced_objects(candidates)
+            orphans = [name for name in candidates if name not in referenced]
+            for name in orphans:
+                log.warning("Orphan object without metadata: %s", name)
+            report.orphan_objects += len(orphans)
+
+            if self.remove and orphans:
+                removable = await self._still_orphaned(orphans, cutoff)
+                await self.image_repository.remove_objects(removable)
+                report.removed_objects += len(removable)
+
+    async def _still_orphaned(self, orphans: list[str], cutoff: datetime) -> list[str]:
+        """
+        Checks the orphans again right before removal. A new upload of the same
+        content rewrites its content-addressed object and then references it,
+        and must not lose the object to a listing taken before.
+        """
+
+        infos = await asyncio.gather(
+            *(self.image_repository.stat_object(name) for name in orphans)
+        )
+        unchanged = [
+            name
+            for name, info in zip(orphans, infos)
+            if info and info.last_modified and info.last_modified < cutoff
+        ]
+        if not unchanged:
+            return []
+
+        referenced = await self.image_repository.find_referenced_objects(unchanged)
+        return [name for name in unchanged if name not in referenced]
+
+    async def reconcile_images(self, report: ReconcileReport):
+        # Image timestamps are stored naive, like datetime.now() on upload
+        cutoff = datetime.now() - self.grace_period
+
+        async for page in self.image_repository.iter_image_pages(
+            self.page_size, cutoff
+        ):
+            report.images_scanned += len(page)
+            # Deduplicated images share objects, so each is checked once a page
+            names = list(
+                dict.fromkeys(name for image in page for name in _object_names(image))
+            )
+            infos = await asyncio.gather(
+                *(self.image_repository.stat_object(name) for name in names)
+            )
+            missing = {name for name, info in zip(names, infos) if info is None}
+            if not missing:
+                continue
+
+            for image in page:
+                for name in _object_names(image):
+                    if name in missing:
+                        log.warning(
+                            "Image %s references missing %s", image["_id"], name
+                        )
+                        report.missing_objects += 1
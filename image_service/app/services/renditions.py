@@ -0,0 +1,135 @@
+"""
+CPU-bound image resizing for derived renditions.
+
+Everything in this module runs inside worker processes, so it must stay free
+of app imports (clients, config) and only deal with bytes in and bytes out.
+"""
+
+import io
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+
+from PIL import Image
+
+_CONTENT_TYPES = {
+    "jpeg": "image/jpeg",
+    "png": "image/png",
+    "webp": "image/webp",
+    "avif": "image/avif",
+}
+_EXTENSIONS = {"jpeg": "jpg", "png": "png", "webp": "webp", "avif": "avif"}
+
+
+@dataclass(frozen=True)
+class RenditionSpec:
+    name: str
+    width: int
+    format: str = "jpeg"
+
+    @property
+    def content_type(self) -> str:
+        return _CONTENT_TYPES[self.format]
+
+    def object_name_for(self, object_name: str) -> str:
+        stem = object_name.rsplit(".", 1)[0]
+        return f"{stem}.{self.name}.{_EXTENSIONS[self.format]}"
+
+
+@dataclass(frozen=True)
+class RenderedImage:
+    content: bytes
+    width: int
+    height: int
+
+
+def parse_rendition_specs(value: str) -> list[RenditionSpec]:
+    """
+    Parses `name:width[:format]` entries separated by commas, for example
+    `thumb:200,card:800,card_webp:800:webp`.
+    """
+
+    specs = []
+    for entry in filter(None, (item.strip() for item in value.split(","))):
+        name, width, *rest = entry.split(":")
+        image_format = (rest[0] if rest else "jpeg").lower()
+        if image_format == "jpg":
+            image_format = "jpeg"
+        if image_format not in _CONTENT_TYPES:
+            raise ValueError(f"Unsupported rendition format: {image_format}")
+        specs.append(RenditionSpec(name=name, width=int(width), format=image_format))
+
+    return specs
+
+
+def render(content: bytes, width: int, image_format: str) -> RenderedImage:
+    """
+    Downscales the image to at most `width` pixels wide, keeping the aspect
+    ratio, and encodes it in `image_format`. Smaller images are not upscaled.
+    """
+
+    with Image.open(io.BytesIO(content)) as image:
+        image.draft("RGB", (width, width * 10))
+        if image.width > width:
+            height = max(1, round(image.height * width / image.width))
+            image = image.resize((width, height), Image.Resampling.LANCZOS)
+
+        if image_format == "jpeg" and image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+
+        output = io.BytesIO()
+        image.save(output, format=image_format.upper(), quality=85)
+
+        return RenderedImage(output.getvalue(), image.width, image.height)
+
+
+_rendition_pool: ProcessPoolExecutor | None = None
+
+
+def get_rendition_pool(max_workers: int | None = None) -> ProcessPoolExecutor:
+    """
+    Returns the shared process pool, creating it on first use so importing the
+    app does not spawn workers.
+    """
+
+    global _rendition_pool
+    if _rendition_pool is None:
+        # spawn keeps workers from inheriting the parent's client threads and sockets
+        _rendition_pool = ProcessPoolExecutor(
+            max_workers=max_workers, mp_context=multiprocessing.get_context("spawn")
+        )
+    return _rendition_pool
+
+
+def _ready() -> bool:
+    return True
+
+
+def warm_up_rendition_pool(max_workers: int):
+    """
+    Starts every worker of the pool and waits until each can take work. The
+    pool spawns workers on demand, so this moves the cost of starting the
+    interpreters and importing Pillow from the first uploads to startup.
+    """
+
+    pool = get_rendition_pool(max_workers)
+    futures = [pool.submit(_ready) for _ in range(max_workers)]
+    for future in futures:
+        future.result()
+
+
+def shutdown_rendition_pool():
+    global _rendition_pool
+    if _rendition_pool is not None:
+        _rendition_pool.shutdown(wait=True, cancel_futures=True)
+        _rendition_pool = None
+
+
+def _forget_rendition_pool():
+    # The parent's pool processes cannot be reached from a forked worker
+    global _rendition_pool
+    _rendition_pool = None
+
+
+os.register_at_fork(after_in_child=_forget_rendition_pool)
@@ -0,0 +1,180 @@
+import asyncio
+import json
+import os
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from ..core.admission import AdmissionController, AdmissionLimits
+from ..core.exceptions import AdmissionRejectedException
+from ..core.middleware import UploadAdmissionMiddleware, UploadSizeLimitMiddleware
+
+
+class FakeClock:
+    def __init__(self, now: float = 1_000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.mark.asyncio
+async def test_user_at_their_limit_waits_without_holding_back_others():
+    controller = AdmissionController(
+        AdmissionLimits(max_uploads=3, max_uploads_per_user=1, max_queue_time=1)
+    )
+    first = await controller.acquire("importer", 0)
+
+    waiting = asyncio.create_task(controller.acquire("importer", 0))
+    await asyncio.sleep(0)
+    other = await controller.acquire("someone else", 0)
+    assert controller.queued == 1 and not waiting.done()
+
+    controller.release(first)
+    second = await asyncio.wait_for(waiting, 1)
+
+    assert second.user_id == "importer"
+    assert controller.stats()["uploads"] == 2
+    controller.release(second)
+    controller.release(other)
+
+
+@pytest.mark.asyncio
+async def test_uploads_are_rejected_once_they_waited_too_long():
+    controller = AdmissionController(
+        AdmissionLimits(max_uploads=1, max_uploads_per_user=1, max_queue_time=0.05)
+    )
+    await controller.acquire("importer", 0)
+
+    with pytest.raises(AdmissionRejectedException) as per_user:
+        await controller.acquire("importer", 0)
+    with pytest.raises(AdmissionRejectedException) as service:
+        await controller.acquire("someone else", 0)
+
+    assert per_user.value.per_user and per_user.value.reason == "user_uploads"
+    assert not service.value.per_user and service.value.reason == "uploads"
+    assert service.value.retry_after == 1
+    assert controller.stats()["rejected"] == 2
+
+
+@pytest.mark.asyncio
+async def test_byte_rate_rejects_with_the_time_until_it_drains():
+    clock = FakeClock()
+    controller = AdmissionController(
+        AdmissionLimits(max_bytes_per_second_per_user=1000, max_queue_time=2),
+        clock=clock,
+    )
+    # Larger than a second of the rate, let through but owed afterwards
+    ticket = await controller.acquire("importer", 10_000)
+    controller.release(ticket, received=10_000)
+
+    with pytest.raises(AdmissionRejectedException) as error:
+        await controller.acquire("importer", 1000)
+    assert error.value.reason == "user_rate" and error.value.retry_after == 9
+
+    clock.now += 9
+    await controller.acquire("importer", 1000)
+
+
+@pytest.mark.asyncio
+async def test_limits_are_split_between_workers_and_reloaded_from_file(tmp_path):
+    limits_file = tmp_path / "limits.json"
+    controller = AdmissionController(
+        AdmissionLimits(max_uploads=8, max_bytes_per_second=1000),
+        workers=4,
+        limits_file=str(limits_file),
+    )
+    assert controller.limits.max_uploads == 2
+    assert controller.limits.max_bytes_per_second == 250
+
+    limits_file.write_text(json.dumps({"max_uploads": 40}))
+    controller.reload()
+    assert controller.limits.max_uploads == 10
+    assert controller.limits.max_bytes_per_second == 250
+
+    # A broken file keeps the limits in force, removing it restores the defaults
+    limits_file.write_text("{")
+    os.utime(limits_file, (0, 0))
+    controller.reload()
+    assert controller.limits.max_uploads == 10
+    limits_file.unlink()
+    controller.reload()
+    assert controller.limits.max_uploads == 2
+
+
+def test_rejected_uploads_get_429_or_503_with_retry_after():
+    controller = AdmissionController(
+        AdmissionLimits(max_uploads_per_user=1, max_queue_time=0.05, max_queued=0)
+    )
+    app = FastAPI()
+
+    @app.post("/image/upload/")
+    async def upload(request: Request):
+        await request.body()
+        return {"ok": True}
+
+    app.add_middleware(
+        UploadAdmissionMiddleware,
+        controller=controller,
+        prefixes=("/image/upload/",),
+        user_id=lambda authorization: authorization,
+    )
+    client = TestClient(app)
+    headers = {"Authorization": "importer"}
+
+    assert client.post("/image/upload/", content=b"image").status_code == 200
+    assert controller.stats()["uploads"] == 0
+
+    asyncio.run(controller.acquire("importer", 0))
+    # No room to wait: the service is busy
+    busy = client.post("/image/upload/", content=b"image", headers=headers)
+    assert busy.status_code == 503 and busy.headers["retry-after"] == "1"
+
+    # Waited for the user's own upload to finish
+    controller.set_limits(AdmissionLimits(max_uploads_per_user=1, max_queue_time=0.05))
+    limited = client.post("/image/upload/", content=b"image", headers=headers)
+    assert limited.status_code == 429 and limited.headers["retry-after"] == "1"
+
+
+def test_requests_without_a_body_are_not_held():
+    controller = AdmissionController(
+        AdmissionLimits(max_uploads=1, max_queue_time=0.05, max_queued=0)
+    )
+    app = FastAPI()
+
+    @app.head("/image/uploads/{upload_id}")
+    async def progress(upload_id: str):
+        return None
+
+    app.add_middleware(
+        UploadAdmissionMiddleware,
+        controller=controller,
+        prefixes=("/image/uploads/",),
+        user_id=lambda authorization: authorization,
+    )
+    asyncio.run(controller.acquire("importer", 0))
+
+    response = TestClient(app).head("/image/uploads/1")
+
+    assert response.status_code == 200
+    assert controller.stats()["rejected"] == 0
+
+
+@pytest.mark.parametrize(
+    "content_length, status_code", [("5", 200), ("6000", 413), ("5x", 400)]
+)
+def test_upload_size_limit_checks_the_declared_length(content_length, status_code):
+    app = FastAPI()
+
+    @app.post("/image/upload/")
+    async def upload(request: Request):
+        await request.body()
+        return {"ok": True}
+
+    app.add_middleware(UploadSizeLimitMiddleware, limits={"/image/upload/": 1000})
+    headers = {"Content-Length": content_length}
+
+    response = TestClient(app).post("/image/upload/", content=b"image", headers=headers)
+
+    assert response.status_code == status_code
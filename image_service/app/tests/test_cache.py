@@ -0,0 +1,116 @@
+import asyncio
+
+import pytest
+
+from ..core.cache import LocalCacheBackend, MetadataCache
+from ..core.config import create_metadata_cache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.mark.asyncio
+async def test_concurrent_misses_are_collapsed_into_one_load():
+    cache = MetadataCache(LocalCacheBackend(max_size=10, ttl=60))
+    loads = 0
+
+    async def loader():
+        nonlocal loads
+        loads += 1
+        await asyncio.sleep(0.01)
+        return {"_id": "a"}
+
+    results = await asyncio.gather(*(cache.get_or_load("a", loader) for _ in range(5)))
+
+    assert loads == 1
+    assert all(result == {"_id": "a"} for result in results)
+    assert cache.stats()["coalesced"] == 4
+
+    await cache.get_or_load("a", loader)
+    assert loads == 1
+    assert cache.stats()["hits"] == 1
+
+
+@pytest.mark.asyncio
+async def test_cancelled_load_does_not_cancel_the_requests_waiting_on_it():
+    cache = MetadataCache(LocalCacheBackend(max_size=10, ttl=60))
+    loads = 0
+
+    async def loader():
+        nonlocal loads
+        loads += 1
+        await asyncio.sleep(0.01)
+        return {"_id": "a"}
+
+    leader = asyncio.create_task(cache.get_or_load("a", loader))
+    await asyncio.sleep(0)
+    followers = [asyncio.create_task(cache.get_or_load("a", loader)) for _ in range(3)]
+    await asyncio.sleep(0)
+    leader.cancel()
+
+    results = await asyncio.gather(*followers)
+
+    assert leader.cancelled()
+    assert results == [{"_id": "a"}] * 3
+    # One of the followers took the load over
+    assert loads == 2
+
+
+@pytest.mark.asyncio
+async def test_entries_expire_and_least_recently_used_is_evicted():
+    clock = FakeClock()
+    backend = LocalCacheBackend(max_size=2, ttl=10, clock=clock)
+
+    await backend.set("a", 1)
+    await backend.set("b", 2)
+    await backend.get("a")
+    await backend.set("c", 3)
+
+    assert (await backend.get("b"))[0] is False
+    assert backend.evictions == 1
+
+    clock.now = 11
+    assert (await backend.get("a"))[0] is False
+
+
+@pytest.mark.asyncio
+async def test_invalidation_during_a_load_is_not_overwritten():
+    cache = MetadataCache(LocalCacheBackend(max_size=10, ttl=60))
+    release = asyncio.Event()
+
+    async def stale_loader():
+        await release.wait()
+        return {"_id": "a", "version": 1}
+
+    load = asyncio.create_task(cache.get_or_load("a", stale_loader))
+    await asyncio.sleep(0)
+    await cache.invalidate("a")
+    release.set()
+    await load
+
+    assert (await cache.backend.get("a"))[0] is False
+
+
+@pytest.mark.asyncio
+async def test_missing_documents_are_not_cached():
+    cache = MetadataCache(LocalCacheBackend(max_size=10, ttl=60))
+
+    async def loader():
+        return None
+
+    assert await cache.get_or_load("a", loader) is None
+    assert cache.stats()["size"] == 0
+
+
+@pytest.mark.parametrize("workers, ttl", [("1", 300), ("4", 5)])
+def test_local_cache_expires_quickly_with_several_workers(monkeypatch, workers, ttl):
+    monkeypatch.delenv("METADATA_CACHE_TTL", raising=False)
+    monkeypatch.delenv("METADATA_CACHE_REDIS_URL", raising=False)
+    monkeypatch.setenv("WEB_CONCURRENCY", workers)
+
+    assert create_metadata_cache().backend.ttl == ttl
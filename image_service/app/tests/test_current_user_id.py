@@ -0,0 +1,85 @@
+import time
+from unittest.mock import patch
+
+import pytest
+from fastapi import HTTPException
+from jose import jwt
+
+from ..utilities import current_user_id
+from ..utilities.current_user_id import (
+    ALGORITHM,
+    VerifiedTokenCache,
+    get_current_user_id,
+)
+
+USER_ID = "a1b2c3d4-e5f6-5895-1234-567890abcdef"
+
+
+class FakeClock:
+    def __init__(self, now: float = 1_000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def make_token(secret: str, **claims) -> str:
+    return jwt.encode({"sub": USER_ID, **claims}, secret, algorithm=ALGORITHM)
+
+
+@pytest.fixture
+def token_cache(monkeypatch):
+    cache = VerifiedTokenCache(max_size=2, max_ttl=300)
+    monkeypatch.setattr(current_user_id, "token_cache", cache)
+    monkeypatch.setattr(current_user_id, "SECRET_KEY", "secret")
+    return cache
+
+
+@pytest.mark.asyncio
+async def test_repeated_token_is_verified_once(token_cache):
+    token = make_token("secret", exp=int(time.time()) + 60)
+
+    with patch.object(current_user_id.jwt, "decode", wraps=jwt.decode) as decode:
+        first = await get_current_user_id(f"Bearer {token}")
+        second = await get_current_user_id(f"Bearer {token}")
+
+    assert first == second == USER_ID
+    assert decode.call_count == 1
+    assert token_cache.stats() == {"hits": 1, "misses": 1, "evictions": 0, "size": 1}
+
+
+@pytest.mark.asyncio
+async def test_invalid_token_is_rejected_and_not_cached(token_cache):
+    token = make_token("other secret")
+
+    with pytest.raises(HTTPException) as error:
+        await get_current_user_id(f"Bearer {token}")
+
+    assert error.value.status_code == 401
+    assert token_cache.stats()["size"] == 0
+
+
+def test_entries_expire_with_the_token():
+    clock = FakeClock()
+    cache = VerifiedTokenCache(max_size=10, max_ttl=300, clock=clock)
+    cache.put("short", USER_ID, expires_at=clock.now + 10)
+    cache.put("no exp", USER_ID, expires_at=None)
+
+    clock.now += 11
+    assert cache.get("short") is None
+    assert cache.get("no exp") == USER_ID
+
+    clock.now += 300
+    assert cache.get("no exp") is None
+
+
+def test_least_recently_used_token_is_evicted():
+    cache = VerifiedTokenCache(max_size=2, max_ttl=300)
+    cache.put("a", "user-a", None)
+    cache.put("b", "user-b", None)
+    cache.get("a")
+    cache.put("c", "user-c", None)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == "user-a"
+    assert cache.stats()["evictions"] == 1
@@ -0,0 +1,76 @@
+import io
+
+import pytest
+from PIL import Image
+
+from ..utilities.image_header import read_image_header, sniff_image_type
+
+
+class CountingReader(io.BytesIO):
+    def __init__(self, content: bytes):
+        super().__init__(content)
+        self.bytes_read = 0
+
+    def read(self, size: int = -1) -> bytes:
+        chunk = super().read(size)
+        self.bytes_read += len(chunk)
+        return chunk
+
+
+def encode(image_format: str, size=(1234, 567), **options) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", size).save(buffer, image_format, **options)
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize(
+    "image_format, options, content_type",
+    [
+        ("PNG", {}, "image/png"),
+        ("GIF", {}, "image/gif"),
+        ("JPEG", {}, "image/jpeg"),
+        ("JPEG", {"progressive": True}, "image/jpeg"),
+        ("WEBP", {}, "image/webp"),
+        ("WEBP", {"lossless": True}, "image/webp"),
+        ("WEBP", {"exif": b"Exif\x00\x00"}, "image/webp"),
+    ],
+)
+def test_reads_type_and_dimensions(image_format, options, content_type):
+    stream = io.BytesIO(encode(image_format, **options))
+
+    image_header = read_image_header(stream)
+
+    assert image_header.content_type == content_type
+    assert (image_header.width, image_header.height) == (1234, 567)
+    assert stream.tell() == 0
+
+
+def test_jpeg_metadata_is_skipped_without_reading_it():
+    # 60 KB of EXIF before the frame header
+    content = encode("JPEG", exif=b"Exif\x00\x00" + b"\x00" * 60_000)
+    stream = CountingReader(content)
+
+    image_header = read_image_header(stream)
+
+    assert (image_header.width, image_header.height) == (1234, 567)
+    assert stream.bytes_read < 1024
+
+
+@pytest.mark.parametrize(
+    "content",
+    [
+        b"",
+        b"fake image data",
+        b"GIF89a\x00\x00\x00\x00",
+        # A JPEG cut off before its frame header
+        encode("JPEG")[:20],
+    ],
+)
+def test_rejects_anything_else(content):
+    with pytest.raises(ValueError):
+        read_image_header(io.BytesIO(content))
+
+
+def test_sniff_image_type_only_needs_the_signature():
+    assert sniff_image_type(encode("PNG")[:8]) == "image/png"
+    assert sniff_image_type(b"%PDF-1.7") is None
@@ -0,0 +1,358 @@
+import hashlib
+import io
+from unittest.mock import AsyncMock, MagicMock
+from uuid import UUID
+
+import pytest
+from bson import ObjectId
+from fastapi import UploadFile
+from pymongo.errors import DuplicateKeyError, PyMongoError
+from starlette.datastructures import Headers
+
+from ..core.cache import LocalCacheBackend, MetadataCache
+from ..repository import image_repository
+from ..repository.exceptions import (
+    DatabaseOperationError,
+    ObjectTooLargeError,
+    StorageOperationError,
+)
+from ..repository.image_repository import ImageRepository, SizeLimitedReader
+
+USER_ID = "a1b2c3d4-e5f6-5895-1234-567890abcdef"
+IMAGE_ID = "68909019c7ce69410acefca8"
+CONTENT = b"fake image data"
+CONTENT_HASH = hashlib.sha256(CONTENT).hexdigest()
+
+
+def make_cache() -> MetadataCache:
+    return MetadataCache(LocalCacheBackend(max_size=100, ttl=60))
+
+
+def make_blobs(existing: dict | None = None) -> AsyncMock:
+    blobs = AsyncMock()
+    blobs.find_one_and_update.return_value = existing
+    return blobs
+
+
+def make_upload_file(content: bytes, filename: str = "cover.png") -> UploadFile:
+    return UploadFile(
+        file=io.BytesIO(content),
+        size=len(content),
+        filename=filename,
+        headers=Headers({"content-type": "image/png"}),
+    )
+
+
+def test_size_limited_reader_rejects_overflow():
+    reader = SizeLimitedReader(io.BytesIO(b"x" * 10), max_size=8)
+
+    assert reader.read(5) == b"xxxxx"
+    with pytest.raises(ObjectTooLargeError):
+        reader.read(5)
+
+
+@pytest.mark.asyncio
+async def test_create_streams_spool_to_object_store():
+    store = AsyncMock()
+    store.put_object.side_effect = lambda **kwargs: kwargs["data"].read(
+        kwargs["length"]
+    )
+    db = AsyncMock()
+    blobs = make_blobs()
+    repository = ImageRepository(store, db, blobs, make_cache())
+
+    await repository.create(make_upload_file(CONTENT), USER_ID)
+
+    kwargs = store.put_object.call_args.kwargs
+    assert isinstance(kwargs["data"], SizeLimitedReader)
+    assert kwargs["object_name"] == f"{CONTENT_HASH}.png"
+    assert kwargs["length"] == len(CONTENT)
+    assert kwargs["part_size"] == image_repository.UPLOAD_PART_SIZE
+    assert blobs.insert_one.call_args.args[0]["refcount"] == 1
+    assert db.insert_one.call_args.args[0]["size"] == len(CONTENT)
+    assert db.insert_one.call_args.args[0]["content_hash"] == CONTENT_HASH
+
+
+@pytest.mark.asyncio
+async def test_create_rejects_oversized_file_before_upload(monkeypatch):
+    monkeypatch.setattr(image_repository, "MAX_UPLOAD_SIZE", 4)
+    store = AsyncMock()
+    repository = ImageRepository(store, AsyncMock(), make_blobs(), make_cache())
+
+    with pytest.raises(ObjectTooLargeError):
+        await repository.create(make_upload_file(CONTENT), USER_ID)
+
+    store.put_object.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_create_reuses_stored_object_for_duplicate_content():
+    store = AsyncMock()
+    db = AsyncMock()
+    existing = {
+        "_id": CONTENT_HASH,
+        "object_name": f"{CONTENT_HASH}.jpg",
+        "size": len(CONTENT),
+        "refcount": 2,
+    }
+    repository = ImageRepository(store, db, make_blobs(existing), make_cache())
+
+    image = await repository.create(make_upload_file(CONTENT), USER_ID)
+
+    store.put_object.assert_not_called()
+    assert image["object_name"] == f"{CONTENT_HASH}.jpg"
+
+
+@pytest.mark.asyncio
+async def test_create_gives_back_the_content_of_an_unsaved_image():
+    store = AsyncMock()
+    store.put_object.side_effect = lambda **kwargs: kwargs["data"].read(
+        kwargs["length"]
+    )
+    db = AsyncMock()
+    db.insert_one.side_effect = PyMongoError("insert failed")
+    blobs = make_blobs()
+    # The first call takes no reference, the second releases the one inserted
+    blobs.find_one_and_update.side_effect = [
+        None,
+        {"_id": CONTENT_HASH, "object_name": f"{CONTENT_HASH}.png", "refcount": 0},
+    ]
+    blobs.delete_one.return_value.deleted_count = 1
+    repository = ImageRepository(store, db, blobs, make_cache())
+
+    with pytest.raises(DatabaseOperationError):
+        await repository.create(make_upload_file(CONTENT), USER_ID)
+
+    assert blobs.find_one_and_update.call_args.args[1] == {"$inc": {"refcount": -1}}
+    store.remove_object.assert_called_once_with(
+        bucket_name=repository._MINIO_BUCKET, object_name=f"{CONTENT_HASH}.png"
+    )
+
+
+@pytest.mark.asyncio
+async def test_create_fails_cleanly_when_racing_blob_is_released():
+    store = AsyncMock()
+    store.put_object.side_effect = lambda **kwargs: kwargs["data"].read(
+        kwargs["length"]
+    )
+    # Another upload registers the blob first, then its image releases it
+    blobs = make_blobs()
+    blobs.insert_one.side_effect = DuplicateKeyError("duplicate")
+    repository = ImageRepository(store, AsyncMock(), blobs, make_cache())
+
+    with pytest.raises(StorageOperationError):
+        await repository.create(make_upload_file(CONTENT), USER_ID)
+
+    store.remove_object.assert_called_once_with(
+        bucket_name=repository._MINIO_BUCKET, object_name=f"{CONTENT_HASH}.png"
+    )
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("refcount, removed", [(1, []), (0, ["a.png"])])
+async def test_delete_returns_object_with_last_reference(refcount, removed):
+    store = AsyncMock()
+    db = AsyncMock()
+    db.find_one_and_delete.return_value = {
+        "_id": "68909019c7ce69410acefca8",
+        "object_name": "a.png",
+        "content_hash": CONTENT_HASH,
+    }
+    blobs = make_blobs(
+        {"_id": CONTENT_HASH, "object_name": "a.png", "refcount": refcount}
+    )
+    blobs.delete_one.return_value.deleted_count = 1
+    repository = ImageRepository(store, db, blobs, make_cache())
+
+    deleted = await repository.delete(IMAGE_ID, USER_ID)
+
+    assert deleted == ("68909019c7ce69410acefca8", removed)
+    # Removal is left to the caller
+    store.remove_object.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_create_many_saves_metadata_with_one_insert():
+    store = AsyncMock()
+    store.put_object.side_effect = lambda **kwargs: kwargs["data"].read(
+        kwargs["length"]
+    )
+    db = AsyncMock()
+    repository = ImageRepository(store, db, make_blobs(), make_cache())
+    files = [make_upload_file(CONTENT + bytes([i]), f"{i}.png") for i in range(3)]
+
+    outcomes = await repository.create_many(files, USER_ID, max_concurrency=2)
+
+    assert [outcome["filename"] for outcome in outcomes] == ["0.png", "1.png", "2.png"]
+    assert store.put_object.call_count == 3
+    db.insert_many.assert_called_once()
+    db.insert_one.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_update_switches_metadata_in_one_write_then_releases_old_blob():
+    store = AsyncMock()
+    store.put_object.side_effect = lambda **kwargs: kwargs["data"].read(
+        kwargs["length"]
+    )
+    db = AsyncMock()
+    db.find_one_and_update.return_value = {
+        "_id": "68909019c7ce69410acefca8",
+        "url": "http://127.0.0.1:9000/images/old.png",
+        "object_name": "old.png",
+        "content_hash": "old",
+    }
+    blobs = make_blobs()
+    blobs.find_one_and_update.side_effect = [
+        None,
+        {"_id": "old", "object_name": "old.png", "refcount": 0},
+    ]
+    blobs.delete_one.return_value.deleted_count = 1
+    repository = ImageRepository(store, db, blobs, make_cache())
+
+    image, released = await repository.update(
+        make_upload_file(CONTENT), IMAGE_ID, USER_ID
+    )
+
+    query, update = db.find_one_and_update.call_args.args
+    assert query == {"_id": ObjectId(IMAGE_ID), "user_id": UUID(USER_ID)}
+    assert update["$set"]["object_name"] == f"{CONTENT_HASH}.png"
+    db.find_one.assert_not_called()
+    db.update_one.assert_not_called()
+    assert image["_id"] == "68909019c7ce69410acefca8"
+    assert image["content_hash"] == CONTENT_HASH
+    # The old object is released after the commit, and removal left to the caller
+    assert released == ["old.png"]
+    store.put_object.assert_called_once()
+    store.remove_object.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_update_of_unknown_image_drops_the_new_reference():
+    store = AsyncMock()
+    store.put_object.side_effect = lambda **kwargs: kwargs["data"].read(
+        kwargs["length"]
+    )
+    db = AsyncMock()
+    db.find_one_and_update.return_value = None
+    blobs = make_blobs()
+    blobs.find_one_and_update.side_effect = [
+        None,
+        {"_id": CONTENT_HASH, "object_name": f"{CONTENT_HASH}.png", "refcount": 0},
+    ]
+    blobs.delete_one.return_value.deleted_count = 1
+    repository = ImageRepository(store, db, blobs, make_cache())
+
+    image, released = await repository.update(
+        make_upload_file(CONTENT), IMAGE_ID, USER_ID
+    )
+
+    assert image is None
+    assert released == [f"{CONTENT_HASH}.png"]
+
+
+@pytest.mark.asyncio
+async def test_updated_image_is_still_listed_for_its_owner():
+    images = [
+        {
+            "_id": ObjectId(IMAGE_ID),
+            "user_id": UUID(USER_ID),
+            "object_name": "old.png",
+            "content_hash": "old",
+        }
+    ]
+
+    async def find_one_and_update(query, update, return_document):
+        previous = dict(images[0])
+        images[0].update(update["$set"])
+        return previous
+
+    def find(query, projection):
+        owned = [image for image in images if image["user_id"] == query["user_id"]]
+        cursor = MagicMock()
+        cursor.sort.return_value.limit.return_value.to_list = AsyncMock(
+            return_value=owned
+        )
+        return cursor
+
+    store = AsyncMock()
+    store.put_object.side_effect = lambda **kwargs: kwargs["data"].read(
+        kwargs["length"]
+    )
+    db = AsyncMock()
+    db.find_one_and_update.side_effect = find_one_and_update
+    db.find = MagicMock(side_effect=find)
+    blobs = make_blobs()
+    blobs.find_one_and_update.side_effect = [
+        None,
+        {"_id": "old", "object_name": "old.png", "refcount": 1},
+    ]
+    repository = ImageRepository(store, db, blobs, make_cache())
+
+    await repository.update(make_upload_file(CONTENT), IMAGE_ID, USER_ID)
+    listed = await repository.list_by_user(UUID(USER_ID), None, 10)
+
+    assert [image["_id"] for image in listed] == [ObjectId(IMAGE_ID)]
+    assert listed[0]["content_hash"] == CONTENT_HASH
+
+
+@pytest.mark.asyncio
+async def test_images_sharing_content_are_deleted_one_by_one():
+    url = f"http://127.0.0.1:9000/images/{CONTENT_HASH}.png"
+    other_user = "0f1e2d3c-4b5a-6978-8796-a5b4c3d2e1f0"
+    images = [
+        {
+            "_id": ObjectId(),
+            "user_id": UUID(user_id),
+            "object_name": f"{CONTENT_HASH}.png",
+            "url": url,
+            "content_hash": CONTENT_HASH,
+        }
+        for user_id in (other_user, USER_ID)
+    ]
+
+    async def find_one_and_delete(query):
+        for image in images:
+            if all(image[field] == value for field, value in query.items()):
+                images.remove(image)
+                return image
+        return None
+
+    db = AsyncMock()
+    db.find_one_and_delete.side_effect = find_one_and_delete
+    blobs = make_blobs({"_id": CONTENT_HASH, "refcount": 1})
+    repository = ImageRepository(AsyncMock(), db, blobs, make_cache())
+    mine = str(images[1]["_id"])
+
+    # Another user's copy of the same bytes is out of reach
+    assert await repository.delete(str(images[0]["_id"]), USER_ID) is None
+    assert await repository.delete(mine, USER_ID) == (mine, [])
+    assert [image["user_id"] for image in images] == [UUID(other_user)]
+    assert await repository.delete("not-an-id", USER_ID) is None
+
+
+@pytest.mark.asyncio
+async def test_live_objects_include_content_stored_again():
+    db, blobs, pending = AsyncMock(), AsyncMock(), AsyncMock()
+    db.distinct.return_value = []
+    pending.distinct.return_value = []
+    # The first distinct is the references, the second the stored hashes
+    blobs.distinct.side_effect = [[], ["a" * 64]]
+    repository = ImageRepository(AsyncMock(), db, blobs, make_cache(), pending)
+    names = [f"{'a' * 64}.png", f"{'a' * 64}.thumb.jpg", f"{'b' * 64}.png"]
+
+    live = await repository.find_live_objects(names)
+
+    assert live == set(names[:2])
+
+
+@pytest.mark.asyncio
+async def test_url_resolves_to_an_image_of_the_caller_only():
+    db = AsyncMock()
+    db.find_one.return_value = {"_id": ObjectId(IMAGE_ID)}
+    repository = ImageRepository(AsyncMock(), db, AsyncMock(), make_cache())
+    url = f"http://127.0.0.1:9000/images/{CONTENT_HASH}.png"
+
+    assert await repository.find_owned_id(url, USER_ID) == IMAGE_ID
+    assert db.find_one.call_args.args[0] == {"url": url, "user_id": UUID(USER_ID)}
+    assert await repository.find_owned_id(url, "not-a-user") is None
@@ -1,21 +1,53 @@
-import pytest
+import struct
+import warnings
+from datetime import UTC, datetime
+from types import SimpleNamespace
 from unittest.mock import AsyncMock
 
+import pytest
+from bson import ObjectId
 from fastapi.testclient import TestClient
 
+from ..core.config import UPLOAD_PART_SIZE
 from ..main import app
 from ..repository.image_repository import ImageRepository
+from ..services.image_service import ImageService
+from ..services.job_queue import get_job_queue
 from ..utilities.current_user_id import get_current_user_id
 
 
+def png_header(width: int, height: int) -> bytes:
+    """A PNG signature and IHDR chunk, all the service reads of an upload."""
+
+    return b"\x89PNG\r\n\x1a\n" + struct.pack(
+        ">I4sII5B", 13, b"IHDR", width, height, 8, 6, 0, 0, 0
+    )
+
+
+PNG = png_header(640, 480)
+
+
+def stored(metadata: dict) -> dict:
+    """The document the repository returns for the response `metadata`."""
+
+    fields = {name: value for name, value in metadata.items() if name != "id"}
+    return {"_id": ObjectId(metadata["id"]), **fields}
+
+
 @pytest.fixture
 def mock_image_repository():
     return AsyncMock()
 
 
+@pytest.fixture
+def mock_job_queue():
+    return AsyncMock()
+
+
 @pytest.fixture(autouse=True)
-def override_image_repository(mock_image_repository):
+def override_image_repository(mock_image_repository, mock_job_queue):
     app.dependency_overrides[ImageRepository] = lambda: mock_image_repository
+    app.dependency_overrides[get_job_queue] = lambda: mock_job_queue
     app.dependency_overrides[get_current_user_id] = (
         lambda: "a1b2c3d4-e5f6-5895-1234-567890abcdef"
     )
@@ -33,12 +65,16 @@ def test_create_image_success(mock_image_repository):
         "url": "http://127.0.0.1:9000/images/add09d36-9d1f-4c1d-b177-e1dd6baf76f9.png",
         "content_type": "image/png",
         "size": 178398,
+        "width": 640,
+        "height": 480,
+        "content_hash": None,
         "uploaded_at": "2025-08-04T07:48:57.419399",
+        "renditions": [],
     }
-    mock_image_repository.create.return_value = expected_metadata
+    mock_image_repository.create.return_value = stored(expected_metadata)
 
-    file_content = b"fake image data"
-    files = {"file": ("test.jpg", file_content, "image/jpeg")}
+    file_content = PNG + b"fake image data"
+    files = {"file": ("test.png", file_content, "image/png")}
     params = {"user_id": "a1b2c3d4-e5f6-5895-1234-567890abcdef"}
 
     client = TestClient(app)
@@ -50,7 +86,28 @@ def test_create_image_success(mock_image_repository):
     assert response.status_code == 201
     assert response.json() == expected_metadata
 
-    mock_image_repository.create.assert_called_once()
+    image_header = mock_image_repository.create.call_args.args[2]
+    assert (image_header.width, image_header.height) == (640, 480)
+
+
+@pytest.mark.parametrize(
+    "content, status_code",
+    [
+        (b"<svg xmlns='http://www.w3.org/2000/svg'/>", 400),
+        # 100000 x 100000 pixels declared in a few bytes
+        (png_header(100_000, 100_000) + b"fake image data", 413),
+    ],
+)
+def test_create_image_rejects_by_header(mock_image_repository, content, status_code):
+    # The client claims a PNG either way; the bytes decide
+    files = {"file": ("test.png", content, "image/png")}
+
+    client = TestClient(app)
+    headers = {"Authorization": "Bearer testtoken"}
+    response = client.post("/image/upload/", files=files, headers=headers)
+
+    assert response.status_code == status_code
+    mock_image_repository.create.assert_not_called()
 
 
 def test_get_image_success(mock_image_repository):
@@ -63,9 +120,13 @@ def test_get_image_success(mock_image_repository):
         "url": "http://127.0.0.1:9000/images/add09d36-9d1f-4c1d-b177-e1dd6baf76f9.png",
         "content_type": "image/png",
         "size": 178398,
+        "width": None,
+        "height": None,
+        "content_hash": None,
         "uploaded_at": "2025-08-04T07:48:57.419399",
+        "renditions": [],
     }
-    mock_image_repository.get.return_value = expected_metadata
+    mock_image_repository.get.return_value = stored(expected_metadata)
 
     client = TestClient(app)
     headers = {"Authorization": "Bearer testtoken"}
@@ -77,7 +138,7 @@ def test_get_image_success(mock_image_repository):
 
 
 def test_get_image_not_found(mock_image_repository):
-    image_id = ""
+    image_id = "68909019c7ce69410acefca8"
     mock_image_repository.get.return_value = None
 
     client = TestClient(app)
@@ -87,7 +148,7 @@ def test_get_image_not_found(mock_image_repository):
     assert response.status_code == 404
 
 
-def test_update_image_success(mock_image_repository):
+def test_update_image_success(mock_image_repository, mock_job_queue):
     image_url = "add09d36-9d1f-4c1d-b177-e1dd6baf76f9.png"
     user_id = "a1b2c3d4-e5f6-5895-1234-567890abcdef"
     expected_metadata = {
@@ -98,16 +159,17 @@ def test_update_image_success(mock_image_repository):
         "url": f"http://127.0.0.1:9000/images/{image_url}",
         "content_type": "image/png",
         "size": 178398,
+        "width": 640,
+        "height": 480,
+        "content_hash": None,
         "uploaded_at": "2025-08-04T07:48:57.419399",
+        "renditions": [],
     }
 
-    file_content = b"new fake image data"
+    file_content = PNG + b"new fake image data"
     files = {"file": ("new_image.png", file_content, "image/png")}
-    params = {
-        "image_url": image_url,
-        "user_id": user_id,
-    }
-    mock_image_repository.update.return_value = expected_metadata
+    params = {"image_id": "68909019c7ce69410acefca8"}
+    mock_image_repository.update.return_value = stored(expected_metadata), ["a.png"]
 
     client = TestClient(app)
     headers = {"Authorization": "Bearer testtoken"}
@@ -116,29 +178,616 @@ def test_update_image_success(mock_image_repository):
     assert response.status_code == 200
     assert response.json() == expected_metadata
     mock_image_repository.update.assert_called_once()
+    assert mock_image_repository.update.call_args.args[1:3] == (
+        "68909019c7ce69410acefca8",
+        user_id,
+    )
+    # The released object is removed by the job queue, not on the request path
+    kind, payload = mock_job_queue.enqueue.await_args_list[0].args
+    key = mock_job_queue.enqueue.await_args_list[0].kwargs["key"]
+    assert (kind, payload) == ("remove_objects", {"object_names": ["a.png"]})
+    assert key.startswith("remove_objects:68909019c7ce69410acefca8:")
+    mock_image_repository.remove_objects.assert_not_awaited()
+
+
+def test_update_image_stands_when_released_objects_cannot_be_removed(
+    mock_image_repository, mock_job_queue
+):
+    metadata = {"_id": ObjectId("68909019c7ce69410acefca8"), "object_name": "b.png"}
+    mock_image_repository.update.return_value = metadata, ["a.png"]
+    mock_image_repository.find_live_objects.return_value = set()
+    mock_image_repository.remove_objects.side_effect = ConnectionError()
+    mock_job_queue.enqueue.side_effect = ConnectionError()
 
+    client = TestClient(app)
+    headers = {"Authorization": "Bearer testtoken"}
+    files = {"file": ("new_image.png", PNG, "image/png")}
+    params = {"image_id": "68909019c7ce69410acefca8"}
+    response = client.put("/image/update/", files=files, params=params, headers=headers)
 
-def test_delete_image_success(mock_image_repository):
-    image_url = "68909019c7ce69410acefca8"
-    expected_metadata = "Image deleted successfully"
-    mock_image_repository.delete.return_value = expected_metadata
+    assert response.status_code == 200
+    mock_image_repository.remove_objects.assert_awaited_once_with(["a.png"])
+
+
+def test_delete_image_success(mock_image_repository, mock_job_queue):
+    image_id = "68909019c7ce69410acefca8"
+    mock_image_repository.delete.return_value = ("68909019c7ce69410acefca8", ["a.png"])
+
+    client = TestClient(app)
+    headers = {"Authorization": "Bearer testtoken"}
+    params = {"image_id": image_id}
+    response = client.delete("/image/delete/", params=params, headers=headers)
+
+    assert response.status_code == 200
+    assert response.json() == {"message": "Deleted with success"}
+    mock_image_repository.delete.assert_awaited_once_with(
+        image_id, "a1b2c3d4-e5f6-5895-1234-567890abcdef"
+    )
+    # Objects are removed by the job queue, not on the request path
+    mock_job_queue.enqueue.assert_awaited_once_with(
+        "remove_objects",
+        {"object_names": ["a.png"]},
+        key="remove_objects:68909019c7ce69410acefca8",
+    )
+    mock_image_repository.remove_objects.assert_not_awaited()
+
+
+def test_delete_image_by_url_of_the_callers_image(mock_image_repository):
+    image_url = "http://127.0.0.1:9000/images/a.png"
+    mock_image_repository.find_owned_id.return_value = "68909019c7ce69410acefca8"
+    mock_image_repository.delete.return_value = ("68909019c7ce69410acefca8", [])
 
     client = TestClient(app)
     headers = {"Authorization": "Bearer testtoken"}
     params = {"image_url": image_url}
-    response = client.delete(f"/image/delete/", params=params, headers=headers)
+    response = client.delete("/image/delete/", params=params, headers=headers)
 
     assert response.status_code == 200
-    assert response.json() == {"message": "Image deleted successfully"}
+    mock_image_repository.find_owned_id.assert_awaited_once_with(
+        image_url, "a1b2c3d4-e5f6-5895-1234-567890abcdef"
+    )
+    mock_image_repository.delete.assert_awaited_once_with(
+        "68909019c7ce69410acefca8", "a1b2c3d4-e5f6-5895-1234-567890abcdef"
+    )
+
+
+def test_update_image_by_url_not_owned_is_not_found(mock_image_repository):
+    mock_image_repository.find_owned_id.return_value = None
+
+    client = TestClient(app)
+    headers = {"Authorization": "Bearer testtoken"}
+    files = {"file": ("new_image.png", PNG, "image/png")}
+    params = {"image_url": "http://127.0.0.1:9000/images/a.png"}
+    response = client.put("/image/update/", files=files, params=params, headers=headers)
+
+    assert response.status_code == 404
+    mock_image_repository.update.assert_not_awaited()
+
+
+def test_delete_image_removes_objects_when_queue_is_down(
+    mock_image_repository, mock_job_queue
+):
+    mock_image_repository.delete.return_value = ("68909019c7ce69410acefca8", ["a.png"])
+    mock_image_repository.find_live_objects.return_value = set()
+    mock_job_queue.enqueue.side_effect = ConnectionError()
+
+    client = TestClient(app)
+    headers = {"Authorization": "Bearer testtoken"}
+    params = {"image_id": "68909019c7ce69410acefca8"}
+    response = client.delete("/image/delete/", params=params, headers=headers)
+
+    assert response.status_code == 200
+    mock_image_repository.remove_objects.assert_awaited_once_with(["a.png"])
+
+
+@pytest.mark.asyncio
+async def test_remove_objects_job_keeps_objects_stored_again(
+    mock_image_repository, mock_job_queue
+):
+    # The same bytes were uploaded again after the delete queued the removal
+    mock_image_repository.find_live_objects.return_value = {"a.png", "a.thumb.png"}
+    service = ImageService(mock_image_repository, mock_job_queue)
+
+    await service.run_remove_objects_job(
+        {"object_names": ["a.png", "a.thumb.png", "b.png"]}
+    )
+
+    mock_image_repository.remove_objects.assert_awaited_once_with(["b.png"])
+
+
+@pytest.mark.asyncio
+async def test_renditions_are_scheduled_again_for_content_stored_again(
+    mock_image_repository, mock_job_queue
+):
+    image = {"_id": ObjectId(), "object_name": "a.png", "renditions": []}
+    service = ImageService(mock_image_repository, mock_job_queue)
+
+    # An update away from the content and one back to it
+    await service.schedule_renditions({**image, "uploaded_at": datetime(2025, 8, 4)})
+    await service.schedule_renditions({**image, "uploaded_at": datetime(2025, 8, 5)})
+
+    keys = [call.kwargs["key"] for call in mock_job_queue.enqueue.await_args_list]
+    assert len(set(keys)) == 2
+
+
+@pytest.mark.asyncio
+async def test_enrich_metadata_job_reads_dimensions_from_the_whole_object(
+    mock_image_repository, mock_job_queue
+):
+    image = {"_id": ObjectId(), "object_name": "uploads/a.png", "width": None}
+    mock_image_repository.get.return_value = image
+    mock_image_repository.read_object.return_value = PNG + b"pixels"
+    service = ImageService(mock_image_repository, mock_job_queue)
+
+    await service.schedule_enrichment(image)
+    kind, payload = mock_job_queue.enqueue.call_args.args
+    await service.run_enrich_metadata_job(payload)
+
+    assert kind == "enrich_metadata"
+    mock_image_repository.read_object.assert_awaited_once_with("uploads/a.png")
+    mock_image_repository.set_dimensions.assert_awaited_once_with(image, 640, 480)
+
+    # Replaced since, the job leaves the new content alone
+    mock_image_repository.get.return_value = {**image, "object_name": "b.png"}
+    await service.run_enrich_metadata_job(payload)
+    assert mock_image_repository.set_dimensions.await_count == 1
 
 
 def test_delete_image_failure(mock_image_repository):
-    image_url = "68909019c7ce69410acefca8"
-    mock_image_repository.delete.return_value = False
+    image_id = "68909019c7ce69410acefca8"
+    mock_image_repository.delete.return_value = None
 
     client = TestClient(app)
     headers = {"Authorization": "Bearer testtoken"}
-    params = {"image_url": image_url}
-    response = client.delete(f"/image/delete/", params=params, headers=headers)
+    params = {"image_id": image_id}
+    response = client.delete("/image/delete/", params=params, headers=headers)
 
     assert response.status_code == 500
+
+
+def mock_image_content(mock_image_repository, content: bytes):
+    mock_image_repository.get.return_value = {
+        "_id": "68909019c7ce69410acefca8",
+        "object_name": "add09d36-9d1f-4c1d-b177-e1dd6baf76f9.png",
+        "content_type": "image/png",
+    }
+    mock_image_repository.stat_object.return_value = SimpleNamespace(
+        etag="abc123",
+        size=len(content),
+        last_modified=datetime(2025, 8, 4, 7, 48, 57, tzinfo=UTC),
+        content_type="image/png",
+    )
+
+    async def open_object_stream(object_name, offset, length):
+        async def chunks():
+            yield content[offset : offset + length]
+
+        return chunks()
+
+    mock_image_repository.open_object_stream.side_effect = open_object_stream
+
+
+def test_get_image_content_success(mock_image_repository):
+    mock_image_content(mock_image_repository, b"fake image data")
+
+    client = TestClient(app)
+    headers = {"Authorization": "Bearer testtoken"}
+    response = client.get("/image/68909019c7ce69410acefca8/content", headers=headers)
+
+    assert response.status_code == 200
+    assert response.content == b"fake image data"
+    assert response.headers["etag"] == '"abc123"'
+    assert response.headers["last-modified"] == "Mon, 04 Aug 2025 07:48:57 GMT"
+    assert "max-age" in response.headers["cache-control"]
+
+
+def test_get_image_content_not_modified(mock_image_repository):
+    mock_image_content(mock_image_repository, b"fake image data")
+
+    client = TestClient(app)
+    headers = {"If-None-Match": '"abc123"', "Authorization": "Bearer testtoken"}
+    response = client.get("/image/68909019c7ce69410acefca8/content", headers=headers)
+
+    assert response.status_code == 304
+    assert response.content == b""
+    mock_image_repository.open_object_stream.assert_not_called()
+
+
+@pytest.mark.parametrize(
+    "since", ["Mon, 04 Aug 2025 07:48:57 GMT", "Mon, 04 Aug 2025 07:48:57 -0000"]
+)
+def test_get_image_content_not_modified_since(mock_image_repository, since):
+    mock_image_content(mock_image_repository, b"fake image data")
+
+    client = TestClient(app)
+    headers = {"If-Modified-Since": since, "Authorization": "Bearer testtoken"}
+    response = client.get("/image/68909019c7ce69410acefca8/content", headers=headers)
+
+    assert response.status_code == 304
+
+
+def test_get_image_content_range(mock_image_repository):
+    mock_image_content(mock_image_repository, b"fake image data")
+
+    client = TestClient(app)
+    headers = {"Range": "bytes=5-9", "Authorization": "Bearer testtoken"}
+    response = client.get("/image/68909019c7ce69410acefca8/content", headers=headers)
+
+    assert response.status_code == 206
+    assert response.content == b"image"
+    assert response.headers["content-range"] == "bytes 5-9/15"
+
+
+def test_get_image_content_range_not_satisfiable(mock_image_repository):
+    mock_image_content(mock_image_repository, b"fake image data")
+
+    client = TestClient(app)
+    headers = {"Range": "bytes=100-", "Authorization": "Bearer testtoken"}
+    response = client.get("/image/68909019c7ce69410acefca8/content", headers=headers)
+
+    assert response.status_code == 416
+    assert response.headers["content-range"] == "bytes */15"
+
+
+def test_head_image_content_sends_headers_only(mock_image_repository):
+    mock_image_content(mock_image_repository, b"fake image data")
+
+    client = TestClient(app)
+    headers = {"Authorization": "Bearer testtoken"}
+    response = client.head("/image/68909019c7ce69410acefca8/content", headers=headers)
+
+    assert response.status_code == 200
+    assert response.headers["content-length"] == "15"
+    assert response.content == b""
+    mock_image_repository.open_object_stream.assert_not_called()
+
+
+def test_openapi_schema_has_unique_operation_ids():
+    app.openapi_schema = None
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        app.openapi()
+
+
+def test_get_image_content_requires_bearer_token(mock_image_repository):
+    mock_image_content(mock_image_repository, b"fake image data")
+
+    client = TestClient(app)
+    response = client.get("/image/68909019c7ce69410acefca8/content")
+
+    assert response.status_code == 401
+    mock_image_repository.open_object_stream.assert_not_called()
+
+
+def test_get_cache_stats():
+    client = TestClient(app)
+    headers = {"Authorization": "Bearer testtoken"}
+    response = client.get("/cache/stats", headers=headers)
+
+    assert response.status_code == 200
+    assert set(response.json()) == {"hits", "misses", "coalesced", "evictions", "size"}
+
+
+def test_get_images_batch_reports_missing_ids(mock_image_repository):
+    found_id = "68909019c7ce69410acefca8"
+    missing_id = "68909019c7ce69410acefca9"
+    mock_image_repository.get_many.return_value = [
+        {
+            "_id": found_id,
+            "user_id": "a1b2c3d4-e5f6-5895-1234-567890abcdef",
+            "filename": "image.png",
+            "object_name": "add09d36-9d1f-4c1d-b177-e1dd6baf76f9.png",
+            "url": "http://127.0.0.1:9000/images/add09d36-9d1f-4c1d-b177-e1dd6baf76f9.png",
+            "content_type": "image/png",
+            "size": 178398,
+            "uploaded_at": "2025-08-04T07:48:57.419399",
+        }
+    ]
+
+    client = TestClient(app)
+    headers = {"Authorization": "Bearer testtoken"}
+    body = {"ids": [found_id, missing_id, found_id]}
+    response = client.post("/image/batch", json=body, headers=headers)
+
+    assert response.status_code == 200
+    assert [image["id"] for image in response.json()["images"]] == [found_id]
+    assert response.json()["missing"] == [missing_id]
+    mock_image_repository.get_many.assert_called_once_with([found_id, missing_id])
+
+
+def test_create_images_bulk_reports_partial_failures(mock_image_repository):
+    created = {
+        "_id": "68909019c7ce69410acefca8",
+        "user_id": "a1b2c3d4-e5f6-5895-1234-567890abcdef",
+        "filename": "cover.png",
+        "object_name": "add09d36-9d1f-4c1d-b177-e1dd6baf76f9.png",
+        "url": "http://127.0.0.1:9000/images/add09d36-9d1f-4c1d-b177-e1dd6baf76f9.png",
+        "content_type": "image/png",
+        "size": 178398,
+        "uploaded_at": "2025-08-04T07:48:57.419399",
+    }
+    mock_image_repository.create_many.return_value = [
+        created,
+        Exception("Error uploading file to MinIO"),
+    ]
+
+    files = [
+        ("files", ("cover.png", PNG + b"fake image data", "image/png")),
+        ("files", ("notes.txt", b"not an image", "text/plain")),
+        ("files", ("screenshot.png", PNG + b"fake image data 2", "image/png")),
+    ]
+    client = TestClient(app)
+    headers = {"Authorization": "Bearer testtoken"}
+    response = client.post("/image/upload/bulk/", files=files, headers=headers)
+
+    assert response.status_code == 207
+    results = response.json()["results"]
+    assert results[0]["image"]["id"] == "68909019c7ce69410acefca8"
+    assert results[1]["error"] == "Invalid file type. Only images are allowed"
+    assert results[2]["error"] == "Error uploading file to MinIO"
+    uploaded = mock_image_repository.create_many.call_args.args[0]
+    assert [file.filename for file in uploaded] == ["cover.png", "screenshot.png"]
+
+
+def make_listed_image(image_id: str, uploaded_at: datetime) -> dict:
+    return {
+        "_id": ObjectId(image_id),
+        "user_id": "a1b2c3d4-e5f6-5895-1234-567890abcdef",
+        "filename": "image.png",
+        "object_name": "add09d36-9d1f-4c1d-b177-e1dd6baf76f9.png",
+        "url": "http://127.0.0.1:9000/images/add09d36-9d1f-4c1d-b177-e1dd6baf76f9.png",
+        "uploaded_at": uploaded_at,
+    }
+
+
+def test_list_images_pages_with_a_cursor(mock_image_repository):
+    newest = make_listed_image("68909019c7ce69410acefcaa", datetime(2025, 8, 4, 9))
+    middle = make_listed_image("68909019c7ce69410acefca9", datetime(2025, 8, 4, 8))
+    oldest = make_listed_image("68909019c7ce69410acefca8", datetime(2025, 8, 4, 7))
+    mock_image_repository.list_by_user.side_effect = [
+        [newest, middle, oldest],
+        [oldest],
+    ]
+
+    client = TestClient(app)
+    headers = {"Authorization": "Bearer testtoken"}
+    params = {"user_id": "a1b2c3d4-e5f6-5895-1234-567890abcdef", "limit": 2}
+    first = client.get("/image/", params=params, headers=headers)
+
+    assert first.status_code == 200
+    assert [image["id"] for image in first.json()["images"]] == [
+        "68909019c7ce69410acefcaa",
+        "68909019c7ce69410acefca9",
+    ]
+    cursor = first.json()["next_cursor"]
+    assert cursor
+
+    second = client.get("/image/", params={**params, "cursor": cursor}, headers=headers)
+
+    assert second.status_code == 200
+    assert [image["id"] for image in second.json()["images"]] == [
+        "68909019c7ce69410acefca8"
+    ]
+    assert second.json()["next_cursor"] is None
+    _, after, limit = mock_image_repository.list_by_user.call_args.args
+    assert after == (middle["uploaded_at"], middle["_id"])
+    assert limit == 3
+
+
+def test_list_images_rejects_an_invalid_cursor(mock_image_repository):
+    client = TestClient(app)
+    headers = {"Authorization": "Bearer testtoken"}
+    params = {"user_id": "a1b2c3d4-e5f6-5895-1234-567890abcdef", "cursor": "bogus"}
+    response = client.get("/image/", params=params, headers=headers)
+
+    assert response.status_code == 400
+    mock_image_repository.list_by_user.assert_not_called()
+
+
+PENDING_UPLOAD = {
+    "_id": ObjectId("68909019c7ce69410acefcb0"),
+    "user_id": "a1b2c3d4-e5f6-5895-1234-567890abcdef",
+    "filename": "cover.png",
+    "object_name": "uploads/68909019c7ce69410acefcb0.png",
+    "content_type": "image/png",
+    "size": 178398,
+    "created_at": datetime(2025, 8, 4, 7, 48),
+    "expires_at": datetime(2025, 8, 4, 8, 3),
+}
+
+
+def test_create_upload_url_returns_presigned_put(mock_image_repository):
+    mock_image_repository.create_pending_upload.return_value = (
+        PENDING_UPLOAD,
+        "http://127.0.0.1:9000/images/uploads/68909019c7ce69410acefcb0.png?X-Amz-Signature=s",
+    )
+
+    client = TestClient(app)
+    headers = {"Authorization": "Bearer testtoken"}
+    body = {"filename": "cover.png", "content_type": "image/png", "size": 178398}
+    response = client.post("/image/upload-url", json=body, headers=headers)
+
+    assert response.status_code == 201
+    assert "X-Amz-Signature" in response.json()["upload_url"]
+    assert response.json()["upload"]["id"] == "68909019c7ce69410acefcb0"
+
+
+def test_create_upload_url_rejects_oversized_file(mock_image_repository):
+    client = TestClient(app)
+    headers = {"Authorization": "Bearer testtoken"}
+    body = {"filename": "cover.png", "content_type": "image/png", "size": 1 << 40}
+    response = client.post("/image/upload-url", json=body, headers=headers)
+
+    assert response.status_code == 413
+    mock_image_repository.create_pending_upload.assert_not_called()
+
+
+@pytest.mark.parametrize(
+    "object_info, status_code",
+    [
+        (SimpleNamespace(size=178398, content_type="image/png"), 201),
+        (SimpleNamespace(size=10, content_type="image/png"), 400),
+        (None, 409),
+    ],
+)
+def test_complete_upload_verifies_stored_object(
+    mock_image_repository, object_info, status_code
+):
+    mock_image_repository.get_pending_upload.return_value = PENDING_UPLOAD
+    mock_image_repository.stat_object.return_value = object_info
+    mock_image_repository.read_object.return_value = PNG
+    mock_image_repository.complete_pending_upload.return_value = {
+        **PENDING_UPLOAD,
+        "url": "http://127.0.0.1:9000/images/uploads/68909019c7ce69410acefcb0.png",
+        "uploaded_at": datetime(2025, 8, 4, 7, 50),
+    }
+
+    client = TestClient(app)
+    headers = {"Authorization": "Bearer testtoken"}
+    response = client.post("/image/68909019c7ce69410acefcb0/complete", headers=headers)
+
+    assert response.status_code == status_code
+    if status_code == 201:
+        assert response.json()["id"] == "68909019c7ce69410acefcb0"
+    if status_code == 400:
+        mock_image_repository.remove_object.assert_called_once_with(
+            PENDING_UPLOAD["object_name"]
+        )
+
+
+def test_complete_upload_rejects_content_of_another_type(mock_image_repository):
+    mock_image_repository.get_pending_upload.return_value = PENDING_UPLOAD
+    mock_image_repository.stat_object.return_value = SimpleNamespace(
+        size=178398, content_type="image/png"
+    )
+    mock_image_repository.read_object.return_value = b"<html>not an image</html>"
+
+    client = TestClient(app)
+    headers = {"Authorization": "Bearer testtoken"}
+    response = client.post("/image/68909019c7ce69410acefcb0/complete", headers=headers)
+
+    assert response.status_code == 400
+    mock_image_repository.remove_object.assert_called_once_with(
+        PENDING_UPLOAD["object_name"]
+    )
+    mock_image_repository.complete_pending_upload.assert_not_called()
+
+
+def upload_session(offset: int = 0, size: int = 3 * UPLOAD_PART_SIZE) -> dict:
+    return {
+        **PENDING_UPLOAD,
+        "size": size,
+        "expires_at": datetime(2999, 1, 1),
+        "multipart_upload_id": "multipart-1",
+        "offset": offset,
+        "parts": [],
+        "lease": ObjectId(),
+    }
+
+
+def test_create_upload_session_schedules_its_expiry(
+    mock_image_repository, mock_job_queue
+):
+    session = upload_session()
+    mock_image_repository.create_upload_session.return_value = session
+
+    client = TestClient(app)
+    headers = {"Authorization": "Bearer testtoken"}
+    body = {"filename": "cover.png", "content_type": "image/png", "size": 178398}
+    response = client.post("/image/uploads", json=body, headers=headers)
+
+    assert response.status_code == 201
+    assert response.headers["location"] == "/image/uploads/68909019c7ce69410acefcb0"
+    assert response.json()["offset"] == 0
+    assert response.json()["part_size"] == UPLOAD_PART_SIZE
+    mock_job_queue.enqueue.assert_awaited_once()
+    assert mock_job_queue.enqueue.call_args.kwargs["run_at"] == session["expires_at"]
+
+
+def test_upload_chunk_keeps_the_whole_parts_it_received(mock_image_repository):
+    mock_image_repository.lease_upload_session.return_value = upload_session()
+
+    async def store_upload_part(session, data, lease):
+        return {**session, "offset": session["offset"] + len(data)}
+
+    mock_image_repository.store_upload_part.side_effect = store_upload_part
+
+    client = TestClient(app)
+    headers = {"Authorization": "Bearer testtoken", "Upload-Offset": "0"}
+    response = client.patch(
+        "/image/uploads/68909019c7ce69410acefcb0",
+        content=b"x" * (UPLOAD_PART_SIZE + 100),
+        headers=headers,
+    )
+
+    # The 100 bytes past the first part are refused, the client sends them again
+    assert response.status_code == 400
+    assert response.headers["upload-offset"] == str(UPLOAD_PART_SIZE)
+    assert str(UPLOAD_PART_SIZE) in response.json()["detail"]
+    mock_image_repository.store_upload_part.assert_awaited_once()
+    mock_image_repository.release_upload_session.assert_awaited_once()
+
+
+def test_upload_chunk_ending_the_upload_may_end_inside_a_part(mock_image_repository):
+    size = UPLOAD_PART_SIZE + 100
+    mock_image_repository.lease_upload_session.return_value = upload_session(size=size)
+
+    async def store_upload_part(session, data, lease):
+        return {**session, "offset": session["offset"] + len(data)}
+
+    mock_image_repository.store_upload_part.side_effect = store_upload_part
+
+    client = TestClient(app)
+    headers = {"Authorization": "Bearer testtoken", "Upload-Offset": "0"}
+    response = client.patch(
+        "/image/uploads/68909019c7ce69410acefcb0", content=b"x" * size, headers=headers
+    )
+
+    assert response.status_code == 204
+    assert response.headers["upload-offset"] == str(size)
+    assert mock_image_repository.store_upload_part.await_count == 2
+
+
+def test_upload_chunk_at_another_offset_conflicts(mock_image_repository):
+    mock_image_repository.lease_upload_session.return_value = None
+    mock_image_repository.get_pending_upload.return_value = upload_session(
+        offset=UPLOAD_PART_SIZE
+    )
+
+    client = TestClient(app)
+    headers = {"Authorization": "Bearer testtoken", "Upload-Offset": "0"}
+    response = client.patch(
+        "/image/uploads/68909019c7ce69410acefcb0", content=b"x", headers=headers
+    )
+
+    assert response.status_code == 409
+    assert str(UPLOAD_PART_SIZE) in response.json()["detail"]
+    mock_image_repository.store_upload_part.assert_not_called()
+
+
+@pytest.mark.parametrize("offset, status_code", [(178398, 201), (100, 409)])
+def test_complete_resumable_upload_assembles_its_parts(
+    mock_image_repository, offset, status_code
+):
+    session = upload_session(offset=offset, size=178398)
+    mock_image_repository.get_pending_upload.return_value = session
+    mock_image_repository.stat_object.side_effect = [
+        None,
+        SimpleNamespace(size=178398, content_type="image/png"),
+    ]
+    mock_image_repository.read_object.return_value = PNG
+    mock_image_repository.complete_pending_upload.return_value = {
+        **PENDING_UPLOAD,
+        "url": "http://127.0.0.1:9000/images/uploads/68909019c7ce69410acefcb0.png",
+        "uploaded_at": datetime(2025, 8, 4, 7, 50),
+    }
+
+    client = TestClient(app)
+    headers = {"Authorization": "Bearer testtoken"}
+    response = client.post("/image/68909019c7ce69410acefcb0/complete", headers=headers)
+
+    assert response.status_code == status_code
+    if status_code == 201:
+        mock_image_repository.assemble_upload_session.assert_awaited_once_with(session)
+    else:
+        mock_image_repository.assemble_upload_session.assert_not_called()
@@ -0,0 +1,109 @@
+import asyncio
+import uuid
+from datetime import UTC, datetime, timedelta
+from unittest.mock import AsyncMock
+
+import pytest
+import pytest_asyncio
+from pymongo.errors import OperationFailure, PyMongoError
+
+from ..core.config import create_mongodb_client, standard_opts
+from ..repository.exceptions import DatabaseOperationError
+from ..repository.indexes import (
+    BLOB_INDEXES,
+    HOT_QUERIES,
+    IMAGE_INDEXES,
+    JOB_INDEXES,
+    PENDING_UPLOAD_INDEXES,
+    ensure_indexes,
+    winning_plan_stages,
+)
+
+INDEX_SCANS = {"IXSCAN", "IDHACK", "EXPRESS_IXSCAN", "EXPRESS_IDHACK"}
+
+
+@pytest.mark.asyncio
+async def test_ensure_indexes_creates_all_indexes():
+    images, blobs, pending, jobs = AsyncMock(), AsyncMock(), AsyncMock(), AsyncMock()
+
+    await ensure_indexes(images, blobs, pending, jobs)
+
+    images.create_indexes.assert_awaited_once_with(IMAGE_INDEXES)
+    blobs.create_indexes.assert_awaited_once_with(BLOB_INDEXES)
+    pending.create_indexes.assert_awaited_once_with(PENDING_UPLOAD_INDEXES)
+    jobs.create_indexes.assert_awaited_once_with(JOB_INDEXES)
+
+
+@pytest.mark.asyncio
+async def test_ensure_indexes_raises_on_conflicting_index():
+    images, blobs, pending, jobs = AsyncMock(), AsyncMock(), AsyncMock(), AsyncMock()
+    images.create_indexes.side_effect = OperationFailure("IndexOptionsConflict")
+
+    with pytest.raises(DatabaseOperationError):
+        await ensure_indexes(images, blobs, pending, jobs)
+
+
+def test_winning_plan_stages_walks_nested_plans():
+    explain = {
+        "queryPlanner": {
+            "winningPlan": {
+                "queryPlan": {
+                    "stage": "FETCH",
+                    "inputStage": {"stage": "IXSCAN", "indexName": "url"},
+                }
+            }
+        }
+    }
+
+    assert winning_plan_stages(explain) == {"FETCH", "IXSCAN"}
+
+
+@pytest_asyncio.fixture
+async def scratch_db():
+    """A throwaway database on the configured mongod, skipped when none is up."""
+
+    try:
+        # Building the client fails already when the Mongo env is not set
+        client = create_mongodb_client()
+    except ValueError:
+        pytest.skip("No MongoDB server configured")
+    try:
+        await asyncio.wait_for(client.admin.command("ping"), timeout=2)
+    except (PyMongoError, TimeoutError):
+        await client.close()
+        pytest.skip("No MongoDB server available")
+
+    name = f"images_test_{uuid.uuid4().hex[:8]}"
+    yield client.get_database(name, codec_options=standard_opts)
+    await client.drop_database(name)
+    await client.close()
+
+
+@pytest.mark.asyncio
+async def test_hot_queries_use_an_index(scratch_db):
+    images, blobs = scratch_db["images"], scratch_db["blobs"]
+    pending, jobs = scratch_db["pending_uploads"], scratch_db["jobs"]
+    now = datetime.now(UTC)
+    await images.insert_many(
+        {
+            "user_id": uuid.uuid4(),
+            "url": f"http://minio/images/{i}.png",
+            "object_name": f"{i}.png",
+            "content_hash": f"{i:064d}",
+            "uploaded_at": now - timedelta(seconds=i),
+        }
+        for i in range(500)
+    )
+
+    await ensure_indexes(images, blobs, pending, jobs)
+    # A second run against existing indexes is a no-op
+    await ensure_indexes(images, blobs, pending, jobs)
+
+    for name, collection, query, sort in HOT_QUERIES:
+        cursor = scratch_db[collection].find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        stages = winning_plan_stages(await cursor.explain())
+
+        assert "COLLSCAN" not in stages, name
+        assert stages & INDEX_SCANS, name
@@ -0,0 +1,91 @@
+import asyncio
+from unittest.mock import AsyncMock
+
+import pytest
+
+from ..services.job_queue import JobQueue
+
+
+def make_job(attempts: int = 1, kind: str = "renditions") -> dict:
+    return {
+        "_id": "renditions:68909019c7ce69410acefca8:a.png",
+        "kind": kind,
+        "payload": {"image_id": "68909019c7ce69410acefca8"},
+        "attempts": attempts,
+    }
+
+
+def make_queue(**kwargs) -> tuple[JobQueue, AsyncMock]:
+    repository = AsyncMock()
+    queue = JobQueue(repository, workers=1, max_attempts=3, backoff=2, **kwargs)
+    return queue, repository
+
+
+@pytest.mark.asyncio
+async def test_run_completes_successful_job():
+    queue, repository = make_queue()
+    handler = AsyncMock()
+    queue.register("renditions", handler)
+    job = make_job()
+
+    await queue.run(job)
+
+    handler.assert_awaited_once_with(job["payload"])
+    repository.complete.assert_awaited_once_with(job)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("attempts, delay", [(1, 2), (2, 4)])
+async def test_run_retries_failed_job_with_backoff(attempts, delay):
+    queue, repository = make_queue()
+    queue.register("renditions", AsyncMock(side_effect=ConnectionError("down")))
+    job = make_job(attempts)
+
+    await queue.run(job)
+
+    repository.retry.assert_awaited_once_with(job, "down", delay)
+    repository.bury.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_run_buries_job_after_last_attempt():
+    queue, repository = make_queue()
+    queue.register("renditions", AsyncMock(side_effect=ConnectionError("down")))
+    job = make_job(attempts=3)
+
+    await queue.run(job)
+
+    repository.bury.assert_awaited_once_with(job, "down")
+    repository.retry.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_run_buries_job_without_handler():
+    queue, repository = make_queue()
+    job = make_job(kind="unknown")
+
+    await queue.run(job)
+
+    repository.bury.assert_awaited_once()
+    repository.complete.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_enqueue_wakes_idle_worker():
+    # Long poll interval: the job only runs this fast if enqueue wakes the worker
+    queue, repository = make_queue(poll_interval=60)
+    job = make_job()
+    repository.claim.side_effect = [None, job] + [None] * 10
+    done = asyncio.Event()
+    queue.register("renditions", AsyncMock(side_effect=lambda payload: done.set()))
+
+    await queue.start()
+    await asyncio.sleep(0)
+    await queue.enqueue("renditions", job["payload"], key=job["_id"])
+    await asyncio.wait_for(done.wait(), timeout=1)
+    await queue.stop(timeout=1)
+
+    repository.enqueue.assert_awaited_once_with(
+        job["_id"], "renditions", job["payload"], None
+    )
+    repository.complete.assert_awaited_once_with(job)
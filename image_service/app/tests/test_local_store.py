@@ -0,0 +1,119 @@
+import io
+
+import pytest
+
+from ..core.exceptions import ObjectStoreException
+from ..core.local_store import LocalObjectStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = LocalObjectStore(str(tmp_path))
+    yield store
+    store.shutdown()
+
+
+async def read(store: LocalObjectStore, name: str, offset=0, length=0) -> bytes:
+    response = await store.get_object("images", name, offset, length)
+    return b"".join([chunk async for chunk in store.iter_object(response, 4)])
+
+
+@pytest.mark.asyncio
+async def test_put_replaces_the_object_atomically(store, tmp_path):
+    await store.put_object("images", "a.png", io.BytesIO(b"first"), 5)
+    await store.put_object("images", "a.png", io.BytesIO(b"second"), 6)
+
+    assert await read(store, "a.png") == b"second"
+    # Nothing but the object is left in the bucket directory
+    assert [path.name for path in (tmp_path / "images").iterdir()] == ["a.png"]
+
+
+@pytest.mark.asyncio
+async def test_failed_write_keeps_the_previous_object(store, tmp_path):
+    class Failing(io.BytesIO):
+        def read(self, size=-1):
+            raise OSError("client went away")
+
+    await store.put_object("images", "a.png", io.BytesIO(b"kept"), 4)
+    with pytest.raises(ObjectStoreException):
+        await store.put_object("images", "a.png", Failing(), 4)
+
+    assert await read(store, "a.png") == b"kept"
+    assert [path.name for path in (tmp_path / "images").iterdir()] == ["a.png"]
+
+
+@pytest.mark.asyncio
+async def test_reads_serve_ranges_as_views_of_the_file(store):
+    await store.put_object("images", "a.png", io.BytesIO(b"0123456789"), 10)
+
+    response = await store.get_object("images", "a.png", 3, 5)
+    chunks = [chunk async for chunk in store.iter_object(response, 4)]
+
+    assert all(isinstance(chunk, memoryview) for chunk in chunks)
+    assert b"".join(chunks) == b"34567"
+    assert await read(store, "a.png", 8) == b"89"
+
+
+@pytest.mark.asyncio
+async def test_stat_and_missing_objects(store):
+    await store.put_object("images", "uploads/a.png", io.BytesIO(b"abc"), 3)
+
+    info = await store.stat_object("images", "uploads/a.png")
+    assert (info.size, info.content_type) == (3, "image/png")
+
+    with pytest.raises(ObjectStoreException) as raised:
+        await store.stat_object("images", "missing.png")
+    assert raised.value.code == "NoSuchKey"
+    # Removing a missing object succeeds, like S3
+    await store.remove_object("images", "missing.png")
+
+
+@pytest.mark.asyncio
+async def test_list_objects_pages_through_nested_names(store):
+    for name in ("b.png", "a.png", "uploads/c.png"):
+        await store.put_object("images", name, io.BytesIO(b"x"), 1)
+
+    pages = [page async for page in store.list_objects("images", page_size=2)]
+
+    assert [[item.object_name for item in page] for page in pages] == [
+        ["a.png", "b.png"],
+        ["uploads/c.png"],
+    ]
+
+
+@pytest.mark.asyncio
+async def test_object_names_cannot_leave_the_bucket(store):
+    with pytest.raises(ObjectStoreException):
+        await store.put_object("images", "../escape.png", io.BytesIO(b"x"), 1)
+
+
+@pytest.mark.asyncio
+async def test_multipart_upload_joins_its_parts_in_order(store, tmp_path):
+    upload_id = await store.create_multipart_upload("images", "a.png", "image/png")
+    second = await store.upload_part("images", "a.png", upload_id, 2, b"world")
+    first = await store.upload_part("images", "a.png", upload_id, 1, b"hello ")
+    # Not an object until it is completed
+    assert [chunk async for chunk in store.list_objects("images")] == []
+
+    await store.complete_multipart_upload(
+        "images", "a.png", upload_id, [(1, first), (2, second)]
+    )
+
+    assert await read(store, "a.png") == b"hello world"
+    assert not (tmp_path / ".multipart" / upload_id).exists()
+    with pytest.raises(ObjectStoreException) as error:
+        await store.abort_multipart_upload("images", "a.png", upload_id)
+    assert error.value.code == "NoSuchUpload"
+
+
+@pytest.mark.asyncio
+async def test_aborted_multipart_upload_takes_no_more_parts(store):
+    upload_id = await store.create_multipart_upload("images", "a.png", "image/png")
+    await store.upload_part("images", "a.png", upload_id, 1, b"hello")
+    await store.abort_multipart_upload("images", "a.png", upload_id)
+
+    with pytest.raises(ObjectStoreException) as error:
+        await store.upload_part("images", "a.png", upload_id, 2, b"world")
+    assert error.value.code == "NoSuchUpload"
+    with pytest.raises(ObjectStoreException):
+        await store.upload_part("images", "a.png", "../../a", 1, b"escape")
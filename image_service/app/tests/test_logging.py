@@ -0,0 +1,93 @@
+import io
+import json
+import logging
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+
+from ..core.logging import (
+    JsonFormatter,
+    SamplingFilter,
+    create_log_pipeline,
+    request_id,
+)
+from ..core.middleware import RequestIdMiddleware
+
+
+def make_record(message="failed %s", args=("x",), level=logging.ERROR, line=10):
+    return logging.LogRecord("app", level, "image.py", line, message, args, None)
+
+
+def test_sampling_keeps_a_burst_per_call_site(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr("app.core.logging.time.monotonic", lambda: now[0])
+    sampler = SamplingFilter(burst=2, window=10)
+
+    kept = [sampler.filter(make_record()) for _ in range(5)]
+    other_site = sampler.filter(make_record(line=20))
+    info = sampler.filter(make_record(level=logging.INFO))
+    now[0] = 11
+    next_window = make_record()
+
+    assert kept == [True, True, False, False, False]
+    assert other_site and info
+    assert sampler.filter(next_window) and next_window.suppressed == 3
+
+
+def test_json_lines_carry_the_request_id_and_extra_fields():
+    record = make_record()
+    record.request_id = "abc"
+    record.status = 404
+
+    entry = json.loads(JsonFormatter().format(record))
+
+    assert entry["message"] == "failed x"
+    assert entry["request_id"] == "abc"
+    assert entry["status"] == 404
+
+
+def test_full_queue_drops_records_instead_of_blocking():
+    handler, _ = create_log_pipeline(io.StringIO(), queue_size=1)
+    before = REGISTRY.get_sample_value("image_service_log_records_dropped_total")
+
+    for line in range(3):
+        handler.handle(make_record(level=logging.INFO, line=line))
+
+    dropped = REGISTRY.get_sample_value("image_service_log_records_dropped_total")
+    assert dropped == before + 2
+
+
+def test_pipeline_writes_lines_on_the_listener_thread():
+    stream = io.StringIO()
+    handler, listener = create_log_pipeline(stream)
+    listener.start()
+    token = request_id.set("req-1")
+    try:
+        handler.handle(make_record())
+    finally:
+        request_id.reset(token)
+        listener.stop()
+
+    assert json.loads(stream.getvalue())["request_id"] == "req-1"
+
+
+def test_requests_get_an_id_and_keep_the_one_from_the_proxy():
+    app = FastAPI()
+    seen = []
+
+    @app.get("/ping")
+    async def ping():
+        seen.append(request_id.get())
+        return {}
+
+    app.add_middleware(RequestIdMiddleware, access_log=False)
+    client = TestClient(app)
+
+    generated = client.get("/ping")
+    forwarded = client.get("/ping", headers={"X-Request-ID": "edge-42"})
+    invalid = client.get("/ping", headers={"X-Request-ID": "bad id\t"})
+
+    assert generated.headers["x-request-id"] == seen[0] and len(seen[0]) == 32
+    assert forwarded.headers["x-request-id"] == seen[1] == "edge-42"
+    assert invalid.headers["x-request-id"] != "bad id\t"
@@ -0,0 +1,94 @@
+from unittest.mock import AsyncMock
+
+import pytest
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+
+from ..core.metrics import instrumented, timed
+from ..main import app
+from ..repository.image_repository import ImageRepository
+from ..services.job_queue import get_job_queue
+
+
+def sample(name: str, **labels) -> float:
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+@pytest.fixture
+def client():
+    repository = AsyncMock()
+    repository.get.return_value = {
+        "_id": "68909019c7ce69410acefca8",
+        "user_id": "a1b2c3d4-e5f6-5895-1234-567890abcdef",
+        "filename": "image.png",
+        "object_name": "add09d36-9d1f-4c1d-b177-e1dd6baf76f9.png",
+        "url": "http://127.0.0.1:9000/images/add09d36-9d1f-4c1d-b177-e1dd6baf76f9.png",
+        "uploaded_at": "2025-08-04T07:48:57.419399",
+    }
+    app.dependency_overrides[ImageRepository] = lambda: repository
+    app.dependency_overrides[get_job_queue] = lambda: AsyncMock()
+    yield TestClient(app)
+    app.dependency_overrides = {}
+
+
+def test_requests_are_recorded_by_route_template(client):
+    labels = {"method": "GET", "route": "/image/{image_id}", "status": "200"}
+    before = sample("http_request_duration_seconds_count", **labels)
+    sent_before = sample("http_response_body_bytes_total", route="/image/{image_id}")
+
+    response = client.get(
+        "/image/68909019c7ce69410acefca8", headers={"Authorization": "Bearer t"}
+    )
+
+    assert response.status_code == 200
+    assert sample("http_request_duration_seconds_count", **labels) == before + 1
+    assert sample(
+        "http_response_body_bytes_total", route="/image/{image_id}"
+    ) == sent_before + len(response.content)
+
+
+def test_metrics_endpoint_exposes_the_registry(client):
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert "image_service_operation_duration_seconds" in response.text
+    assert "http_request_duration_seconds_bucket" in response.text
+
+
+def test_timed_counts_errors():
+    labels = {"component": "test", "operation": "fail"}
+    before = sample("image_service_operation_errors_total", **labels)
+
+    with pytest.raises(ValueError), timed("test", "fail"):
+        raise ValueError()
+
+    assert sample("image_service_operation_errors_total", **labels) == before + 1
+    assert sample("image_service_operation_duration_seconds_count", **labels) >= 1
+
+
+@pytest.mark.asyncio
+async def test_instrumented_times_public_coroutine_methods():
+    @instrumented("test")
+    class Repository:
+        async def find(self):
+            return "found"
+
+        async def _private(self):
+            return "private"
+
+    labels = {"component": "test", "operation": "find"}
+    before = sample("image_service_operation_duration_seconds_count", **labels)
+
+    assert await Repository().find() == "found"
+    assert await Repository()._private() == "private"
+    assert sample("image_service_operation_duration_seconds_count", **labels) == (
+        before + 1
+    )
+    assert (
+        sample(
+            "image_service_operation_duration_seconds_count",
+            component="test",
+            operation="_private",
+        )
+        == 0
+    )
@@ -0,0 +1,52 @@
+import threading
+from unittest.mock import MagicMock
+
+import pytest
+from minio.error import S3Error
+
+from ..core.exceptions import ObjectStoreException
+from ..core.object_store import AsyncObjectStore
+
+
+@pytest.mark.asyncio
+async def test_put_object_runs_off_the_event_loop_thread():
+    loop_thread = threading.get_ident()
+    calls = []
+
+    client = MagicMock()
+    client.put_object.side_effect = lambda **kwargs: calls.append(threading.get_ident())
+    store = AsyncObjectStore(client, max_concurrency=2)
+
+    await store.put_object(
+        bucket_name="images", object_name="a.png", data=b"", length=0
+    )
+
+    assert calls and calls[0] != loop_thread
+    store.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_storage_errors_are_raised_with_their_code():
+    client = MagicMock()
+    client.remove_object.side_effect = S3Error(
+        None, "NoSuchKey", "missing", "a.png", "req", "host"
+    )
+    store = AsyncObjectStore(client)
+
+    with pytest.raises(ObjectStoreException) as raised:
+        await store.remove_object(bucket_name="images", object_name="a.png")
+    assert raised.value.code == "NoSuchKey"
+    store.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_list_objects_yields_pages():
+    client = MagicMock()
+    client.list_objects.return_value = iter(range(5))
+    store = AsyncObjectStore(client)
+
+    pages = [page async for page in store.list_objects("images", page_size=2)]
+
+    assert pages == [[0, 1], [2, 3], [4]]
+    client.list_objects.assert_called_once_with("images", prefix=None, recursive=True)
+    store.shutdown()
@@ -0,0 +1,99 @@
+from datetime import UTC, datetime, timedelta
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+import pytest
+
+from ..services.reconciler import Reconciler
+
+OLD = datetime.now(UTC) - timedelta(days=2)
+NEW = datetime.now(UTC)
+
+
+def make_object(name: str, last_modified: datetime = OLD) -> SimpleNamespace:
+    return SimpleNamespace(object_name=name, last_modified=last_modified)
+
+
+def pages(*items):
+    async def iterate(*args, **kwargs):
+        for page in items:
+            yield page
+
+    return iterate
+
+
+def make_repository(objects: list, referenced: set[str]) -> AsyncMock:
+    repository = AsyncMock()
+    repository.iter_object_pages = pages(objects)
+    repository.iter_image_pages = pages()
+    repository.find_referenced_objects.side_effect = lambda names: (
+        referenced & set(names)
+    )
+    repository.stat_object.side_effect = lambda name: make_object(name)
+    return repository
+
+
+@pytest.mark.asyncio
+async def test_reports_unreferenced_objects_past_the_grace_period():
+    repository = make_repository(
+        [make_object("a.png"), make_object("orphan.png"), make_object("new.png", NEW)],
+        referenced={"a.png"},
+    )
+
+    report = await Reconciler(repository, grace_period=3600).run()
+
+    assert report.objects_scanned == 3
+    assert report.orphan_objects == 1
+    assert report.removed_objects == 0
+    # Recent objects may belong to an upload in progress and are not looked up
+    repository.find_referenced_objects.assert_awaited_once_with(["a.png", "orphan.png"])
+    repository.remove_objects.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_remove_skips_objects_referenced_since_the_listing():
+    referenced = {"a.png"}
+    repository = make_repository(
+        [make_object("a.png"), make_object("b.png"), make_object("c.png")],
+        referenced,
+    )
+
+    def reference_b(names):
+        found = referenced & set(names)
+        # A duplicate upload references b.png between listing and removal
+        referenced.add("b.png")
+        return found
+
+    repository.find_referenced_objects.side_effect = reference_b
+
+    report = await Reconciler(repository, grace_period=3600, remove=True).run()
+
+    assert report.orphan_objects == 2
+    assert report.removed_objects == 1
+    repository.remove_objects.assert_awaited_once_with(["c.png"])
+
+
+@pytest.mark.asyncio
+async def test_reports_images_whose_object_is_missing():
+    repository = make_repository([], referenced=set())
+    repository.iter_image_pages = pages(
+        [
+            {
+                "_id": 1,
+                "object_name": "a.png",
+                "renditions": [{"object_name": "a.thumb.jpg"}],
+            },
+            {"_id": 2, "object_name": "a.png"},
+            {"_id": 3, "object_name": "gone.png"},
+        ]
+    )
+    repository.stat_object.side_effect = lambda name: (
+        None if name in {"a.thumb.jpg", "gone.png"} else make_object(name)
+    )
+
+    report = await Reconciler(repository, grace_period=3600).run()
+
+    assert report.images_scanned == 3
+    assert report.missing_objects == 2
+    # Objects shared by deduplicated images are checked once
+    assert repository.stat_object.await_count == 3
@@ -0,0 +1,44 @@
+import io
+
+import pytest
+from PIL import Image
+
+from ..services.renditions import parse_rendition_specs, render
+
+
+def make_image(width: int, height: int, image_format: str = "PNG") -> bytes:
+    output = io.BytesIO()
+    Image.new("RGBA", (width, height), (200, 30, 30, 255)).save(
+        output, format=image_format
+    )
+    return output.getvalue()
+
+
+def test_parse_rendition_specs():
+    specs = parse_rendition_specs("thumb:200, card_webp:800:webp")
+
+    assert [(spec.name, spec.width, spec.format) for spec in specs] == [
+        ("thumb", 200, "jpeg"),
+        ("card_webp", 800, "webp"),
+    ]
+    assert specs[0].object_name_for("abc.png") == "abc.thumb.jpg"
+    assert specs[1].content_type == "image/webp"
+
+
+def test_parse_rendition_specs_rejects_unknown_format():
+    with pytest.raises(ValueError):
+        parse_rendition_specs("thumb:200:bmp")
+
+
+def test_render_downscales_keeping_aspect_ratio():
+    rendered = render(make_image(1000, 500), 200, "webp")
+
+    assert (rendered.width, rendered.height) == (200, 100)
+    with Image.open(io.BytesIO(rendered.content)) as image:
+        assert image.format == "WEBP"
+
+
+def test_render_does_not_upscale():
+    rendered = render(make_image(100, 50), 200, "jpeg")
+
+    assert (rendered.width, rendered.height) == (100, 50)
@@ -0,0 +1,52 @@
+import uuid
+from datetime import datetime
+
+from bson import ObjectId
+
+from ..main import app
+from ..repository.mongo.image import ImageModel
+from ..utilities.serialization import image_view, json_response
+
+
+def test_direct_encoding_matches_the_response_model():
+    document = {
+        "_id": ObjectId(),
+        "user_id": uuid.uuid4(),
+        "filename": "image.png",
+        "object_name": "a.png",
+        "url": "http://127.0.0.1:9000/images/a.png",
+        "content_type": "image/png",
+        "size": 178398,
+        "uploaded_at": datetime(2025, 8, 4, 7, 48, 57, 419000),
+        "renditions": [
+            {
+                "name": "thumb",
+                "object_name": "a.thumb.png",
+                "url": "http://127.0.0.1:9000/images/a.thumb.png",
+                "content_type": "image/png",
+                "width": 200,
+                "height": 150,
+                "size": 8042,
+                # Extra stored keys are not part of the response
+                "generated_at": datetime(2025, 8, 4),
+            }
+        ],
+    }
+
+    expected = ImageModel.model_validate(document).model_dump_json()
+    body = json_response(image_view(document)).body
+
+    assert body == expected.encode()
+
+
+def test_openapi_schema_still_describes_the_responses():
+    schema = app.openapi()["paths"]
+
+    batch = schema["/image/batch"]["post"]["responses"]["200"]
+    assert batch["content"]["application/json"]["schema"] == {
+        "$ref": "#/components/schemas/ImageBatch"
+    }
+    image = schema["/image/{image_id}"]["get"]["responses"]["200"]
+    assert image["content"]["application/json"]["schema"] == {
+        "$ref": "#/components/schemas/ImageModel"
+    }
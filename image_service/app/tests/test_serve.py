@@ -0,0 +1,52 @@
+import argparse
+
+from ..core import config
+from ..core.metrics import MULTIPROCESS_DIR_ENV
+from ..serve import prepare_metrics_dir, server_options
+
+
+def test_single_worker_keeps_metrics_in_process(monkeypatch):
+    monkeypatch.delenv(MULTIPROCESS_DIR_ENV, raising=False)
+
+    assert prepare_metrics_dir(1) is None
+
+
+def test_metrics_dir_is_emptied_before_the_workers_start(monkeypatch, tmp_path):
+    monkeypatch.setenv(MULTIPROCESS_DIR_ENV, str(tmp_path))
+    (tmp_path / "counter_123.db").write_bytes(b"stale")
+
+    assert prepare_metrics_dir(4) == str(tmp_path)
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_server_options_tune_keep_alive_and_graceful_shutdown():
+    args = argparse.Namespace(host="127.0.0.1", port=8000, workers=4)
+
+    options = server_options(args)
+
+    assert options["workers"] == 4
+    assert options["loop"] == "auto" and options["http"] == "auto"
+    assert options["timeout_keep_alive"] == config.SERVER_KEEPALIVE_TIMEOUT
+    assert options["timeout_graceful_shutdown"] == config.SERVER_GRACEFUL_TIMEOUT
+
+
+def test_forked_worker_forgets_the_parent_clients(monkeypatch):
+    monkeypatch.setattr(config, "_mongodb_client", object())
+    monkeypatch.setattr(config, "_minio_client", object())
+
+    config._forget_clients()
+
+    assert config._mongodb_client is None and config._minio_client is None
+
+
+def test_available_cpus_honour_the_cgroup_quota(monkeypatch, tmp_path):
+    monkeypatch.setattr(config.os, "sched_getaffinity", lambda pid: set(range(16)))
+
+    (tmp_path / "cpu.max").write_text("150000 100000\n")
+    assert config.available_cpus(str(tmp_path)) == 2
+
+    (tmp_path / "cpu.max").write_text("max 100000\n")
+    assert config.available_cpus(str(tmp_path)) == 16
+
+    (tmp_path / "cpu.max").unlink()
+    assert config.available_cpus(str(tmp_path)) == 16
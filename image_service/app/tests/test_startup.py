@@ -0,0 +1,57 @@
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from fastapi.testclient import TestClient
+
+from .. import main
+from ..core.config import create_minio_bucket
+from ..core.exceptions import BucketCreationException
+
+
+@pytest.mark.asyncio
+async def test_create_minio_bucket_retries_until_minio_is_up():
+    store = AsyncMock()
+    store.bucket_exists.side_effect = [ConnectionError(), ConnectionError(), False]
+
+    await create_minio_bucket(store, attempts=3, backoff=0)
+
+    assert store.bucket_exists.await_count == 3
+    store.make_bucket.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_create_minio_bucket_gives_up_after_the_last_attempt():
+    store = AsyncMock()
+    store.bucket_exists.side_effect = ConnectionError()
+
+    with pytest.raises(BucketCreationException):
+        await create_minio_bucket(store, attempts=2, backoff=0)
+
+    assert store.bucket_exists.await_count == 2
+
+
+def test_lifespan_checks_dependencies_and_closes_clients(monkeypatch):
+    create_bucket = AsyncMock()
+    ensure_indexes = AsyncMock()
+    close_clients = AsyncMock()
+    job_queue = MagicMock(start=AsyncMock())
+    shutdown_job_queue = AsyncMock()
+    monkeypatch.setattr(main, "get_object_store", MagicMock())
+    monkeypatch.setattr(main, "get_image_collection", MagicMock())
+    monkeypatch.setattr(main, "get_blob_collection", MagicMock())
+    monkeypatch.setattr(main, "get_pending_upload_collection", MagicMock())
+    monkeypatch.setattr(main, "get_job_collection", MagicMock())
+    monkeypatch.setattr(main, "get_job_queue", lambda: job_queue)
+    monkeypatch.setattr(main, "shutdown_job_queue", shutdown_job_queue)
+    monkeypatch.setattr(main, "create_minio_bucket", create_bucket)
+    monkeypatch.setattr(main, "ensure_indexes", ensure_indexes)
+    monkeypatch.setattr(main, "close_clients", close_clients)
+
+    with TestClient(main.app):
+        create_bucket.assert_awaited_once()
+        ensure_indexes.assert_awaited_once()
+        job_queue.start.assert_awaited_once()
+        close_clients.assert_not_awaited()
+
+    shutdown_job_queue.assert_awaited_once()
+    close_clients.assert_awaited_once()
@@ -1,9 +1,122 @@
+import hashlib
 import os
-from fastapi import HTTPException, status, Header
-from jose import jwt, JWTError
+import time
+from collections import OrderedDict
+from collections.abc import Callable
+
+from fastapi import Header, HTTPException, status
+from jose import JWTError, jwt
 
 SECRET_KEY = os.getenv("JWT_SECRET")
 ALGORITHM = "HS256"
+JWT_CACHE_SIZE = int(os.getenv("JWT_CACHE_SIZE", "10000"))
+# Upper bound for tokens without exp, and for how long a revoked secret is still honoured
+JWT_CACHE_MAX_TTL = float(os.getenv("JWT_CACHE_MAX_TTL", "300"))
+
+
+class VerifiedTokenCache:
+    """
+    LRU of tokens that passed verification, mapped to their `sub`. Entries are
+    keyed by the SHA-256 of the token, so raw credentials are not kept in
+    memory, and expire with the token's `exp` claim (at most `max_ttl` seconds).
+    """
+
+    def __init__(
+        self,
+        max_size: int,
+        max_ttl: float,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.max_size = max_size
+        self.max_ttl = max_ttl
+        self._clock = clock
+        self._entries: OrderedDict[bytes, tuple[float, str]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _key(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token: str) -> str | None:
+        key = self._key(token)
+        entry = self._entries.get(key)
+        if entry is None or entry[0] <= self._clock():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, token: str, user_id: str, expires_at: float | None):
+        if self.max_size <= 0:
+            return
+
+        valid_until = self._clock() + self.max_ttl
+        if expires_at is not None:
+            valid_until = min(valid_until, expires_at)
+
+        key = self._key(token)
+        self._entries[key] = (valid_until, user_id)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "size": len(self._entries),
+        }
+
+
+token_cache = VerifiedTokenCache(JWT_CACHE_SIZE, JWT_CACHE_MAX_TTL)
+
+
+def get_token_cache():
+    return token_cache
+
+
+def _verify(token: str) -> str | None:
+    """The `sub` of a valid token, or None."""
+
+    # Frontends send the same token on consecutive calls, skip the HMAC check
+    cached_user_id = token_cache.get(token)
+    if cached_user_id is not None:
+        return cached_user_id
+
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return None
+    user_id: str | None = payload.get("sub")
+    if user_id is None:
+        return None
+
+    expires_at = payload.get("exp")
+    token_cache.put(
+        token, user_id, float(expires_at) if expires_at is not None else None
+    )
+    return user_id
+
+
+def user_id_from_authorization(authorization: str | None) -> str | None:
+    """
+    The user of a bearer authorization header, or None when it is missing or
+    invalid. For middleware running before the route, which leaves rejecting
+    the request to `get_current_user_id`.
+    """
+
+    token_prefix, _, token = (authorization or "").partition(" ")
+    if token_prefix.lower() != "bearer" or not token:
+        return None
+    return _verify(token)
 
 
 async def get_current_user_id(authorization: str = Header(...)) -> str:
@@ -15,18 +128,11 @@ async def get_current_user_id(authorization: str = Header(...)) -> str:
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
-
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id: str | None = payload.get("sub")
-        if user_id is None:
-            raise credentials_exception
-        return user_id
-
-    except JWTError:
-        raise credentials_exception
+    user_id = _verify(token)
+    if user_id is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return user_id
@@ -0,0 +1,46 @@
+from fastapi import HTTPException
+
+
+def parse_range_header(range_header: str | None, size: int) -> tuple[int, int] | None:
+    """
+    Parses a single `bytes=` range into an inclusive (start, end) pair.
+
+    Returns None when the full body should be served instead: no header,
+    another unit, a malformed value or several ranges (all allowed by RFC 9110).
+    Raises 416 when the range does not overlap the object.
+    """
+
+    if not range_header:
+        return None
+
+    unit, _, ranges = range_header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in ranges:
+        return None
+
+    first, dash, last = ranges.strip().partition("-")
+    if not dash or not (first.isdigit() or last.isdigit()):
+        return None
+    if first and last and not (first.isdigit() and last.isdigit()):
+        return None
+
+    not_satisfiable = HTTPException(
+        status_code=416,
+        detail="Requested range not satisfiable",
+        headers={"Content-Range": f"bytes */{size}"},
+    )
+
+    if not first:
+        # Suffix range: the last N bytes
+        suffix = int(last)
+        if suffix == 0 or size == 0:
+            raise not_satisfiable
+        return max(size - suffix, 0), size - 1
+
+    start = int(first)
+    end = int(last) if last else size - 1
+    if start >= size:
+        raise not_satisfiable
+    if end < start:
+        return None
+
+    return start, min(end, size - 1)
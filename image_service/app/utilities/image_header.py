@@ -0,0 +1,157 @@
+"""
+Image type and dimensions from the first bytes of a file, without decoding it.
+
+Only the signature and the header fields holding the size are read: a fixed
+32-byte prefix for PNG, GIF and WebP, and the segment markers up to the frame
+header for JPEG, seeking over the segment bodies. The cost does not depend on
+the size of the file.
+"""
+
+import io
+import struct
+from dataclasses import dataclass
+from typing import BinaryIO
+
+_PREFIX_SIZE = 32
+
+# JPEG start-of-frame markers carry the dimensions. C4, C8 and CC share the
+# range but are the DHT, JPG and DAC segments.
+_JPEG_SOF_MARKERS = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+# Markers without a length field
+_JPEG_STANDALONE_MARKERS = {0x01, *range(0xD0, 0xD8)}
+_JPEG_START_OF_SCAN = 0xDA
+_JPEG_END_OF_IMAGE = 0xD9
+# Real files have a handful of segments before the frame header
+_JPEG_MAX_SEGMENTS = 256
+
+
+SUPPORTED_CONTENT_TYPES = frozenset(
+    {"image/jpeg", "image/png", "image/gif", "image/webp"}
+)
+
+
+@dataclass(frozen=True)
+class ImageHeader:
+    format: str
+    content_type: str
+    width: int
+    height: int
+
+    @property
+    def pixels(self) -> int:
+        return self.width * self.height
+
+
+def sniff_image_type(prefix: bytes) -> str | None:
+    """Returns the content type matching the file signature, if supported."""
+
+    if prefix.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if prefix.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if prefix[:6] in (b"GIF87a", b"GIF89a"):
+        return "image/gif"
+    if prefix[:4] == b"RIFF" and prefix[8:12] == b"WEBP":
+        return "image/webp"
+    return None
+
+
+def read_image_header(stream: BinaryIO) -> ImageHeader:
+    """
+    Reads the type and dimensions of the image at the start of `stream`, which
+    must be seekable, and rewinds it. Raises ValueError for anything that is
+    not a well-formed JPEG, PNG, GIF or WebP header.
+    """
+
+    stream.seek(0)
+    try:
+        prefix = stream.read(_PREFIX_SIZE)
+        content_type = sniff_image_type(prefix)
+
+        if content_type == "image/png":
+            if prefix[12:16] != b"IHDR":
+                raise ValueError("PNG without an IHDR chunk")
+            width, height = struct.unpack(">II", _exactly(prefix, 16, 8))
+            return _header("png", content_type, width, height)
+
+        if content_type == "image/gif":
+            width, height = struct.unpack("<HH", _exactly(prefix, 6, 4))
+            return _header("gif", content_type, width, height)
+
+        if content_type == "image/webp":
+            width, height = _webp_size(prefix)
+            return _header("webp", content_type, width, height)
+
+        if content_type == "image/jpeg":
+            width, height = _jpeg_size(stream)
+            return _header("jpeg", content_type, width, height)
+
+        raise ValueError("Not a JPEG, PNG, GIF or WebP image")
+
+    finally:
+        stream.seek(0)
+
+
+def _header(image_format: str, content_type: str, width: int, height: int):
+    if not width or not height:
+        raise ValueError(f"{image_format} header with an empty size")
+    return ImageHeader(image_format, content_type, width, height)
+
+
+def _exactly(data: bytes, offset: int, size: int) -> bytes:
+    chunk = data[offset : offset + size]
+    if len(chunk) != size:
+        raise ValueError("Truncated image header")
+    return chunk
+
+
+def _webp_size(prefix: bytes) -> tuple[int, int]:
+    chunk = prefix[12:16]
+    if chunk == b"VP8 ":
+        # Lossy: a 3-byte frame tag, the start code, then 14-bit sizes
+        if _exactly(prefix, 23, 3) != b"\x9d\x01\x2a":
+            raise ValueError("WebP VP8 frame without a start code")
+        width, height = struct.unpack("<HH", _exactly(prefix, 26, 4))
+        return width & 0x3FFF, height & 0x3FFF
+    if chunk == b"VP8L":
+        # Lossless: a signature byte, then 14-bit sizes minus one, packed
+        if _exactly(prefix, 20, 1) != b"\x2f":
+            raise ValueError("WebP VP8L frame without a signature")
+        bits = int.from_bytes(_exactly(prefix, 21, 4), "little")
+        return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+    if chunk == b"VP8X":
+        # Extended: 24-bit canvas sizes minus one
+        width = int.from_bytes(_exactly(prefix, 24, 3), "little") + 1
+        height = int.from_bytes(_exactly(prefix, 27, 3), "little") + 1
+        return width, height
+    raise ValueError("Unknown WebP chunk")
+
+
+def _jpeg_size(stream: BinaryIO) -> tuple[int, int]:
+    stream.seek(2)
+    for _ in range(_JPEG_MAX_SEGMENTS):
+        if stream.read(1) != b"\xff":
+            raise ValueError("JPEG segment without a marker")
+        marker = stream.read(1)
+        # Markers may be preceded by any number of fill bytes
+        while marker == b"\xff":
+            marker = stream.read(1)
+        if not marker:
+            raise ValueError("Truncated image header")
+
+        code = marker[0]
+        if code in _JPEG_STANDALONE_MARKERS:
+            continue
+        if code in (_JPEG_START_OF_SCAN, _JPEG_END_OF_IMAGE):
+            raise ValueError("JPEG without a frame header")
+
+        (length,) = struct.unpack(">H", _exactly(stream.read(2), 0, 2))
+        if length < 2:
+            raise ValueError("JPEG segment with an invalid length")
+        if code in _JPEG_SOF_MARKERS:
+            # Precision, then height and width
+            height, width = struct.unpack(">xHH", _exactly(stream.read(5), 0, 5))
+            return width, height
+        stream.seek(length - 2, io.SEEK_CUR)
+
+    raise ValueError("JPEG frame header not found")
@@ -0,0 +1,30 @@
+import base64
+from datetime import datetime
+
+from bson import ObjectId
+
+
+def encode_cursor(uploaded_at: datetime, image_id: ObjectId) -> str:
+    """
+    Encodes the sort key of the last image of a page as an opaque token. The
+    next page starts right after it.
+    """
+
+    raw = f"{uploaded_at.isoformat()}|{image_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, ObjectId]:
+    """
+    Returns the (uploaded_at, _id) pair of a cursor. Raises ValueError when it
+    was not produced by `encode_cursor`.
+    """
+
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        uploaded_at, image_id = raw.split("|")
+        return datetime.fromisoformat(uploaded_at), ObjectId(image_id)
+
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
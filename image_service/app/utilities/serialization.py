@@ -0,0 +1,52 @@
+"""
+JSON responses encoded straight from MongoDB documents.
+
+Image documents were validated by ImageModel when they were written, so
+validating them again on every read only costs CPU. `image_view` maps a stored
+document to the fields ImageModel outputs, with the same names, order and
+defaults, and `json_response` encodes the result with orjson in one call.
+Endpoints keep their `response_model`, which still describes the response in
+the OpenAPI schema; FastAPI neither validates nor re-encodes a Response
+returned as is.
+"""
+
+from typing import Any
+
+import orjson
+from bson import ObjectId
+from fastapi.responses import Response
+
+from ..repository.mongo.image import ImageModel, RenditionModel
+
+_IMAGE_FIELDS = tuple(
+    name for name in ImageModel.model_fields if name not in ("id", "renditions")
+)
+_RENDITION_FIELDS = tuple(RenditionModel.model_fields)
+
+
+def _default(value: Any) -> str:
+    # datetime and UUID are encoded by orjson itself
+    if isinstance(value, ObjectId):
+        return str(value)
+    raise TypeError(f"Cannot encode {type(value).__name__} as JSON")
+
+
+def image_view(document: dict) -> dict:
+    """The ImageModel output of a stored image document, without validating it."""
+
+    view = {"id": str(document["_id"])}
+    for name in _IMAGE_FIELDS:
+        view[name] = document.get(name)
+    view["renditions"] = [
+        {name: rendition.get(name) for name in _RENDITION_FIELDS}
+        for rendition in document.get("renditions", ())
+    ]
+    return view
+
+
+def json_response(content: Any, status_code: int = 200) -> Response:
+    return Response(
+        orjson.dumps(content, default=_default),
+        status_code=status_code,
+        media_type="application/json",
+    )
@@ -0,0 +1,314 @@
+"""
+In-memory stand-ins for MinIO and MongoDB used by the benchmark scripts.
+
+The MinIO fake keeps the blocking, synchronous interface of `minio.Minio` and
+can simulate network latency with `time.sleep`, which is exactly what makes a
+blocking client dangerous on the event loop.
+"""
+
+import os
+import time
+from copy import deepcopy
+from datetime import UTC, datetime
+from types import SimpleNamespace
+
+from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+# The app modules read their configuration at import time
+os.environ.setdefault("MINIO_ENDPOINT", "127.0.0.1:9000")
+os.environ.setdefault("MINIO_ROOT_USER", "benchmark")
+os.environ.setdefault("MINIO_ROOT_PASSWORD", "benchmark")
+os.environ.setdefault("MINIO_BUCKET", "images")
+os.environ.setdefault("MINIO_HOST", "127.0.0.1:9000")
+os.environ.setdefault("MONGO_HOST", "127.0.0.1")
+os.environ.setdefault("MONGO_PORT", "27017")
+os.environ.setdefault("MONGO_INITDB_ROOT_USERNAME", "benchmark")
+os.environ.setdefault("MONGO_INITDB_ROOT_PASSWORD", "benchmark")
+os.environ.setdefault("JWT_SECRET", "benchmark")
+# Rendition generation is measured on its own by bench_renditions
+os.environ.setdefault("IMAGE_RENDITIONS", "")
+
+
+class FakeMinio:
+    """
+    Blocking MinIO double. Uploads are read through like the real client, but
+    only object sizes are kept, so stored bytes do not count in the memory
+    the benchmarks report.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.objects: dict[tuple[str, str], int] = {}
+
+    def put_object(self, bucket_name, object_name, data, length, **kwargs):
+        time.sleep(self.latency)
+        size = 0
+        while chunk := data.read(64 * 1024):
+            size += len(chunk)
+        self.objects[(bucket_name, object_name)] = size
+
+    def remove_object(self, bucket_name, object_name, **kwargs):
+        time.sleep(self.latency)
+        self.objects.pop((bucket_name, object_name), None)
+
+    def stat_object(self, bucket_name, object_name, **kwargs):
+        time.sleep(self.latency)
+        return SimpleNamespace(
+            object_name=object_name,
+            size=self.objects[(bucket_name, object_name)],
+            etag=object_name,
+            content_type="image/png",
+            last_modified=_LAST_MODIFIED,
+        )
+
+    def get_object(self, bucket_name, object_name, offset=0, length=0, **kwargs):
+        time.sleep(self.latency)
+        size = self.objects[(bucket_name, object_name)]
+        return _FakeBody(length or size - offset)
+
+    def bucket_exists(self, bucket_name):
+        time.sleep(self.latency)
+        return True
+
+    def make_bucket(self, bucket_name):
+        return None
+
+
+_LAST_MODIFIED = datetime(2025, 1, 1, tzinfo=UTC)
+
+
+class _FakeBody:
+    """Body of a GET, read into new bytes objects like the HTTP response."""
+
+    def __init__(self, remaining: int):
+        self.remaining = remaining
+
+    def read(self, size: int) -> bytes:
+        size = min(size, self.remaining)
+        self.remaining -= size
+        return bytes(size)
+
+    def close(self):
+        pass
+
+    def release_conn(self):
+        pass
+
+
+class _InsertOneResult:
+    def __init__(self, inserted_id):
+        self.inserted_id = inserted_id
+
+
+class _DeleteResult:
+    def __init__(self, deleted_count):
+        self.deleted_count = deleted_count
+
+
+class _FakeCursor:
+    def __init__(self, documents: list[dict]):
+        self.documents = documents
+
+    def sort(self, keys, direction=None):
+        if isinstance(keys, str):
+            keys = [(keys, direction or 1)]
+        for key, order in reversed(keys):
+            self.documents.sort(
+                key=lambda document: document.get(key), reverse=order < 0
+            )
+        return self
+
+    def limit(self, count: int):
+        self.documents = self.documents[:count] if count else self.documents
+        return self
+
+    async def to_list(self, length: int | None = None):
+        return self.documents[:length] if length else self.documents
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for document in self.documents:
+            yield document
+
+
+class FakeCollection:
+    """
+    Tiny async subset of `AsyncCollection`, keyed by _id. Filters take
+    equality, $in, $exists, $gt and $lt conditions and a top-level $or.
+    Equality and $in filters on _id and on the `indexed` fields are hash
+    lookups, so the fake does not dominate the timings as the collection grows.
+    """
+
+    def __init__(self, indexed: tuple[str, ...] = ("url",)):
+        self.documents: dict = {}
+        self.indexes: dict[str, dict] = {field: {} for field in indexed}
+
+    @staticmethod
+    def _matches(value, condition) -> bool:
+        if isinstance(condition, dict) and "$in" in condition:
+            return value in condition["$in"]
+        if isinstance(condition, dict) and "$exists" in condition:
+            return (value is not None) == condition["$exists"]
+        if isinstance(condition, dict) and "$gt" in condition:
+            return value is not None and value > condition["$gt"]
+        if isinstance(condition, dict) and "$lt" in condition:
+            return value is not None and value < condition["$lt"]
+        return value == condition
+
+    def _match(self, document: dict, query: dict) -> bool:
+        return all(
+            any(self._match(document, branch) for branch in condition)
+            if key == "$or"
+            else self._matches(document.get(key), condition)
+            for key, condition in query.items()
+        )
+
+    def _candidates(self, query: dict) -> list[dict]:
+        for field in ("_id", *self.indexes):
+            if field not in query:
+                continue
+            condition = query[field]
+            values = condition["$in"] if isinstance(condition, dict) else [condition]
+            if field == "_id":
+                ids = values
+            else:
+                ids = [
+                    i for value in values for i in self.indexes[field].get(value, ())
+                ]
+            found = (self.documents.get(i) for i in dict.fromkeys(ids))
+            return [document for document in found if document is not None]
+        return list(self.documents.values())
+
+    def _find(self, query: dict) -> list[dict]:
+        return [
+            document
+            for document in self._candidates(query)
+            if self._match(document, query)
+        ]
+
+    def _index(self, document: dict):
+        for field, index in self.indexes.items():
+            index.setdefault(document.get(field), set()).add(document["_id"])
+
+    def _unindex(self, document: dict):
+        for field, index in self.indexes.items():
+            index.get(document.get(field), set()).discard(document["_id"])
+
+    def _apply(self, document: dict, update: dict):
+        self._unindex(document)
+        document.update(update.get("$set", {}))
+        for key, amount in update.get("$inc", {}).items():
+            document[key] = document.get(key, 0) + amount
+        for key, value in update.get("$push", {}).items():
+            document.setdefault(key, []).append(deepcopy(value))
+        for key in update.get("$unset", {}):
+            document.pop(key, None)
+        self._index(document)
+
+    def _delete(self, document: dict):
+        self._unindex(document)
+        del self.documents[document["_id"]]
+
+    async def insert_one(self, document: dict):
+        document.setdefault("_id", ObjectId())
+        if document["_id"] in self.documents:
+            raise DuplicateKeyError("duplicate _id")
+        stored = deepcopy(document)
+        self.documents[stored["_id"]] = stored
+        self._index(stored)
+        return _InsertOneResult(document["_id"])
+
+    async def insert_many(self, documents: list[dict], ordered: bool = True):
+        for document in documents:
+            await self.insert_one(document)
+
+    async def find_one(self, query: dict, *args, **kwargs):
+        for document in self._find(query):
+            return deepcopy(document)
+        return None
+
+    def find(self, query: dict, projection=None, **kwargs) -> _FakeCursor:
+        return _FakeCursor([deepcopy(document) for document in self._find(query)])
+
+    async def distinct(self, field: str, query: dict) -> list:
+        return list(
+            dict.fromkeys(document.get(field) for document in self._find(query))
+        )
+
+    async def find_one_and_update(
+        self, query: dict, update: dict, return_document=ReturnDocument.BEFORE, **kwargs
+    ):
+        for document in self._find(query):
+            before = deepcopy(document)
+            self._apply(document, update)
+            if return_document == ReturnDocument.BEFORE:
+                return before
+            return deepcopy(document)
+        return None
+
+    async def find_one_and_delete(self, query: dict, **kwargs):
+        for document in self._find(query):
+            self._delete(document)
+            return document
+        return None
+
+    async def update_one(self, query: dict, update: dict, **kwargs):
+        for document in self._find(query):
+            self._apply(document, update)
+            return
+
+    async def update_many(self, query: dict, update: dict, **kwargs):
+        for document in self._find(query):
+            self._apply(document, update)
+
+    async def delete_one(self, query: dict):
+        for document in self._find(query):
+            self._delete(document)
+            return _DeleteResult(1)
+        return _DeleteResult(0)
+
+    async def create_indexes(self, indexes: list):
+        return [index.document["name"] for index in indexes]
+
+
+class FakeJobQueue:
+    """Records enqueued jobs without running them, like a queue with no workers."""
+
+    def __init__(self):
+        self.jobs: dict[str, tuple[str, dict]] = {}
+
+    async def enqueue(
+        self, kind: str, payload: dict, key: str, run_at: datetime | None = None
+    ) -> bool:
+        if key in self.jobs:
+            return False
+        self.jobs[key] = (kind, payload)
+        return True
+
+
+class FakeMongoClient:
+    """Stands in for `AsyncMongoClient`, handing out one FakeCollection per name."""
+
+    def __init__(self):
+        self.collections: dict[str, FakeCollection] = {}
+
+    def get_database(self, name: str, **kwargs):
+        return self
+
+    def get_collection(self, name: str, **kwargs) -> FakeCollection:
+        return self.collections.setdefault(name, FakeCollection())
+
+    async def close(self):
+        self.collections.clear()
+
+
+def percentile(samples: list[float], pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, round(pct / 100 * (len(ordered) - 1)))
+    return ordered[index]
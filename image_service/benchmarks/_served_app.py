@@ -0,0 +1,43 @@
+"""
+The app as `python -m app.serve` runs it, for bench_workers: every worker runs
+the real lifespan, against its own in-memory MinIO and MongoDB seeded with the
+same images.
+"""
+
+import os
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+
+# Imported before the app so it can seed the environment the config reads
+from ._fakes import FakeMinio, FakeMongoClient
+from .bench_load import USER_ID, seed
+
+# isort: split
+from app.core import config
+from app.main import app
+from app.utilities.current_user_id import get_current_user_id
+
+SEEDED_IMAGES = int(os.environ.get("BENCH_SEEDED_IMAGES", "1000"))
+STORAGE_LATENCY = float(os.environ.get("BENCH_STORAGE_LATENCY", "0"))
+
+app_lifespan = app.router.lifespan_context
+
+
+@asynccontextmanager
+async def lifespan(app):
+    minio = FakeMinio(latency=STORAGE_LATENCY)
+    mongo = FakeMongoClient()
+    config._minio_client = minio
+    config._mongodb_client = mongo
+
+    collections = SimpleNamespace(
+        images=mongo.get_collection("images"), blobs=mongo.get_collection("blobs")
+    )
+    await seed(collections, minio, SEEDED_IMAGES, 16 * 1024)
+
+    async with app_lifespan(app) as state:
+        yield state
+
+
+app.router.lifespan_context = lifespan
+app.dependency_overrides[get_current_user_id] = lambda: USER_ID
@@ -0,0 +1,157 @@
+"""
+Upload latency of an interactive user while a bulk import runs.
+
+Drives the full app over ASGI, in process, like bench_load: an importer keeps
+`--import-concurrency` uploads going while an interactive user uploads with
+`--interactive-concurrency`, both for `--duration` seconds, against a MinIO
+stand-in taking `--storage-latency` seconds per call. Run once without
+admission limits and once with `--per-user` uploads per user, it reports each
+user's req/s and latency and the uploads rejected. The importer retries
+rejected uploads after their Retry-After, like a well-behaved client.
+
+Usage (from the image_service directory):
+
+    python -m benchmarks.bench_admission
+    python -m benchmarks.bench_admission --import-concurrency 128 --per-user 4
+"""
+
+import argparse
+import asyncio
+import itertools
+import logging
+import time
+
+import httpx
+from jose import jwt
+
+# Imported before the app so it can seed the environment the config reads
+from ._fakes import FakeJobQueue, FakeMinio, percentile
+from .bench_load import USER_ID, Backend, make_payload
+
+# isort: split
+from app.core.admission import AdmissionLimits
+from app.core.cache import LocalCacheBackend, MetadataCache
+from app.core.config import get_admission_controller
+from app.core.object_store import AsyncObjectStore
+from app.main import app
+from app.repository.image_repository import ImageRepository
+from app.services.job_queue import get_job_queue
+from app.utilities import current_user_id
+from app.utilities.current_user_id import ALGORITHM, get_current_user_id
+
+SECRET = "benchmark"
+
+
+def headers_for(user: str) -> dict:
+    token = jwt.encode({"sub": user}, SECRET, algorithm=ALGORITHM)
+    return {"Authorization": f"Bearer {token}"}
+
+
+async def run_mode(args, limits: AdmissionLimits, label: str) -> dict:
+    minio = FakeMinio(latency=args.storage_latency)
+    store = AsyncObjectStore(minio, max_concurrency=args.max_concurrency)
+    controller = get_admission_controller()
+    controller.set_limits(limits)
+    sequence = itertools.count()
+
+    async with Backend() as backend:
+        cache = MetadataCache(LocalCacheBackend(max_size=10_000, ttl=300))
+        app.dependency_overrides[ImageRepository] = lambda: ImageRepository(
+            store, backend.images, backend.blobs, cache, backend.pending_uploads
+        )
+        app.dependency_overrides[get_job_queue] = FakeJobQueue
+        app.dependency_overrides[get_current_user_id] = lambda: USER_ID
+
+        latencies: dict[str, list[float]] = {"importer": [], "interactive": []}
+        rejected = {"importer": 0, "interactive": 0}
+        stop_at = time.perf_counter() + args.duration
+
+        async def worker(client: httpx.AsyncClient, user: str):
+            headers = headers_for(user)
+            while time.perf_counter() < stop_at:
+                payload = make_payload(args.payload_size, next(sequence))
+                files = {"file": ("cover.png", payload, "image/png")}
+                start = time.perf_counter()
+                response = await client.post(
+                    "/image/upload/", files=files, headers=headers
+                )
+                if response.status_code in (429, 503):
+                    rejected[user] += 1
+                    await asyncio.sleep(float(response.headers["retry-after"]))
+                    continue
+                latencies[user].append(time.perf_counter() - start)
+
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://bench", timeout=None
+        ) as client:
+            await asyncio.gather(
+                *(worker(client, "importer") for _ in range(args.import_concurrency)),
+                *(
+                    worker(client, "interactive")
+                    for _ in range(args.interactive_concurrency)
+                ),
+            )
+
+    app.dependency_overrides = {}
+    store.shutdown()
+
+    return {
+        "mode": label,
+        **{
+            f"{user}_{key}": value
+            for user, samples in latencies.items()
+            for key, value in (
+                ("rps", len(samples) / args.duration),
+                ("p50_ms", percentile(samples, 50) * 1000),
+                ("p99_ms", percentile(samples, 99) * 1000),
+                ("rejected", rejected[user]),
+            )
+        },
+    }
+
+
+async def main(args: argparse.Namespace):
+    logging.getLogger().setLevel(logging.ERROR)
+    current_user_id.SECRET_KEY = SECRET
+
+    modes = [
+        (AdmissionLimits(), "unlimited"),
+        (
+            AdmissionLimits(
+                max_uploads_per_user=args.per_user, max_queue_time=args.queue_time
+            ),
+            f"{args.per_user}/user",
+        ),
+    ]
+    results = [await run_mode(args, limits, label) for limits, label in modes]
+
+    print(
+        f"{args.import_concurrency} importer + {args.interactive_concurrency} "
+        f"interactive uploads of {args.payload_size} bytes, {args.max_concurrency} "
+        f"storage threads, {args.storage_latency * 1000:.0f} ms per storage call"
+    )
+    print(
+        f"{'mode':<10} {'user':<12} {'req/s':>8} {'p50 ms':>9} {'p99 ms':>9} "
+        f"{'rejected':>9}"
+    )
+    for result in results:
+        for user in ("importer", "interactive"):
+            print(
+                f"{result['mode']:<10} {user:<12} {result[f'{user}_rps']:>8.1f} "
+                f"{result[f'{user}_p50_ms']:>9.1f} {result[f'{user}_p99_ms']:>9.1f} "
+                f"{result[f'{user}_rejected']:>9}"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--import-concurrency", type=int, default=64)
+    parser.add_argument("--interactive-concurrency", type=int, default=2)
+    parser.add_argument("--per-user", type=int, default=8)
+    parser.add_argument("--queue-time", type=float, default=10)
+    parser.add_argument("--payload-size", type=int, default=256 * 1024)
+    parser.add_argument("--max-concurrency", type=int, default=16)
+    parser.add_argument("--storage-latency", type=float, default=0.02)
+    parser.add_argument("--duration", type=float, default=5)
+    asyncio.run(main(parser.parse_args()))
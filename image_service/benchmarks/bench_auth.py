@@ -0,0 +1,86 @@
+"""
+Per-request cost of bearer token authentication.
+
+Compares `get_current_user_id` on a repeated token (served from the verified
+token cache) with the previous path, a full `jwt.decode` on every call, and
+with a cache that never hits (a new token each call).
+
+Usage (from the image_service directory):
+
+    python -m benchmarks.bench_auth --calls 20000
+"""
+
+import argparse
+import asyncio
+import time
+
+from jose import jwt
+
+# Imported before the app so it can seed the environment the config reads
+from . import _fakes  # noqa: F401
+
+# isort: split
+from app.utilities import current_user_id
+from app.utilities.current_user_id import (
+    ALGORITHM,
+    VerifiedTokenCache,
+    get_current_user_id,
+)
+
+USER_ID = "a1b2c3d4-e5f6-5895-1234-567890abcdef"
+
+
+def decode_every_time(token: str) -> str:
+    payload = jwt.decode(token, current_user_id.SECRET_KEY, algorithms=[ALGORITHM])
+    return payload["sub"]
+
+
+async def time_calls(calls: int, make_header) -> float:
+    headers = [make_header(i) for i in range(calls)]
+    start = time.perf_counter()
+    for header in headers:
+        await get_current_user_id(header)
+    return (time.perf_counter() - start) / calls * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--calls", type=int, default=20_000)
+    args = parser.parse_args()
+
+    exp = int(time.time()) + 3600
+    token = jwt.encode(
+        {"sub": USER_ID, "exp": exp}, current_user_id.SECRET_KEY, algorithm=ALGORITHM
+    )
+
+    start = time.perf_counter()
+    for _ in range(args.calls):
+        decode_every_time(token)
+    baseline = (time.perf_counter() - start) / args.calls * 1e6
+
+    current_user_id.token_cache = VerifiedTokenCache(args.calls, 3600)
+    cached = asyncio.run(time_calls(args.calls, lambda i: f"Bearer {token}"))
+    cached_stats = current_user_id.token_cache.stats()
+
+    current_user_id.token_cache = VerifiedTokenCache(args.calls, 3600)
+    tokens = [
+        jwt.encode(
+            {"sub": USER_ID, "exp": exp, "jti": str(i)},
+            current_user_id.SECRET_KEY,
+            algorithm=ALGORITHM,
+        )
+        for i in range(args.calls)
+    ]
+    missed = asyncio.run(time_calls(args.calls, lambda i: f"Bearer {tokens[i]}"))
+
+    print(f"{args.calls} calls per scenario")
+    print(f"{'scenario':<22} {'us/call':>10}")
+    print(f"{'decode every call':<22} {baseline:>10.2f}")
+    print(f"{'cache, same token':<22} {cached:>10.2f}")
+    print(f"{'cache, new tokens':<22} {missed:>10.2f}")
+    print(f"speed-up on repeated tokens: {baseline / cached:.1f}x")
+    print(f"cache counters: {cached_stats}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""
+GET latency while uploads are in flight.
+
+Runs the real router and `ImageRepository` in-process against a MinIO fake
+whose `put_object` sleeps for `--storage-latency` seconds, then measures
+`GET /image/{image_id}` latency in three scenarios:
+
+* idle: no uploads running
+* blocking: uploads call the MinIO client directly from the event loop
+* async: uploads go through `AsyncObjectStore`
+
+Usage (from the image_service directory):
+
+    python -m benchmarks.bench_event_loop --uploaders 8 --duration 5
+"""
+
+import argparse
+import asyncio
+import itertools
+import time
+
+import httpx
+from fastapi import FastAPI
+
+# Imported before the app so it can seed the environment the config reads
+from ._fakes import FakeCollection, FakeMinio, percentile
+
+# isort: split
+from app.api.v1.endpoints.image import router
+from app.core.cache import LocalCacheBackend, MetadataCache
+from app.core.object_store import AsyncObjectStore
+from app.repository.image_repository import ImageRepository
+from app.utilities.current_user_id import get_current_user_id
+
+USER_ID = "a1b2c3d4-e5f6-5895-1234-567890abcdef"
+HEADERS = {"Authorization": "Bearer benchmark"}
+
+
+class BlockingObjectStore:
+    """Reproduces the previous behaviour: blocking MinIO calls on the loop."""
+
+    def __init__(self, client: FakeMinio):
+        self.client = client
+
+    async def put_object(self, **kwargs):
+        return self.client.put_object(**kwargs)
+
+    async def remove_object(self, **kwargs):
+        return self.client.remove_object(**kwargs)
+
+
+def build_app(store, collection: FakeCollection) -> FastAPI:
+    app = FastAPI()
+    app.include_router(router)
+    blobs = FakeCollection()
+    cache = MetadataCache(LocalCacheBackend(max_size=10_000, ttl=300))
+    app.dependency_overrides[ImageRepository] = lambda: ImageRepository(
+        store, collection, blobs, cache
+    )
+    app.dependency_overrides[get_current_user_id] = lambda: USER_ID
+    return app
+
+
+async def run_scenario(
+    name: str, store, uploaders: int, duration: float, payload_size: int
+) -> dict:
+    collection = FakeCollection()
+    seeded = await collection.insert_one(
+        {
+            "user_id": USER_ID,
+            "filename": "seed.png",
+            "object_name": "seed.png",
+            "url": "http://127.0.0.1:9000/images/seed.png",
+            "content_type": "image/png",
+            "size": 1,
+            "uploaded_at": "2025-08-04T07:48:57.419399",
+        }
+    )
+    image_id = str(seeded.inserted_id)
+    app = build_app(store, collection)
+    # Signature and IHDR chunk of a 640x480 PNG, enough to pass the header check
+    header = b"\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR\x00\x00\x02\x80\x00\x00\x01\xe0"
+    padding = b"\x00" * (payload_size - len(header) - 8)
+    sequence = itertools.count()
+    deadline = time.perf_counter() + duration
+    latencies: list[float] = []
+    uploads = 0
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench", headers=HEADERS
+    ) as client:
+
+        async def upload_loop():
+            nonlocal uploads
+            while time.perf_counter() < deadline:
+                # Distinct bytes per upload so deduplication does not skip the write
+                payload = header + next(sequence).to_bytes(8, "big") + padding
+                files = {"file": ("cover.png", payload, "image/png")}
+                await client.post("/image/upload/", files=files)
+                uploads += 1
+
+        async def get_loop():
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                response = await client.get(f"/image/{image_id}")
+                latencies.append(time.perf_counter() - start)
+                response.raise_for_status()
+
+        await asyncio.gather(get_loop(), *(upload_loop() for _ in range(uploaders)))
+
+    return {
+        "scenario": name,
+        "gets": len(latencies),
+        "uploads": uploads,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+    }
+
+
+async def main(args: argparse.Namespace):
+    client = FakeMinio(latency=args.storage_latency)
+    async_store = AsyncObjectStore(client, max_concurrency=args.max_concurrency)
+
+    results = [
+        await run_scenario("idle", async_store, 0, args.duration, args.payload_size),
+        await run_scenario(
+            "blocking",
+            BlockingObjectStore(client),
+            args.uploaders,
+            args.duration,
+            args.payload_size,
+        ),
+        await run_scenario(
+            "async", async_store, args.uploaders, args.duration, args.payload_size
+        ),
+    ]
+    async_store.shutdown()
+
+    print(f"{'scenario':<10} {'gets':>8} {'uploads':>8} {'p50 ms':>9} {'p99 ms':>9}")
+    for result in results:
+        print(
+            f"{result['scenario']:<10} {result['gets']:>8} {result['uploads']:>8} "
+            f"{result['p50_ms']:>9.2f} {result['p99_ms']:>9.2f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--uploaders", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--payload-size", type=int, default=256 * 1024)
+    parser.add_argument("--storage-latency", type=float, default=0.05)
+    parser.add_argument("--max-concurrency", type=int, default=16)
+    asyncio.run(main(parser.parse_args()))
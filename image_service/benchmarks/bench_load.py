@@ -0,0 +1,412 @@
+"""
+End-to-end throughput and latency of the image endpoints.
+
+Drives the full application (middleware, routing, service, repository) over
+ASGI, in process, against in-memory stand-ins for MinIO and MongoDB, or
+against a local mongod with `--mongo-uri`. Each operation runs at every
+concurrency level, and uploads, updates and content reads at every payload
+size. `--storage local` stores objects on disk with the local backend instead
+of the MinIO stand-in. Reports
+req/s, p50/p95/p99 latency and peak RSS per scenario, and writes them to a
+JSON file; `--baseline` compares a run with an earlier file.
+
+Usage (from the image_service directory):
+
+    python -m benchmarks.bench_load --output results.json
+    python -m benchmarks.bench_load --concurrency 1 16 --payload-sizes 65536 \\
+        --baseline results.json --output after.json
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import platform
+import random
+import resource
+import shutil
+import struct
+import subprocess
+import tempfile
+import threading
+import time
+import uuid
+from datetime import UTC, datetime
+
+import httpx
+from bson import ObjectId
+
+# Imported before the app so it can seed the environment the config reads
+from ._fakes import FakeCollection, FakeJobQueue, FakeMinio, percentile
+
+# isort: split
+from app.core.cache import LocalCacheBackend, MetadataCache
+from app.core.config import standard_opts
+from app.core.local_store import LocalObjectStore
+from app.core.object_store import AsyncObjectStore
+from app.main import app
+from app.repository.image_repository import ImageRepository
+from app.repository.indexes import ensure_indexes
+from app.services.job_queue import get_job_queue
+from app.utilities.current_user_id import get_current_user_id
+
+USER_ID = "a1b2c3d4-e5f6-5895-1234-567890abcdef"
+HEADERS = {"Authorization": "Bearer benchmark"}
+OPERATIONS = ("upload", "get", "batch", "content", "update", "delete")
+SIZED_OPERATIONS = {"upload", "content", "update"}
+# Signature and IHDR chunk of a 640x480 PNG, enough to pass the header check
+PNG_HEADER = b"\x89PNG\r\n\x1a\n" + struct.pack(
+    ">I4sII5B", 13, b"IHDR", 640, 480, 8, 6, 0, 0, 0
+)
+
+
+class PeakRss:
+    """
+    Samples the resident set size in a thread while the block runs. Falls back
+    to the process-wide peak where /proc is not available.
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._page_size = os.sysconf("SC_PAGE_SIZE")
+
+    def _sample(self) -> int:
+        try:
+            with open("/proc/self/statm") as statm:
+                return int(statm.read().split()[1]) * self._page_size
+        except OSError:
+            # ru_maxrss is in KiB on Linux and bytes on macOS
+            maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            return maxrss if platform.system() == "Darwin" else maxrss * 1024
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, self._sample())
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, self._sample())
+
+
+class Backend:
+    """One scenario's collections, fresh each time so runs do not interfere."""
+
+    def __init__(self, mongo_client=None):
+        self.mongo_client = mongo_client
+        self.database = None
+
+    async def __aenter__(self):
+        if self.mongo_client is None:
+            self.images = FakeCollection()
+            self.blobs = FakeCollection(indexed=())
+            self.pending_uploads = FakeCollection(indexed=())
+            return self
+
+        self.database = self.mongo_client.get_database(
+            f"images_bench_{uuid.uuid4().hex[:8]}", codec_options=standard_opts
+        )
+        self.images = self.database["images"]
+        self.blobs = self.database["blobs"]
+        self.pending_uploads = self.database["pending_uploads"]
+        await ensure_indexes(
+            self.images, self.blobs, self.pending_uploads, self.database["jobs"]
+        )
+        return self
+
+    async def __aexit__(self, *exc):
+        if self.database is not None:
+            await self.mongo_client.drop_database(self.database.name)
+
+
+def make_payload(size: int, sequence: int) -> bytes:
+    # Distinct bytes per request so deduplication does not skip the write
+    marker = sequence.to_bytes(8, "big")
+    return PNG_HEADER + marker + b"\0" * max(0, size - len(PNG_HEADER) - 8)
+
+
+async def seed(backend: Backend, minio: FakeMinio, count: int, size: int) -> list[dict]:
+    """Inserts `count` stored images, each owning its own deduplicated blob."""
+
+    images, blobs = [], []
+    for i in range(count):
+        content_hash = f"{i:064x}"
+        object_name = f"{content_hash}.png"
+        minio.objects[("images", object_name)] = size
+        blobs.append(
+            {
+                "_id": content_hash,
+                "object_name": object_name,
+                "size": size,
+                "content_type": "image/png",
+                "refcount": 1,
+                "created_at": datetime.now(),
+            }
+        )
+        images.append(
+            {
+                # Fixed ids, so separately seeded processes hold the same images
+                "_id": ObjectId(f"{i:024x}"),
+                "user_id": uuid.UUID(USER_ID),
+                "filename": f"seed-{i}.png",
+                "object_name": object_name,
+                "url": f"http://127.0.0.1:9000/images/{object_name}",
+                "content_type": "image/png",
+                "size": size,
+                "width": 640,
+                "height": 480,
+                "content_hash": content_hash,
+                "uploaded_at": datetime.now(),
+                "renditions": [],
+            }
+        )
+
+    if images:
+        await backend.blobs.insert_many(blobs)
+        await backend.images.insert_many(images)
+    return images
+
+
+def make_request(operation: str, args, images: list[dict], payload_size: int):
+    """Returns a coroutine factory issuing one request of `operation`."""
+
+    sequence = itertools.count()
+    targets = iter(images)
+
+    def request(client: httpx.AsyncClient):
+        if operation == "upload":
+            payload = make_payload(payload_size, next(sequence))
+            files = {"file": ("cover.png", payload, "image/png")}
+            return client.post("/image/upload/", files=files)
+        if operation == "get":
+            image = random.choice(images)
+            return client.get(f"/image/{image['_id']}")
+        if operation == "content":
+            image = random.choice(images)
+            return client.get(f"/image/{image['_id']}/content")
+        if operation == "batch":
+            ids = [
+                str(image["_id"]) for image in random.sample(images, args.batch_size)
+            ]
+            return client.post("/image/batch", json={"ids": ids})
+        if operation == "update":
+            image = next(targets)
+            payload = make_payload(payload_size, next(sequence))
+            files = {"file": ("cover.png", payload, "image/png")}
+            params = {"image_id": str(image["_id"])}
+            return client.put("/image/update/", params=params, files=files)
+        if operation == "delete":
+            image = next(targets)
+            params = {"image_id": str(image["_id"])}
+            return client.delete("/image/delete/", params=params)
+        raise ValueError(f"Unknown operation {operation}")
+
+    return request
+
+
+def write_objects(root: str, images: list[dict], size: int):
+    bucket = os.path.join(root, os.environ["MINIO_BUCKET"])
+    os.makedirs(bucket, exist_ok=True)
+    payload = make_payload(size, 0)
+    for image in images:
+        with open(os.path.join(bucket, image["object_name"]), "wb") as file:
+            file.write(payload)
+
+
+async def run_scenario(
+    args, mongo_client, operation: str, concurrency: int, payload_size: int
+) -> dict:
+    minio = FakeMinio(latency=args.storage_latency)
+    root = None
+    if args.storage == "local":
+        root = tempfile.mkdtemp(prefix="bench-objects-")
+        store = LocalObjectStore(root, max_concurrency=args.max_concurrency)
+    else:
+        store = AsyncObjectStore(minio, max_concurrency=args.max_concurrency)
+
+    async with Backend(mongo_client) as backend:
+        seeded = 0 if operation == "upload" else max(args.requests, args.batch_size)
+        images = await seed(backend, minio, seeded, payload_size)
+        if root:
+            write_objects(root, images, payload_size)
+        cache = MetadataCache(LocalCacheBackend(max_size=10_000, ttl=300))
+        app.dependency_overrides[ImageRepository] = lambda: ImageRepository(
+            store, backend.images, backend.blobs, cache, backend.pending_uploads
+        )
+        app.dependency_overrides[get_job_queue] = FakeJobQueue
+        app.dependency_overrides[get_current_user_id] = lambda: USER_ID
+
+        request = make_request(operation, args, images, payload_size)
+        remaining = itertools.count()
+        latencies: list[float] = []
+        errors = 0
+
+        async def worker(client: httpx.AsyncClient):
+            nonlocal errors
+            while next(remaining) < args.requests:
+                start = time.perf_counter()
+                response = await request(client)
+                latencies.append(time.perf_counter() - start)
+                if response.status_code >= 400:
+                    errors += 1
+
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://bench", headers=HEADERS
+        ) as client:
+            with PeakRss() as rss:
+                start = time.perf_counter()
+                await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+                elapsed = time.perf_counter() - start
+
+    app.dependency_overrides = {}
+    store.shutdown()
+    if root:
+        shutil.rmtree(root)
+
+    return {
+        "operation": operation,
+        "payload_size": payload_size if operation in SIZED_OPERATIONS else None,
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": errors,
+        "duration_s": round(elapsed, 4),
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        "peak_rss_mb": round(rss.peak / 2**20, 1),
+    }
+
+
+def scenario_key(result: dict) -> tuple:
+    return result["operation"], result["payload_size"], result["concurrency"]
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load_baseline(path: str) -> dict[tuple, dict]:
+    with open(path) as file:
+        return {scenario_key(result): result for result in json.load(file)["results"]}
+
+
+def write_report(path: str, report: dict):
+    with open(path, "w") as file:
+        json.dump(report, file, indent=2)
+
+
+def print_results(results: list[dict], baseline: dict[tuple, dict]):
+    print(
+        f"{'operation':<9} {'size':>9} {'conc':>5} {'req/s':>9} {'p50 ms':>8} "
+        f"{'p95 ms':>8} {'p99 ms':>8} {'rss MB':>7} {'err':>4}"
+        + (f" {'req/s Δ':>8} {'p99 Δ':>8}" if baseline else "")
+    )
+    for result in results:
+        size = result["payload_size"] or "-"
+        line = (
+            f"{result['operation']:<9} {size:>9} {result['concurrency']:>5} "
+            f"{result['rps']:>9.1f} {result['p50_ms']:>8.2f} {result['p95_ms']:>8.2f} "
+            f"{result['p99_ms']:>8.2f} {result['peak_rss_mb']:>7.1f} "
+            f"{result['errors']:>4}"
+        )
+        before = baseline.get(scenario_key(result))
+        if before:
+            rps_change = (result["rps"] / before["rps"] - 1) * 100
+            p99_change = (result["p99_ms"] / before["p99_ms"] - 1) * 100
+            line += f" {rps_change:>+7.1f}% {p99_change:>+7.1f}%"
+        print(line)
+
+
+async def main(args: argparse.Namespace):
+    # One log line per request would dominate the timings
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    logging.getLogger("app.access").setLevel(logging.WARNING)
+
+    mongo_client = None
+    if args.mongo_uri:
+        from pymongo import AsyncMongoClient
+
+        mongo_client = AsyncMongoClient(args.mongo_uri)
+
+    results = []
+    try:
+        for operation in args.operations:
+            sizes = args.payload_sizes if operation in SIZED_OPERATIONS else [0]
+            for payload_size, concurrency in itertools.product(sizes, args.concurrency):
+                results.append(
+                    await run_scenario(
+                        args, mongo_client, operation, concurrency, payload_size
+                    )
+                )
+    finally:
+        if mongo_client is not None:
+            await mongo_client.close()
+
+    baseline = load_baseline(args.baseline) if args.baseline else {}
+    print_results(results, baseline)
+
+    if args.output:
+        report = {
+            "commit": git_commit(),
+            "created_at": datetime.now(UTC).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "backend": "mongod" if args.mongo_uri else "fake",
+            "storage": args.storage,
+            "settings": {
+                "requests": args.requests,
+                "storage_latency": args.storage_latency,
+                "max_concurrency": args.max_concurrency,
+                "batch_size": args.batch_size,
+            },
+            "results": results,
+        }
+        write_report(args.output, report)
+        print(f"results written to {args.output}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument(
+        "--operations", nargs="+", choices=OPERATIONS, default=list(OPERATIONS)
+    )
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 8, 32])
+    parser.add_argument(
+        "--payload-sizes", nargs="+", type=int, default=[16 * 1024, 1024 * 1024]
+    )
+    parser.add_argument("--requests", type=int, default=400, help="per scenario")
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument("--storage", choices=("fake", "local"), default="fake")
+    parser.add_argument(
+        "--storage-latency",
+        type=float,
+        default=0.002,
+        help="seconds per call of the MinIO stand-in",
+    )
+    parser.add_argument("--max-concurrency", type=int, default=16)
+    parser.add_argument(
+        "--mongo-uri", help="run against this mongod instead of the in-memory fake"
+    )
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare")
+    asyncio.run(main(parser.parse_args()))
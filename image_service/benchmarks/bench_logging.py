@@ -0,0 +1,167 @@
+"""
+Request throughput with logging at INFO, synchronous against queued.
+
+Drives GET requests through the full app over ASGI, in process, like
+bench_load, with every request writing its access line. Logs go to a sink
+that takes `--sink-latency` seconds per write, standing in for a stdout pipe
+that a container log driver drains slower than it fills. Compared modes:
+
+    off     WARNING level through a plain StreamHandler, no access lines
+    sync    INFO through a plain StreamHandler, writing on the event loop
+    queue   INFO through the queue and listener thread of core/logging
+
+`--operation missing` requests unknown ids, so every request also logs an
+error from the same line, which sampling thins out.
+
+Usage (from the image_service directory):
+
+    python -m benchmarks.bench_logging
+    python -m benchmarks.bench_logging --sink-latency 0.0005 --concurrency 32
+"""
+
+import argparse
+import asyncio
+import itertools
+import logging
+import random
+import time
+
+import httpx
+from bson import ObjectId
+
+# Imported before the app so it can seed the environment the config reads
+from ._fakes import FakeJobQueue, FakeMinio, percentile
+from .bench_load import HEADERS, USER_ID, Backend, seed
+
+# isort: split
+from app.core.cache import LocalCacheBackend, MetadataCache
+from app.core.logging import (
+    LOG_FORMAT_DEBUG,
+    TextFormatter,
+    create_log_pipeline,
+    stop_logging,
+)
+from app.core.object_store import AsyncObjectStore
+from app.main import app
+from app.repository.image_repository import ImageRepository
+from app.services.job_queue import get_job_queue
+from app.utilities.current_user_id import get_current_user_id
+
+MODES = ("off", "sync", "queue")
+
+
+class SlowSink:
+    """Text stream discarding what it is given after `latency` seconds."""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.lines = 0
+
+    def write(self, text: str):
+        time.sleep(self.latency)
+        self.lines += 1
+
+    def flush(self):
+        pass
+
+
+def configure(mode: str, sink: SlowSink):
+    """Replaces the root handlers with those of `mode`; returns a listener to stop."""
+
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+
+    root.setLevel(logging.WARNING if mode == "off" else logging.INFO)
+    if mode == "queue":
+        handler, listener = create_log_pipeline(sink)
+        listener.start()
+        root.addHandler(handler)
+        return listener
+
+    handler = logging.StreamHandler(sink)  # type: ignore
+    handler.setFormatter(TextFormatter(LOG_FORMAT_DEBUG))
+    root.addHandler(handler)
+    return None
+
+
+async def run_mode(args, mode: str) -> dict:
+    sink = SlowSink(args.sink_latency)
+    minio = FakeMinio()
+    store = AsyncObjectStore(minio)
+
+    async with Backend() as backend:
+        images = await seed(backend, minio, 200, 16 * 1024)
+        cache = MetadataCache(LocalCacheBackend(max_size=10_000, ttl=300))
+        app.dependency_overrides[ImageRepository] = lambda: ImageRepository(
+            store, backend.images, backend.blobs, cache, backend.pending_uploads
+        )
+        app.dependency_overrides[get_job_queue] = FakeJobQueue
+        app.dependency_overrides[get_current_user_id] = lambda: USER_ID
+
+        listener = configure(mode, sink)
+        remaining = itertools.count()
+        latencies: list[float] = []
+
+        async def worker(client: httpx.AsyncClient):
+            while next(remaining) < args.requests:
+                if args.operation == "get":
+                    image_id = random.choice(images)["_id"]
+                else:
+                    image_id = ObjectId()
+                start = time.perf_counter()
+                await client.get(f"/image/{image_id}")
+                latencies.append(time.perf_counter() - start)
+
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://bench", headers=HEADERS
+        ) as client:
+            start = time.perf_counter()
+            await asyncio.gather(*(worker(client) for _ in range(args.concurrency)))
+            elapsed = time.perf_counter() - start
+
+        if listener is not None:
+            # Lines still queued are written after the timed section
+            listener.stop()
+
+    app.dependency_overrides = {}
+    store.shutdown()
+
+    return {
+        "mode": mode,
+        "rps": len(latencies) / elapsed,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "lines": sink.lines,
+    }
+
+
+async def main(args: argparse.Namespace):
+    # The app set up its own pipeline on import; each mode installs its own
+    stop_logging()
+    logging.getLogger("httpx").propagate = False
+
+    results = [await run_mode(args, mode) for mode in args.modes]
+    logging.getLogger().handlers.clear()
+
+    print(
+        f"{args.requests} GET requests ({args.operation}), concurrency "
+        f"{args.concurrency}, {args.sink_latency * 1e6:.0f} us per log write"
+    )
+    print(f"{'mode':<6} {'req/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'lines':>7}")
+    for result in results:
+        print(
+            f"{result['mode']:<6} {result['rps']:>9.1f} {result['p50_ms']:>8.2f} "
+            f"{result['p99_ms']:>8.2f} {result['lines']:>7}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--operation", choices=("get", "missing"), default="get")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--sink-latency", type=float, default=0.001)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,74 @@
+"""
+Renditions per second per core.
+
+Encodes a synthetic cover image into each configured rendition using the same
+`render` function the service runs in its process pool, first in-process on a
+single core and then through a pool of `--workers` processes.
+
+Usage (from the image_service directory):
+
+    python -m benchmarks.bench_renditions --source-size 2400x1350 --images 20
+"""
+
+import argparse
+import io
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image
+
+from app.services.renditions import parse_rendition_specs, render
+
+DEFAULT_SPECS = "thumb:200,card:800,card_webp:800:webp"
+
+
+def make_source(width: int, height: int) -> bytes:
+    # Noise defeats the encoders' shortcuts for flat colors, like real cover art
+    image = Image.frombytes("RGB", (width, height), os.urandom(width * height * 3))
+    output = io.BytesIO()
+    image.save(output, format="JPEG", quality=90)
+    return output.getvalue()
+
+
+def main(args: argparse.Namespace):
+    width, height = (int(value) for value in args.source_size.split("x"))
+    source = make_source(width, height)
+    specs = parse_rendition_specs(args.specs)
+    jobs = [(source, spec.width, spec.format) for spec in specs] * args.images
+
+    print(f"source {width}x{height}, {len(source)} bytes, {len(jobs)} renditions")
+    print(f"{'spec':<12} {'ms/rendition':>13}")
+    for spec in specs:
+        start = time.perf_counter()
+        for _ in range(args.images):
+            render(source, spec.width, spec.format)
+        elapsed = (time.perf_counter() - start) / args.images
+        print(f"{spec.name:<12} {elapsed * 1000:>13.2f}")
+
+    start = time.perf_counter()
+    for job in jobs:
+        render(*job)
+    single = len(jobs) / (time.perf_counter() - start)
+
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        # Warm the workers so process start-up is not measured
+        list(pool.map(render, *zip(*jobs[: args.workers])))
+        start = time.perf_counter()
+        list(pool.map(render, *zip(*jobs)))
+        pooled = len(jobs) / (time.perf_counter() - start)
+
+    print(f"single core: {single:.1f} renditions/s")
+    print(
+        f"pool of {args.workers}: {pooled:.1f} renditions/s, "
+        f"{pooled / args.workers:.1f} renditions/s per core"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--source-size", default="2400x1350")
+    parser.add_argument("--images", type=int, default=20)
+    parser.add_argument("--specs", default=DEFAULT_SPECS)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    main(parser.parse_args())
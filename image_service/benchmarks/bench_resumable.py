@@ -0,0 +1,176 @@
+"""
+Bytes sent and time to upload a large image over a connection that drops.
+
+Drives the full app over ASGI, in process, with objects stored on disk by the
+local backend. The client sends at `--bandwidth` bytes per second, and each
+connection drops after a random number of bytes, `--mean-drop` on average
+(exponentially distributed, so drops are independent of the bytes already
+sent). A dropped request is cut short where it dropped. Each of `--trials`
+uploads of `--size` bytes is made twice, with the same drops:
+
+    full       POST /image/upload/, sent again from the first byte after a drop
+    resumable  a resumable upload sent in one PATCH, resumed after a drop from
+               the offset HEAD reports, then completed
+
+and the bytes sent per byte uploaded and the time per upload are reported.
+
+Usage (from the image_service directory):
+
+    python -m benchmarks.bench_resumable
+    python -m benchmarks.bench_resumable --size 20000000 --mean-drop 8000000
+"""
+
+import argparse
+import asyncio
+import logging
+import random
+import shutil
+import statistics
+import tempfile
+import time
+
+import httpx
+
+# Imported before the app so it can seed the environment the config reads
+from ._fakes import FakeJobQueue
+from .bench_load import USER_ID, Backend, make_payload
+
+# isort: split
+from app.core.cache import LocalCacheBackend, MetadataCache
+from app.core.local_store import LocalObjectStore
+from app.main import app
+from app.repository.image_repository import ImageRepository
+from app.services.job_queue import get_job_queue
+from app.utilities.current_user_id import get_current_user_id
+
+HEADERS = {"Authorization": "Bearer benchmark"}
+BOUNDARY = "benchmark-boundary"
+SEND_SIZE = 64 * 1024
+
+
+def form_body(payload: bytes) -> bytes:
+    return (
+        (
+            f"--{BOUNDARY}\r\n"
+            'Content-Disposition: form-data; name="file"; filename="still.png"\r\n'
+            "Content-Type: image/png\r\n\r\n"
+        ).encode()
+        + payload
+        + f"\r\n--{BOUNDARY}--\r\n".encode()
+    )
+
+
+async def send(data: bytes, bandwidth: float):
+    """The body of a request, paced to the bandwidth of the link."""
+
+    for start in range(0, len(data), SEND_SIZE):
+        chunk = data[start : start + SEND_SIZE]
+        await asyncio.sleep(len(chunk) / bandwidth)
+        yield chunk
+
+
+async def upload_full(
+    client: httpx.AsyncClient, payload: bytes, drops: random.Random, args
+) -> int:
+    body = form_body(payload)
+    headers = HEADERS | {"Content-Type": f"multipart/form-data; boundary={BOUNDARY}"}
+    sent = 0
+    while True:
+        length = min(len(body), int(drops.expovariate(1 / args.mean_drop)))
+        response = await client.post(
+            "/image/upload/",
+            content=send(body[:length], args.bandwidth),
+            headers=headers,
+        )
+        sent += length
+        if length == len(body):
+            assert response.status_code == 201, response.text
+            return sent
+
+
+async def upload_resumable(
+    client: httpx.AsyncClient, payload: bytes, drops: random.Random, args
+) -> int:
+    announced = {"filename": "still.png", "content_type": "image/png"}
+    response = await client.post(
+        "/image/uploads", json=announced | {"size": len(payload)}, headers=HEADERS
+    )
+    location = response.headers["location"]
+    offset = sent = 0
+    while offset < len(payload):
+        remaining = payload[offset:]
+        length = min(len(remaining), int(drops.expovariate(1 / args.mean_drop)))
+        await client.patch(
+            location,
+            content=send(remaining[:length], args.bandwidth),
+            headers=HEADERS | {"Upload-Offset": str(offset)},
+        )
+        sent += length
+        # A dropped client never sees the response, so it asks where to resume
+        progress = await client.head(location, headers=HEADERS)
+        offset = int(progress.headers["upload-offset"])
+
+    upload_id = location.rsplit("/", 1)[-1]
+    response = await client.post(f"/image/{upload_id}/complete", headers=HEADERS)
+    assert response.status_code == 201, response.text
+    return sent
+
+
+async def run_mode(upload, args) -> tuple[list[float], list[float]]:
+    root = tempfile.mkdtemp(prefix="bench-objects-")
+    store = LocalObjectStore(root)
+    amplification, seconds = [], []
+
+    async with Backend() as backend:
+        cache = MetadataCache(LocalCacheBackend(max_size=10_000, ttl=300))
+        app.dependency_overrides[ImageRepository] = lambda: ImageRepository(
+            store, backend.images, backend.blobs, cache, backend.pending_uploads
+        )
+        app.dependency_overrides[get_job_queue] = FakeJobQueue
+        app.dependency_overrides[get_current_user_id] = lambda: USER_ID
+
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://bench", timeout=None
+        ) as client:
+            for trial in range(args.trials):
+                payload = make_payload(args.size, trial)
+                # The same drops for both modes
+                drops = random.Random(args.seed + trial)
+                start = time.perf_counter()
+                sent = await upload(client, payload, drops, args)
+                seconds.append(time.perf_counter() - start)
+                amplification.append(sent / args.size)
+
+    app.dependency_overrides = {}
+    store.shutdown()
+    shutil.rmtree(root)
+    return amplification, seconds
+
+
+async def main(args: argparse.Namespace):
+    logging.getLogger().setLevel(logging.ERROR)
+
+    print(
+        f"{args.trials} uploads of {args.size} bytes at {args.bandwidth:.0f} B/s, "
+        f"a drop every {args.mean_drop} bytes on average"
+    )
+    print(f"{'mode':<10} {'sent/size':>10} {'mean s':>8} {'p95 s':>8} {'max s':>8}")
+    for name, upload in (("full", upload_full), ("resumable", upload_resumable)):
+        amplification, seconds = await run_mode(upload, args)
+        ranked = sorted(seconds)
+        print(
+            f"{name:<10} {statistics.mean(amplification):>10.2f} "
+            f"{statistics.mean(seconds):>8.2f} "
+            f"{ranked[int(0.95 * (len(ranked) - 1))]:>8.2f} {ranked[-1]:>8.2f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--size", type=int, default=16 * 1024 * 1024)
+    parser.add_argument("--mean-drop", type=int, default=12 * 1024 * 1024)
+    parser.add_argument("--bandwidth", type=float, default=64 * 1024 * 1024)
+    parser.add_argument("--trials", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=1)
+    asyncio.run(main(parser.parse_args()))
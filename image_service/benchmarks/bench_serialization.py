@@ -0,0 +1,179 @@
+"""
+CPU time per response of the image endpoints, validated against direct.
+
+Compares, for one image, a batch of `--batch-size` and a listing page of
+`--page-size` images, each with `--renditions` renditions:
+
+    model    the documents validated into ImageModel/ImageBatch/ImagePage and
+             returned with `response_model`, which FastAPI validates again and
+             encodes with the standard json module
+    direct   the documents mapped with `image_view` and encoded with orjson,
+             returned as a Response, as the endpoints do
+
+twice: the encoding step alone, and whole requests through a FastAPI app over
+ASGI, where the routing and the HTTP layer add the same cost to both. The
+encoding step of `model` uses pydantic's own JSON encoder, a lower bound of
+what FastAPI spends. Times are process CPU time, so the figures hold on a
+loaded machine.
+
+Usage (from the image_service directory):
+
+    python -m benchmarks.bench_serialization
+    python -m benchmarks.bench_serialization --batch-size 100 --requests 2000
+"""
+
+import argparse
+import asyncio
+import time
+import uuid
+from datetime import datetime
+from functools import partial
+
+import httpx
+from bson import ObjectId
+from fastapi import FastAPI
+
+from app.repository.mongo.image import ImageBatch, ImageModel, ImagePage
+from app.utilities.serialization import image_view, json_response
+
+
+def make_documents(count: int, renditions: int) -> list[dict]:
+    """Image documents as the driver returns them."""
+
+    user_id = uuid.uuid4()
+    documents = []
+    for _ in range(count):
+        object_name = f"{uuid.uuid4()}.jpg"
+        documents.append(
+            {
+                "_id": ObjectId(),
+                "user_id": user_id,
+                "filename": "holiday.jpg",
+                "object_name": object_name,
+                "url": f"http://localhost:9000/images/{object_name}",
+                "content_type": "image/jpeg",
+                "size": 482_113,
+                "width": 1920,
+                "height": 1080,
+                "content_hash": "9f86d081" * 8,
+                "uploaded_at": datetime(2025, 4, 29, 10, 0, 0, 123000),
+                "renditions": [
+                    {
+                        "name": f"r{i}",
+                        "object_name": f"{object_name}.r{i}.jpg",
+                        "url": f"http://localhost:9000/images/{object_name}.r{i}.jpg",
+                        "content_type": "image/jpeg",
+                        "width": 200 * (i + 1),
+                        "height": 112 * (i + 1),
+                        "size": 8042 * (i + 1),
+                    }
+                    for i in range(renditions)
+                ],
+            }
+        )
+    return documents
+
+
+def shapes(args) -> dict[str, tuple]:
+    """Per response: (model, validated content, direct content)."""
+
+    single = make_documents(1, args.renditions)[0]
+    batch = make_documents(args.batch_size, args.renditions)
+    page = make_documents(args.page_size, args.renditions)
+    return {
+        "single": (
+            ImageModel,
+            lambda: single,
+            lambda: image_view(single),
+        ),
+        f"batch {args.batch_size}": (
+            ImageBatch,
+            lambda: ImageBatch.model_validate({"images": batch, "missing": []}),
+            lambda: {"images": [image_view(d) for d in batch], "missing": []},
+        ),
+        f"page {args.page_size}": (
+            ImagePage,
+            lambda: ImagePage.model_validate({"images": page, "next_cursor": None}),
+            lambda: {"images": [image_view(d) for d in page], "next_cursor": None},
+        ),
+    }
+
+
+def model_body(model, validated) -> str:
+    return model.model_validate(validated()).model_dump_json()
+
+
+def direct_body(direct) -> bytes:
+    return json_response(direct()).body
+
+
+def cpu_per_call(func, calls: int) -> float:
+    func()
+    start = time.process_time()
+    for _ in range(calls):
+        func()
+    return (time.process_time() - start) / calls
+
+
+def build_app(shape_table: dict[str, tuple]) -> FastAPI:
+    app = FastAPI()
+    for index, (model, validated, direct) in enumerate(shape_table.values()):
+
+        def register(index=index, model=model, validated=validated, direct=direct):
+            @app.get(
+                f"/model/{index}", response_model=model, response_model_by_alias=False
+            )
+            async def model_route():
+                return validated()
+
+            @app.get(f"/direct/{index}", response_model=model)
+            async def direct_route():
+                return json_response(direct())
+
+        register()
+    return app
+
+
+async def cpu_per_request(app: FastAPI, path: str, requests: int) -> float:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench"
+    ) as client:
+        await client.get(path)
+        start = time.process_time()
+        for _ in range(requests):
+            response = await client.get(path)
+            response.raise_for_status()
+        return (time.process_time() - start) / requests
+
+
+async def main(args: argparse.Namespace):
+    shape_table = shapes(args)
+    app = build_app(shape_table)
+
+    print(f"{args.renditions} renditions per image, CPU time per response in us")
+    print(f"{'response':<12} {'step':<8} {'model':>10} {'direct':>10} {'speedup':>8}")
+    for index, (name, (model, validated, direct)) in enumerate(shape_table.items()):
+        encode_model = cpu_per_call(partial(model_body, model, validated), args.calls)
+        encode_direct = cpu_per_call(partial(direct_body, direct), args.calls)
+        request_model = await cpu_per_request(app, f"/model/{index}", args.requests)
+        request_direct = await cpu_per_request(app, f"/direct/{index}", args.requests)
+
+        for step, before, after in (
+            ("encode", encode_model, encode_direct),
+            ("request", request_model, request_direct),
+        ):
+            print(
+                f"{name:<12} {step:<8} {before * 1e6:>10.1f} {after * 1e6:>10.1f} "
+                f"{before / after:>7.1f}x"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--renditions", type=int, default=3)
+    parser.add_argument("--calls", type=int, default=2000, help="encodings timed")
+    parser.add_argument("--requests", type=int, default=1000, help="requests timed")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,97 @@
+"""
+Import-to-ready latency of the service.
+
+Each run starts a fresh interpreter, so nothing is cached between runs. The
+run times `import app.main` and then the app lifespan: the bucket check,
+index creation and, with `--warmup`, spawning the rendition workers. MinIO
+and MongoDB are replaced by the in-memory fakes. The MinIO fake sleeps
+`--storage-latency` seconds per call to stand in for a network round trip.
+
+Usage (from the image_service directory):
+
+    python -m benchmarks.bench_startup --runs 10
+    python -m benchmarks.bench_startup --runs 5 --warmup
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+
+def run_once(storage_latency: float) -> dict[str, float]:
+    start = time.perf_counter()
+
+    # Seeds the environment the config reads before the app is imported
+    from ._fakes import FakeMinio, FakeMongoClient
+
+    # isort: split
+    from app import main
+    from app.core import config
+
+    imported = time.perf_counter()
+
+    config._minio_client = FakeMinio(latency=storage_latency)
+    config._mongodb_client = FakeMongoClient()
+
+    async def start_app() -> float:
+        async with main.app.router.lifespan_context(main.app):
+            ready = time.perf_counter()
+        return ready
+
+    ready = asyncio.run(start_app())
+
+    return {
+        "import_ms": (imported - start) * 1000,
+        "startup_ms": (ready - imported) * 1000,
+        "ready_ms": (ready - start) * 1000,
+    }
+
+
+def run_child(storage_latency: float, warmup: bool) -> dict[str, float]:
+    env = dict(os.environ, STARTUP_WARMUP="True" if warmup else "False")
+    output = subprocess.run(
+        [
+            sys.executable,
+            "-m",
+            "benchmarks.bench_startup",
+            "--child",
+            "--storage-latency",
+            str(storage_latency),
+        ],
+        env=env,
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--storage-latency", type=float, default=0.005)
+    parser.add_argument("--warmup", action="store_true")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_once(args.storage_latency)))
+        return
+
+    runs = [run_child(args.storage_latency, args.warmup) for _ in range(args.runs)]
+
+    print(f"{args.runs} cold starts, warm-up {'on' if args.warmup else 'off'}")
+    print(f"{'phase':<10} {'median ms':>10} {'max ms':>10}")
+    for phase in ("import", "startup", "ready"):
+        samples = [run[f"{phase}_ms"] for run in runs]
+        print(f"{phase:<10} {statistics.median(samples):>10.1f} {max(samples):>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
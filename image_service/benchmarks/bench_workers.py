@@ -0,0 +1,234 @@
+"""
+Throughput of `python -m app.serve` as the number of worker processes grows.
+
+For each worker count the real server is started on a local port, with every
+worker running the app against its own in-memory MinIO and MongoDB, and is
+loaded over HTTP by `--clients` load generator processes for `--duration`
+seconds. Reports req/s, p50/p99 latency and the scaling efficiency relative
+to the smallest worker count.
+
+Throughput only scales with workers while there are idle cores: the load
+generators need CPU too, so on a machine with N cores expect near-linear
+scaling up to about N/2 workers with the default settings.
+
+Usage (from the image_service directory):
+
+    python -m benchmarks.bench_workers --workers 1 2 4 --output workers.json
+    python -m benchmarks.bench_workers --workers 1 8 --clients 8 --operation batch
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import platform
+import random
+import signal
+import socket
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import UTC, datetime
+
+import httpx
+
+from ._fakes import percentile
+
+HEADERS = {"Authorization": "Bearer benchmark"}
+SEEDED_IMAGES = 1000
+# Same ids as bench_load.seed, which _served_app seeds every worker with
+IMAGE_IDS = [f"{i:024x}" for i in range(SEEDED_IMAGES)]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(workers: int, port: int, storage_latency: float) -> subprocess.Popen:
+    env = dict(
+        os.environ,
+        BENCH_SEEDED_IMAGES=str(SEEDED_IMAGES),
+        BENCH_STORAGE_LATENCY=str(storage_latency),
+        LOG_LEVEL="WARNING",
+    )
+    # A fresh metrics directory per run, created by app.serve
+    env.pop("PROMETHEUS_MULTIPROC_DIR", None)
+    return subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "app.serve",
+            "--app",
+            "benchmarks._served_app:app",
+            "--host",
+            "127.0.0.1",
+            "--port",
+            str(port),
+            "--workers",
+            str(workers),
+        ],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+
+def wait_until_ready(base_url: str, server: subprocess.Popen, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"Server exited with {server.returncode}")
+        try:
+            response = httpx.get(f"{base_url}/image/{IMAGE_IDS[0]}", headers=HEADERS)
+            if response.status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        time.sleep(0.1)
+    raise TimeoutError("Server did not become ready")
+
+
+def stop_server(server: subprocess.Popen):
+    server.send_signal(signal.SIGTERM)
+    try:
+        server.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        server.kill()
+        server.wait()
+
+
+async def generate_load(
+    base_url: str, operation: str, concurrency: int, warmup: float, duration: float
+) -> tuple[list[float], int]:
+    latencies: list[float] = []
+    errors = 0
+    start = time.perf_counter()
+    measure_from = start + warmup
+    stop_at = measure_from + duration
+
+    async def worker(client: httpx.AsyncClient):
+        nonlocal errors
+        while (now := time.perf_counter()) < stop_at:
+            if operation == "get":
+                request = client.get(f"/image/{random.choice(IMAGE_IDS)}")
+            else:
+                ids = random.sample(IMAGE_IDS, 50)
+                request = client.post("/image/batch", json={"ids": ids})
+            response = await request
+            if now < measure_from:
+                continue
+            latencies.append(time.perf_counter() - now)
+            if response.status_code >= 400:
+                errors += 1
+
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(
+        base_url=base_url, headers=HEADERS, limits=limits
+    ) as client:
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+
+    return latencies, errors
+
+
+def run_client(*args) -> tuple[list[float], int]:
+    return asyncio.run(generate_load(*args))
+
+
+def run_scenario(args, workers: int) -> dict:
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    server = start_server(workers, port, args.storage_latency)
+    try:
+        wait_until_ready(base_url, server)
+        with ProcessPoolExecutor(
+            args.clients, mp_context=multiprocessing.get_context("spawn")
+        ) as clients:
+            futures = [
+                clients.submit(
+                    run_client,
+                    base_url,
+                    args.operation,
+                    args.concurrency,
+                    args.warmup,
+                    args.duration,
+                )
+                for _ in range(args.clients)
+            ]
+            outcomes = [future.result() for future in futures]
+    finally:
+        stop_server(server)
+
+    latencies = [latency for samples, _ in outcomes for latency in samples]
+    return {
+        "workers": workers,
+        "requests": len(latencies),
+        "errors": sum(errors for _, errors in outcomes),
+        "rps": round(len(latencies) / args.duration, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--workers", nargs="+", type=int, default=[1, 2, 4])
+    parser.add_argument("--operation", choices=("get", "batch"), default="get")
+    parser.add_argument(
+        "--clients",
+        type=int,
+        default=max(1, (os.cpu_count() or 1) // 2),
+        help="load generator processes",
+    )
+    parser.add_argument(
+        "--concurrency", type=int, default=16, help="connections per client"
+    )
+    parser.add_argument("--duration", type=float, default=10, help="seconds measured")
+    parser.add_argument("--warmup", type=float, default=2)
+    parser.add_argument("--storage-latency", type=float, default=0.0)
+    parser.add_argument("--output", help="write the results to this JSON file")
+    args = parser.parse_args()
+
+    results = [run_scenario(args, workers) for workers in args.workers]
+
+    base = results[0]
+    print(f"{os.cpu_count()} CPUs, {args.clients} clients x {args.concurrency}")
+    print(
+        f"{'workers':>7} {'req/s':>9} {'p50 ms':>8} {'p99 ms':>8} "
+        f"{'speedup':>8} {'efficiency':>10} {'err':>4}"
+    )
+    for result in results:
+        speedup = result["rps"] / base["rps"] if base["rps"] else 0.0
+        result["speedup"] = round(speedup, 2)
+        result["efficiency"] = round(speedup * base["workers"] / result["workers"], 2)
+        print(
+            f"{result['workers']:>7} {result['rps']:>9.1f} {result['p50_ms']:>8.2f} "
+            f"{result['p99_ms']:>8.2f} {result['speedup']:>7.2f}x "
+            f"{result['efficiency']:>10.0%} {result['errors']:>4}"
+        )
+
+    if args.output:
+        report = {
+            "created_at": datetime.now(UTC).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "settings": {
+                "operation": args.operation,
+                "clients": args.clients,
+                "concurrency": args.concurrency,
+                "duration": args.duration,
+                "storage_latency": args.storage_latency,
+            },
+            "results": results,
+        }
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+        print(f"results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()